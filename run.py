@@ -27,6 +27,15 @@ class TableName(str, Enum):
     metabase_docs = "metabase_docs"
 
 
+class IndexedTable(str, Enum):
+    issues = "issues"
+    discourse_posts = "discourse_posts"
+    metabase_docs = "metabase_docs"
+    questions = "questions"
+    keyword_definitions = "keyword_definitions"
+    search_vectors = "search_vectors"
+
+
 app = typer.Typer(
     name="GitHub Duplicate Issue Finder",
     help="Unified service runner",
@@ -63,6 +72,7 @@ batch_app = typer.Typer(help="Batch processing: create, status, pending, files m
 db_app = typer.Typer(help="Database setup and table recreation")
 keywords_app = typer.Typer(help="Manage keyword definitions")
 synonyms_app = typer.Typer(help="Manage synonyms")
+bench_app = typer.Typer(help="Performance benchmarks")
 
 # Mount sub-apps
 app.add_typer(api_app, name="api")
@@ -72,6 +82,7 @@ app.add_typer(batch_app, name="batch")
 app.add_typer(db_app, name="db")
 app.add_typer(keywords_app, name="keywords")
 app.add_typer(synonyms_app, name="synonyms")
+app.add_typer(bench_app, name="bench")
 
 
 # ---------- API ----------
@@ -81,9 +92,22 @@ def api_start(
     port: int = typer.Option(8000, help="Port"),
     reload: bool = typer.Option(True, help="Enable auto-reload"),
     log_level: str = typer.Option("info", help="Log level"),
+    workers: int = typer.Option(1, help="Worker processes sharing the port"),
+    preload: bool = typer.Option(False, help="Load the models once in a parent process and fork the workers from it"),
 ):
     """Start the FastAPI server via uvicorn."""
     change_to_project_root()
+    if workers > 1 or preload:
+        if reload:
+            typer.echo("Auto-reload is not available with --workers/--preload; starting without it.")
+        cmd = [
+            "python", "-m", "src.server",
+            "--host", host, "--port", str(port), "--workers", str(workers), "--log-level", log_level,
+        ]
+        if preload:
+            cmd.append("--preload")
+        run_command(cmd, f"Starting API server ({workers} workers{', preloaded' if preload else ''})")
+        return
     cmd = [
         "python",
         "-m",
@@ -109,6 +133,20 @@ def api_add_key(description: str = typer.Argument(..., help="API key description
     run_command(cmd, "Adding API key")
 
 
+@api_app.command("revoke-key")
+def api_revoke_key(key: str = typer.Argument(..., help="API key, or its id from `api list-keys`")):
+    """Delete an API key; running API processes drop it from their key cache immediately."""
+    change_to_project_root()
+    run_command(["python", "scripts/manage_db.py", "--revoke-api-key", key], "Revoking API key")
+
+
+@api_app.command("list-keys")
+def api_list_keys():
+    """List API key ids and descriptions."""
+    change_to_project_root()
+    run_command(["python", "scripts/manage_db.py", "--list-api-keys"], "Listing API keys")
+
+
 @app.command()
 def version():
     typer.echo(__version__)
@@ -338,6 +376,167 @@ def db_recreate(
     run_command(cmd, "Recreating selected tables")
 
 
+# HNSW vector indexes
+db_indexes_app = typer.Typer(help="Build, rebuild, drop and inspect HNSW vector indexes")
+db_app.add_typer(db_indexes_app, name="indexes")
+
+
+def _index_cmd(action: str, tables: Optional[list[IndexedTable]], m: Optional[int] = None, ef_construction: Optional[int] = None) -> list[str]:
+    cmd = ["python", "scripts/manage_db.py", action]
+    for table in tables or []:
+        cmd.extend(["--index-table", table.value])
+    if m:
+        cmd.extend(["--hnsw-m", str(m)])
+    if ef_construction:
+        cmd.extend(["--hnsw-ef-construction", str(ef_construction)])
+    return cmd
+
+
+@db_indexes_app.command("build")
+def db_indexes_build(
+    table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable)"),
+    m: Optional[int] = typer.Option(None, help="HNSW m (defaults to HNSW_M)"),
+    ef_construction: Optional[int] = typer.Option(None, help="HNSW ef_construction (defaults to HNSW_EF_CONSTRUCTION)"),
+):
+    """Build missing HNSW indexes on the embedding columns."""
+    change_to_project_root()
+    run_command(_index_cmd("--create-indexes", table, m, ef_construction), "Building HNSW indexes")
+
+
+@db_indexes_app.command("rebuild")
+def db_indexes_rebuild(
+    table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable)"),
+    m: Optional[int] = typer.Option(None, help="HNSW m (defaults to HNSW_M)"),
+    ef_construction: Optional[int] = typer.Option(None, help="HNSW ef_construction (defaults to HNSW_EF_CONSTRUCTION)"),
+):
+    """Rebuild HNSW indexes CONCURRENTLY, applying new build parameters."""
+    change_to_project_root()
+    run_command(_index_cmd("--rebuild-indexes", table, m, ef_construction), "Rebuilding HNSW indexes")
+
+
+@db_indexes_app.command("drop")
+def db_indexes_drop(table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable)")):
+    """Drop HNSW indexes on the embedding columns."""
+    change_to_project_root()
+    run_command(_index_cmd("--drop-indexes", table), "Dropping HNSW indexes")
+
+
+@db_indexes_app.command("binary-build")
+def db_indexes_binary_build(
+    table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable, defaults to BINARY_PREFILTER_TABLES)"),
+    m: Optional[int] = typer.Option(None, help="HNSW m (defaults to HNSW_M)"),
+    ef_construction: Optional[int] = typer.Option(None, help="HNSW ef_construction (defaults to HNSW_EF_CONSTRUCTION)"),
+):
+    """Build the binary-quantization indexes used by the two-stage search."""
+    change_to_project_root()
+    run_command(_index_cmd("--create-binary-indexes", table, m, ef_construction), "Building binary prefilter indexes")
+
+
+@db_indexes_app.command("binary-drop")
+def db_indexes_binary_drop(table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable)")):
+    """Drop the binary-quantization indexes."""
+    change_to_project_root()
+    run_command(_index_cmd("--drop-binary-indexes", table), "Dropping binary prefilter indexes")
+
+
+@db_indexes_app.command("status")
+def db_indexes_status(table: Optional[list[IndexedTable]] = typer.Option(None, help="Restrict to table (repeatable)")):
+    """Show HNSW index status, size and build options."""
+    change_to_project_root()
+    run_command(_index_cmd("--index-status", table), "Checking HNSW indexes")
+
+
+class VectorStorage(str, Enum):
+    vector = "vector"
+    halfvec = "halfvec"
+
+
+@db_app.command("vector-storage")
+def db_vector_storage(
+    storage: VectorStorage = typer.Argument(..., help="Column type: vector (float32) or halfvec (float16)"),
+    table: Optional[list[str]] = typer.Option(None, help="Restrict to a table (repeatable)"),
+    m: Optional[int] = typer.Option(None, help="HNSW m (defaults to HNSW_M)"),
+    ef_construction: Optional[int] = typer.Option(None, help="HNSW ef_construction (defaults to HNSW_EF_CONSTRUCTION)"),
+):
+    """Convert the embedding columns in place and rebuild their HNSW indexes; then set VECTOR_STORAGE."""
+    change_to_project_root()
+    cmd = ["python", "scripts/manage_db.py", "--vector-storage", storage.value]
+    for name in table or []:
+        cmd.extend(["--index-table", name])
+    if m:
+        cmd.extend(["--hnsw-m", str(m)])
+    if ef_construction:
+        cmd.extend(["--hnsw-ef-construction", str(ef_construction)])
+    run_command(cmd, f"Converting embedding columns to {storage.value}")
+
+
+@db_app.command("version-triggers")
+def db_version_triggers(drop: bool = typer.Option(False, help="Remove the triggers instead of installing them")):
+    """Install the data-version triggers that invalidate cached /v2/similar results on ingest."""
+    change_to_project_root()
+    if drop:
+        run_command(["python", "scripts/manage_db.py", "--drop-version-triggers"], "Dropping data-version triggers")
+    else:
+        run_command(["python", "scripts/manage_db.py", "--install-version-triggers"], "Installing data-version triggers")
+
+
+@db_app.command("bump-version")
+def db_bump_version():
+    """Bump the content data version, dropping every cached search result."""
+    change_to_project_root()
+    run_command(["python", "scripts/manage_db.py", "--bump-data-version"], "Bumping data version")
+
+
+@db_app.command("rerank-text")
+def db_rerank_text(
+    status: bool = typer.Option(False, "--status", help="Only show which tables have the column"),
+    table: Optional[list[str]] = typer.Option(None, help="Restrict to a table (repeatable)"),
+):
+    """(Re)create the generated rerank_text columns read by the v2 reranking queries."""
+    change_to_project_root()
+    flag = "--rerank-text-status" if status else "--install-rerank-text"
+    cmd = ["python", "scripts/manage_db.py", flag]
+    for name in table or []:
+        cmd.extend(["--index-table", name])
+    run_command(cmd, "Checking rerank_text columns" if status else "Installing rerank_text columns")
+
+
+@db_app.command("source-urls")
+def db_source_urls(
+    status: bool = typer.Option(False, "--status", help="Only show the columns and coverage"),
+):
+    """(Re)create the stored url/source_url columns that question search serves directly."""
+    change_to_project_root()
+    flag = "--source-urls-status" if status else "--install-source-urls"
+    run_command(
+        ["python", "scripts/manage_db.py", flag],
+        "Checking source URLs" if status else "Installing source URLs",
+    )
+
+
+@db_app.command("search-vectors")
+def db_search_vectors(
+    status: bool = typer.Option(False, "--status", help="Only show row counts and triggers"),
+    sync: bool = typer.Option(False, "--sync", help="Only resync rows (triggers already installed)"),
+    drop: bool = typer.Option(False, "--drop", help="Remove the sync triggers"),
+    table: Optional[list[str]] = typer.Option(None, help="Restrict to a content table (repeatable)"),
+):
+    """Install and backfill the unified search_vectors table used when SEARCH_VECTORS_ENABLED=true."""
+    change_to_project_root()
+    if status:
+        flag, description = "--search-vectors-status", "Checking search_vectors"
+    elif sync:
+        flag, description = "--sync-search-vectors", "Syncing search_vectors"
+    elif drop:
+        flag, description = "--drop-search-vectors", "Dropping search_vectors triggers"
+    else:
+        flag, description = "--install-search-vectors", "Installing search_vectors"
+    cmd = ["python", "scripts/manage_db.py", flag]
+    for name in table or []:
+        cmd.extend(["--index-table", name])
+    run_command(cmd, description)
+
+
 # ---------- KEYWORDS ----------
 @keywords_app.command("add")
 def keywords_add(
@@ -483,5 +682,151 @@ def synonyms_list(of: Optional[str] = typer.Option(None, "--of", help="Filter by
             pass
 
 
+# ---------- BENCHMARKS ----------
+@bench_app.command("vector-params")
+def bench_vector_params(
+    iterations: int = typer.Option(200, help="Queries per variant"),
+    explain_samples: int = typer.Option(20, help="Queries to EXPLAIN per variant"),
+):
+    """Compare inline vector literals with bound pgvector parameters."""
+    change_to_project_root()
+    cmd = ["python", "scripts/benchmark.py", "vector-params", "--iterations", str(iterations), "--explain-samples", str(explain_samples)]
+    run_command(cmd, "Benchmarking vector parameter binding")
+
+
+@bench_app.command("binary-prefilter")
+def bench_binary_prefilter(
+    table: str = typer.Option("issues", help="Table to search"),
+    column: str = typer.Option("issue_embedding", help="Embedding column to search"),
+    queries: int = typer.Option(50, help="Stored embeddings used as queries"),
+    k: int = typer.Option(20, help="Rows per query (recall@k)"),
+):
+    """Compare recall and latency of exact, HNSW and binary-prefilter searches."""
+    change_to_project_root()
+    cmd = [
+        "python", "scripts/benchmark.py", "binary-prefilter",
+        "--table", table, "--column", column, "--queries", str(queries), "--k", str(k),
+    ]
+    run_command(cmd, "Benchmarking the binary prefilter")
+
+
+@bench_app.command("rerank-fanout")
+def bench_rerank_fanout(
+    query: str = typer.Option("dashboard filters are slow to load", help="Search text used to collect candidates"),
+    iterations: int = typer.Option(20, help="Rerank rounds per variant"),
+):
+    """Compare per-source reranks with one unified cross-encoder pass."""
+    change_to_project_root()
+    cmd = ["python", "scripts/benchmark.py", "rerank-fanout", "--query", query, "--iterations", str(iterations)]
+    run_command(cmd, "Benchmarking unified reranking")
+
+
+@bench_app.command("reranker-backends")
+def bench_reranker_backends(
+    query: str = typer.Option("dashboard filters are slow to load", help="Query paired with every document"),
+    pairs: int = typer.Option(64, help="Documents to score"),
+    iterations: int = typer.Option(10, help="Scoring rounds per backend"),
+):
+    """Compare the PyTorch and ONNX Runtime (fp32, int8) cross-encoder on CPU."""
+    change_to_project_root()
+    cmd = ["python", "scripts/benchmark.py", "reranker-backends", "--query", query, "--pairs", str(pairs), "--iterations", str(iterations)]
+    run_command(cmd, "Benchmarking reranker backends")
+
+
+@bench_app.command("embedding-backends")
+def bench_embedding_backends(
+    texts: int = typer.Option(256, help="Texts to embed per backend"),
+    iterations: int = typer.Option(20, help="Single-query rounds per backend"),
+    min_cosine: float = typer.Option(0.99, help="Fail when any ONNX embedding is less similar to torch"),
+):
+    """Check ONNX embedding parity with PyTorch and compare CPU throughput."""
+    change_to_project_root()
+    cmd = [
+        "python", "scripts/benchmark.py", "embedding-backends",
+        "--texts", str(texts), "--iterations", str(iterations), "--min-cosine", str(min_cosine),
+    ]
+    run_command(cmd, "Benchmarking embedding backends")
+
+
+@bench_app.command("embedding-batching")
+def bench_embedding_batching(
+    requests: int = typer.Option(500, help="Texts to embed per variant"),
+    concurrency: int = typer.Option(32, help="Concurrent caller threads"),
+    max_batch_size: int = typer.Option(32, help="Micro-batch size limit"),
+    max_wait_ms: float = typer.Option(5.0, help="Micro-batch collection window"),
+):
+    """Compare concurrent single-text embeddings with and without micro-batching."""
+    change_to_project_root()
+    cmd = [
+        "python", "scripts/benchmark.py", "embedding-batching",
+        "--requests", str(requests), "--concurrency", str(concurrency),
+        "--max-batch-size", str(max_batch_size), "--max-wait-ms", str(max_wait_ms),
+    ]
+    run_command(cmd, "Benchmarking embedding micro-batching")
+
+
+@bench_app.command("embedding-transport")
+def bench_embedding_transport(
+    url: str = typer.Option("http://localhost:8000", help="API base URL"),
+    api_key: Optional[str] = typer.Option(None, help="X-API-Key header value"),
+    texts: int = typer.Option(128, help="Texts per round"),
+    chunk_size: int = typer.Option(64, help="Texts per bulk request"),
+):
+    """Compare per-text /embedding calls with bulk /embeddings (json, float32, float16)."""
+    change_to_project_root()
+    cmd = ["python", "scripts/benchmark.py", "embedding-transport", "--url", url, "--texts", str(texts), "--chunk-size", str(chunk_size)]
+    if api_key:
+        cmd.extend(["--api-key", api_key])
+    run_command(cmd, "Benchmarking embedding transport")
+
+
+@bench_app.command("http-load")
+def bench_http_load(
+    url: str = typer.Option("http://localhost:8000", help="API base URL"),
+    endpoint: str = typer.Option("/v2/similar", help="Search endpoint to POST to"),
+    api_key: Optional[str] = typer.Option(None, help="X-API-Key header value"),
+    concurrency: int = typer.Option(50, help="Concurrent clients"),
+    requests: int = typer.Option(500, help="Total requests"),
+    unique: bool = typer.Option(True, help="Vary the query text to defeat caches"),
+):
+    """Measure throughput and latency of a running API under concurrent load."""
+    change_to_project_root()
+    cmd = [
+        "python", "scripts/benchmark.py", "http-load",
+        "--url", url, "--endpoint", endpoint,
+        "--concurrency", str(concurrency), "--requests", str(requests),
+        "--unique" if unique else "--no-unique",
+    ]
+    if api_key:
+        cmd.extend(["--api-key", api_key])
+    run_command(cmd, "Benchmarking concurrent HTTP load")
+
+
+@bench_app.command("rate-limiter")
+def bench_rate_limiter(
+    iterations: int = typer.Option(5000, help="Limit checks per storage"),
+    processes: int = typer.Option(4, help="Processes sharing one client's limit"),
+):
+    """Compare in-memory and shared SQLite rate-limit storage."""
+    change_to_project_root()
+    cmd = [
+        "python", "scripts/benchmark.py", "rate-limiter",
+        "--iterations", str(iterations), "--processes", str(processes),
+    ]
+    run_command(cmd, "Benchmarking rate-limit storage")
+
+
+@bench_app.command("import-time")
+def bench_import_time(
+    max_seconds: Optional[float] = typer.Option(None, help="Fail when any module takes longer to import"),
+):
+    """Measure cold import times and check CLI modules do not load torch or litellm."""
+    change_to_project_root()
+    cmd = ["python", "scripts/benchmark.py", "import-time"]
+    if max_seconds is not None:
+        cmd.extend(["--max-seconds", str(max_seconds)])
+    run_command(cmd, "Benchmarking import time")
+
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
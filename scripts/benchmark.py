@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the similarity search stack.
+Each subcommand measures one optimization against the behavior it replaced.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+# Use the shared path setup utility
+from path_setup import setup_project_path
+setup_project_path()
+
+
+def random_embedding(dim: int = 768, seed: int = 0) -> List[float]:
+    """Unit-length random vector shaped like a real query embedding."""
+    rng = random.Random(seed)
+    values = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in values) ** 0.5
+    return [v / norm for v in values]
+
+
+def summarize_timings(label: str, timings_ms: List[float]) -> Dict[str, float]:
+    """Print and return latency percentiles for a list of millisecond timings."""
+    ordered = sorted(timings_ms)
+    summary = {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+    print(
+        f"  {label:<32} mean {summary['mean']:8.2f} ms | p50 {summary['p50']:8.2f} ms | "
+        f"p95 {summary['p95']:8.2f} ms | max {summary['max']:8.2f} ms"
+    )
+    return summary
+
+
+def time_calls(fn: Callable[[], object], iterations: int, warmup: int = 3) -> List[float]:
+    """Run fn repeatedly and return per-call wall time in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+# ---------- vector-params ----------
+def bench_vector_params(args):
+    """Inline '[...]'::vector literals vs. a bound binary pgvector parameter."""
+    from sqlalchemy import text
+    from src.db import SessionLocal
+    from src import settings
+    from src.similarity_query_builder import SimilarityQueryBuilder, QUERY_EMBEDDING_PARAM, to_vector_param, vector_param_sql
+
+    builder = SimilarityQueryBuilder()
+    columns = {
+        'id': 'number',
+        'select_cols': 'number, title, state',
+        'title_embedding': 'title_embedding',
+        'issue_embedding': 'issue_embedding',
+        'summary_embedding': 'summary_embedding',
+        'group_by': 'number, title, state'
+    }
+    bound_sql = builder.build_similarity_query('issues', QUERY_EMBEDDING_PARAM, columns)
+    embeddings = [random_embedding(seed=i) for i in range(args.iterations)]
+
+    def inline_sql(embedding: List[float]) -> str:
+        embedding_literal = "'[" + ','.join(str(v) for v in embedding) + f"]'::{settings.VECTOR_STORAGE}"
+        return bound_sql.replace(vector_param_sql(), embedding_literal)
+
+    def planning_time_ms(db, sql: str, params: dict) -> float:
+        plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql.rstrip().rstrip(';')}"), params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0].get("Planning Time", 0.0))
+
+    print(f"Benchmarking {args.iterations} issue similarity queries (v1 shape, 3 CTEs)")
+    db = SessionLocal()
+    try:
+        counter = iter(range(10 ** 9))
+
+        def run_inline():
+            embedding = embeddings[next(counter) % len(embeddings)]
+            db.execute(text(inline_sql(embedding))).fetchall()
+
+        def run_bound():
+            embedding = embeddings[next(counter) % len(embeddings)]
+            db.execute(text(bound_sql), {QUERY_EMBEDDING_PARAM: to_vector_param(embedding)}).fetchall()
+
+        print("\nClient-side statement construction:")
+        summarize_timings("inline literal (format floats)", time_calls(lambda: inline_sql(embeddings[0]), args.iterations))
+        summarize_timings("bound parameter (numpy)", time_calls(lambda: to_vector_param(embeddings[0]), args.iterations))
+
+        print("\nServer planning time (EXPLAIN ANALYZE):")
+        summarize_timings("inline literal", [
+            planning_time_ms(db, inline_sql(e), {}) for e in embeddings[:args.explain_samples]
+        ])
+        summarize_timings("bound parameter", [
+            planning_time_ms(db, bound_sql, {QUERY_EMBEDDING_PARAM: to_vector_param(e)})
+            for e in embeddings[:args.explain_samples]
+        ])
+
+        print("\nEnd-to-end execution (same connection, prepared after DB_PREPARE_THRESHOLD runs):")
+        summarize_timings("inline literal", time_calls(run_inline, args.iterations))
+        summarize_timings("bound parameter", time_calls(run_bound, args.iterations))
+    finally:
+        db.close()
+
+
+# ---------- binary-prefilter ----------
+def bench_binary_prefilter(args):
+    """Exact scan vs. HNSW vs. binary prefilter + rescoring: recall@k and latency."""
+    import numpy as np
+    from sqlalchemy import text
+    from src import settings
+    from src.db import SessionLocal
+    from src.similarity_query_builder import SimilarityQueryBuilder, QUERY_EMBEDDING_PARAM, to_vector_param, vector_param_sql
+
+    builder = SimilarityQueryBuilder()
+    query_vector = vector_param_sql()
+
+    def sql_for(binary_prefilter: bool) -> str:
+        return builder.nearest_rows_sql(
+            args.table, args.column, "id", query_vector, args.k, binary_prefilter=binary_prefilter
+        )
+
+    with SessionLocal() as db:
+        # Stored embeddings as queries: realistic vectors, and each finds itself at rank 1 in every variant
+        rows = db.execute(
+            text(f"SELECT {args.column} FROM {args.table} WHERE {args.column} IS NOT NULL ORDER BY random() LIMIT :n"),
+            {"n": args.queries},
+        ).all()
+        queries = [
+            to_vector_param(row[0].to_list() if hasattr(row[0], "to_list") else np.asarray(row[0]))
+            for row in rows
+        ]
+        if not queries:
+            print(f"No embeddings found in {args.table}.{args.column}.")
+            return
+        print(f"{len(queries)} queries against {args.table}.{args.column} ({settings.VECTOR_STORAGE}), recall@{args.k}")
+
+        def run_variant(sql: str, setup: List[str]):
+            results, timings = [], []
+            for embedding in queries:
+                for statement in setup:
+                    db.execute(text(statement))
+                start = time.perf_counter()
+                ids = [row.id for row in db.execute(text(sql), {QUERY_EMBEDDING_PARAM: embedding})]
+                timings.append((time.perf_counter() - start) * 1000)
+                db.commit()
+                results.append(ids)
+            return results, timings
+
+        exact, timings = run_variant(sql_for(False), ["SET LOCAL enable_indexscan = off"])
+        summarize_timings("exact scan", timings)
+
+        def report(label: str, sql: str, setup: List[str]):
+            results, timings = run_variant(sql, setup)
+            recall = statistics.fmean(
+                len(set(found) & set(truth)) / max(1, len(truth)) for found, truth in zip(results, exact)
+            )
+            summarize_timings(label, timings)
+            print(f"  {'':<32} recall@{args.k} {recall:.3f}")
+
+        report("hnsw (full precision)", sql_for(False), [f"SET LOCAL hnsw.ef_search = {max(args.k, 40)}"])
+        configured = settings.BINARY_PREFILTER_CANDIDATES
+        try:
+            for candidates in args.candidates:
+                settings.BINARY_PREFILTER_CANDIDATES = candidates
+                report(
+                    f"binary prefilter ({candidates})", sql_for(True),
+                    [f"SET LOCAL hnsw.ef_search = {max(candidates, args.k)}"],
+                )
+        finally:
+            settings.BINARY_PREFILTER_CANDIDATES = configured
+
+
+# ---------- rerank-fanout ----------
+def bench_rerank_fanout(args):
+    """Four concurrent per-source reranks vs. one length-sorted cross-encoder pass."""
+    from concurrent.futures import ThreadPoolExecutor
+    from src import settings
+    from src.db import AsyncSessionLocal
+    from src.reranker_client import extract_document_content
+    from src.reranker_service import get_reranker_service
+    from src.search_context import build_search_context
+    from src.api import V2_SOURCES
+
+    # Reuse the model the API module already loaded
+    client = getattr(getattr(get_reranker_service(), 'provider', None), 'client', None)
+    if client is None:
+        print("This benchmark needs the local reranker (RERANKER_ENABLED=true, RERANKER_PROVIDER=local).")
+        return
+    search_context = build_search_context(args.query)
+
+    async def collect_all():
+        async with AsyncSessionLocal() as db:
+            return {
+                source_type: await collect(db, search_context)
+                for source_type, (_, collect, _) in V2_SOURCES.items()
+            }
+
+    per_source = asyncio.run(collect_all())
+
+    per_source_pairs = {
+        source_type: [
+            (args.query, extract_document_content(candidate) or "No content available")
+            for candidate in candidates
+        ]
+        for source_type, candidates in per_source.items()
+    }
+    all_pairs = [pair for pairs in per_source_pairs.values() for pair in pairs]
+    if not all_pairs:
+        print("No candidates found for this query; try a different --query.")
+        return
+
+    counts = ", ".join(f"{source_type}={len(pairs)}" for source_type, pairs in per_source_pairs.items())
+    print(f"Reranking {len(all_pairs)} candidates ({counts}) on {client.device}, batch size {settings.RERANKER_BATCH_SIZE}")
+
+    executor = ThreadPoolExecutor(max_workers=len(per_source_pairs))
+
+    def run_per_source():
+        # Previous behavior: one unsorted predict per source, issued concurrently
+        futures = [
+            executor.submit(client.model.predict, pairs, show_progress_bar=False)
+            for pairs in per_source_pairs.values() if pairs
+        ]
+        for future in futures:
+            future.result()
+
+    def run_unified():
+        client._predict(all_pairs)
+
+    try:
+        summarize_timings("4 per-source reranks (threads)", time_calls(run_per_source, args.iterations))
+        summarize_timings("1 unified length-sorted rerank", time_calls(run_unified, args.iterations))
+    finally:
+        executor.shutdown()
+
+
+# ---------- reranker-backends ----------
+def _ranks(values: List[float]) -> List[float]:
+    """Rank positions (0 = lowest) used for a Spearman correlation."""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    for rank, index in enumerate(order):
+        ranks[index] = float(rank)
+    return ranks
+
+
+def bench_reranker_backends(args):
+    """PyTorch CrossEncoder vs. ONNX Runtime fp32 and int8: latency and score agreement."""
+    from sqlalchemy import text
+    from src import settings
+    from src.db import SessionLocal
+    from src.rerank_text import RERANK_TEXT_FORMATS
+    from src.reranker_client import OnnxRerankerClient, RerankerClient
+
+    per_table = max(1, args.pairs // len(RERANK_TEXT_FORMATS))
+    with SessionLocal() as db:
+        documents = [
+            row[0]
+            for table in RERANK_TEXT_FORMATS
+            for row in db.execute(
+                text(f"SELECT rerank_text FROM {table} WHERE rerank_text IS NOT NULL ORDER BY id LIMIT :limit"),
+                {"limit": per_table},
+            )
+        ]
+    if not documents:
+        print("No rerank_text rows found; ingest data and run `run.py db rerank-text` first.")
+        return
+    pairs = [(args.query, document) for document in documents]
+
+    clients = {"torch": RerankerClient(model_name=settings.RERANKER_MODEL, device="cpu")}
+    clients["onnx fp32"] = OnnxRerankerClient(model_name=settings.RERANKER_MODEL, quantize=False)
+    clients["onnx int8"] = OnnxRerankerClient(model_name=settings.RERANKER_MODEL, quantize=True)
+
+    print(f"Scoring {len(pairs)} pairs on CPU, batch size {settings.RERANKER_BATCH_SIZE}")
+    scores = {}
+    for label, client in clients.items():
+        scores[label] = client._predict(pairs)
+        summarize_timings(label, time_calls(lambda: client._predict(pairs), args.iterations))
+
+    reference = scores["torch"]
+    top_k = min(10, len(pairs))
+    reference_top = set(sorted(range(len(pairs)), key=lambda i: reference[i], reverse=True)[:top_k])
+    print("Agreement with torch:")
+    for label in ("onnx fp32", "onnx int8"):
+        candidate = scores[label]
+        max_diff = max(abs(a - b) for a, b in zip(reference, candidate))
+        spearman = statistics.correlation(_ranks(reference), _ranks(candidate)) if len(pairs) > 1 else 1.0
+        top = set(sorted(range(len(pairs)), key=lambda i: candidate[i], reverse=True)[:top_k])
+        print(
+            f"  {label:<32} max |diff| {max_diff:.4f} | spearman {spearman:.4f} | "
+            f"top-{top_k} overlap {len(top & reference_top)}/{top_k}"
+        )
+
+
+# ---------- embedding-backends ----------
+def bench_embedding_backends(args):
+    """PyTorch vs. ONNX Runtime fp32 and int8 embeddings: cosine parity and CPU throughput."""
+    import numpy as np
+    from src.embedding_service import LocalEmbeddingProvider
+
+    rng = random.Random(0)
+    words = "dashboard filter query question collection database sync slow error chart pivot export".split()
+    # Include texts past the model's token window so truncation is compared too
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 600))) for _ in range(args.texts)]
+
+    providers = {
+        backend: LocalEmbeddingProvider(device="cpu", max_batch_size=1, backend=backend)
+        for backend in ("torch", "onnx", "onnx-int8")
+    }
+    print(f"Embedding {len(texts)} texts on CPU")
+
+    embeddings = {}
+    for backend, provider in providers.items():
+        embeddings[backend] = np.asarray(provider.model.encode(texts), dtype=np.float32)
+        summarize_timings(f"{backend}: single query", time_calls(lambda: provider.model.encode(texts[0]), args.iterations))
+        started = time.perf_counter()
+        provider.model.encode(texts)
+        elapsed = time.perf_counter() - started
+        print(f"  {backend + ': batch':<32} throughput {len(texts) / elapsed:8.1f} texts/s")
+
+    def unit(matrix):
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    reference = unit(embeddings["torch"])
+    failed = []
+    print(f"Cosine agreement with torch (required >= {args.min_cosine}):")
+    for backend in ("onnx", "onnx-int8"):
+        cosines = (reference * unit(embeddings[backend])).sum(axis=1)
+        print(f"  {backend:<32} min {cosines.min():.4f} | mean {cosines.mean():.4f}")
+        if cosines.min() < args.min_cosine:
+            failed.append(backend)
+    if failed:
+        raise SystemExit(f"Parity check failed for: {', '.join(failed)}")
+
+
+# ---------- embedding-batching ----------
+def bench_embedding_batching(args):
+    """Concurrent single-text embeddings with and without micro-batching."""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.embedding_service import LocalEmbeddingProvider
+    from src.micro_batcher import MicroBatcher
+
+    # One model shared by both variants; micro-batching is toggled by attaching a batcher
+    provider = LocalEmbeddingProvider(max_batch_size=1)
+    batcher = MicroBatcher(
+        provider._encode_texts, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, name="bench-batcher"
+    )
+    rng = random.Random(0)
+    words = "dashboard filter query question collection database sync slow error chart pivot export".split()
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for _ in range(args.requests)]
+
+    print(f"Embedding {args.requests} texts from {args.concurrency} threads on {provider.device} "
+          f"(batch up to {args.max_batch_size} / {args.max_wait_ms} ms)")
+
+    for label, attached in (("unbatched", None), ("micro-batched", batcher)):
+        provider.batcher = attached
+        summarize_timings(f"{label}: single request", time_calls(lambda: provider.create_embedding(texts[0]), 20))
+
+        latencies: List[float] = []
+
+        def timed(text: str):
+            start = time.perf_counter()
+            provider.create_embedding(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(timed, texts))
+        elapsed = time.perf_counter() - started
+        summarize_timings(f"{label}: under load", latencies)
+        print(f"  {label:<32} throughput {len(texts) / elapsed:8.1f} texts/s")
+
+    print(f"  batcher stats: {batcher.stats()}")
+
+
+# ---------- embedding-transport ----------
+def bench_embedding_transport(args):
+    """Per-text /embedding calls vs. bulk /embeddings in JSON, float32 and float16."""
+    import requests
+    from src.embedding_codec import EMBEDDINGS_MEDIA_TYPE, decode_embeddings
+
+    session = requests.Session()
+    if args.api_key:
+        session.headers["X-API-Key"] = args.api_key
+    rng = random.Random(0)
+    words = "dashboard filter query question collection database sync slow error chart pivot export".split()
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for _ in range(args.texts)]
+
+    def per_text():
+        received = 0
+        for text in texts:
+            response = session.post(f"{args.url}/embedding", json={"text": text})
+            response.raise_for_status()
+            received += len(response.content)
+        return received
+
+    def bulk(fmt: str):
+        def run():
+            received = 0
+            for start in range(0, len(texts), args.chunk_size):
+                chunk = texts[start:start + args.chunk_size]
+                response = session.post(f"{args.url}/embeddings", json={"texts": chunk, "format": fmt})
+                response.raise_for_status()
+                if response.headers.get("Content-Type", "").startswith(EMBEDDINGS_MEDIA_TYPE):
+                    decode_embeddings(response.content)
+                else:
+                    response.json()
+                received += len(response.content)
+            return received
+        return run
+
+    print(f"Embedding {len(texts)} texts via {args.url} (bulk chunks of {args.chunk_size})")
+    variants = [("per-text /embedding (json)", per_text)] + [
+        (f"bulk /embeddings ({fmt})", bulk(fmt)) for fmt in ("json", "float32", "float16")
+    ]
+    for label, run in variants:
+        received = run()
+        timings = time_calls(run, args.iterations, warmup=0)
+        summarize_timings(label, timings)
+        print(f"  {'':<32} {received / 1024:10.1f} KB received, {len(texts) * 1000 / statistics.fmean(timings):8.1f} texts/s")
+
+
+# ---------- http-load ----------
+def bench_http_load(args):
+    """Throughput and latency of a running API under N concurrent clients."""
+    import httpx
+
+    payload = {"text": args.text}
+    if args.state:
+        payload["state"] = args.state
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+
+    async def run():
+        timings: List[float] = []
+        statuses: Dict[int, int] = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(i)
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=args.timeout) as client:
+            async def worker():
+                while True:
+                    try:
+                        i = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    # Vary the text so the result and embedding caches do not serve every request
+                    body = dict(payload, text=f"{args.text} {i}" if args.unique else args.text)
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(args.endpoint, json=body)
+                        status = response.status_code
+                    except httpx.HTTPError:
+                        status = -1
+                    timings.append((time.perf_counter() - start) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+        return timings, statuses, elapsed
+
+    print(f"POST {args.url}{args.endpoint}: {args.requests} requests, {args.concurrency} concurrent")
+    timings, statuses, elapsed = asyncio.run(run())
+    print(f"  throughput {len(timings) / elapsed:8.2f} req/s over {elapsed:.1f} s")
+    print(f"  status codes: {', '.join(f'{code}={count}' for code, count in sorted(statuses.items()))}")
+    summarize_timings("request latency", timings)
+    print("Run against builds before and after a change with the same arguments to compare them.")
+    if any(code == 429 for code in statuses):
+        print("Note: 429 responses come from the per-client rate limit; raise it or use several API keys for load tests.")
+
+
+# ---------- rate-limiter ----------
+def _rate_limit_worker(uri: str, limit: str, key: str, hits: int, results) -> None:
+    """Child process: hit one shared bucket `hits` times and report how many were allowed."""
+    from limits import parse
+    from limits.storage import storage_from_string
+    from limits.strategies import FixedWindowRateLimiter
+    import src.rate_limit  # noqa: F401 - registers the sqlite:// scheme
+
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    item = parse(limit)
+    results.put(sum(1 for _ in range(hits) if limiter.hit(item, key)))
+
+
+def bench_rate_limiter(args):
+    """Per-check overhead of each limiter storage, and whether N processes share one limit."""
+    import multiprocessing
+    import tempfile
+    from limits import parse
+    from limits.storage import storage_from_string
+    from limits.strategies import FixedWindowRateLimiter
+    import src.rate_limit  # noqa: F401 - registers the sqlite:// scheme
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uris = {"memory": "memory://", "sqlite": f"sqlite:///{tmp}/rate_limits.sqlite3"}
+        print(f"Rate-limit check overhead ({args.iterations} checks, 1 key / {args.keys} keys):")
+        for label, uri in uris.items():
+            limiter = FixedWindowRateLimiter(storage_from_string(uri))
+            item = parse("1000000/minute")
+            summarize_timings(f"{label}: same key", time_calls(lambda: limiter.hit(item, "bench", "hot"), args.iterations))
+            counter = iter(range(10 ** 9))
+            summarize_timings(
+                f"{label}: {args.keys} keys",
+                time_calls(lambda: limiter.hit(item, "bench", f"key-{next(counter) % args.keys}"), args.iterations),
+            )
+
+        # Each process models one uvicorn worker enforcing the same limit for the same client
+        limit_count = 10
+        print(f"\n{args.processes} processes x {args.hits} hits against a {limit_count}/minute limit:")
+        context = multiprocessing.get_context("spawn")
+        for label, uri in uris.items():
+            results = context.Queue()
+            workers = [
+                context.Process(target=_rate_limit_worker, args=(uri, f"{limit_count}/minute", "shared", args.hits, results))
+                for _ in range(args.processes)
+            ]
+            for worker in workers:
+                worker.start()
+            allowed = sum(results.get() for _ in workers)
+            for worker in workers:
+                worker.join()
+            verdict = "shared" if allowed == limit_count else f"{allowed / limit_count:.0f}x the limit"
+            print(f"  {label:<32} allowed {allowed:4d} requests ({verdict})")
+
+
+# ---------- import-time ----------
+# Packages that must only load when a model or an LLM is actually used
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "litellm", "onnxruntime")
+# Modules the CLI commands import; none of them may pull in HEAVY_MODULES
+LIGHT_MODULES = (
+    "src.settings", "src.db", "src.models", "src.keyword_service", "src.llm_client",
+    "src.batch_processor", "src.embedding_service", "src.reranker_service", "src.vector_indexes",
+    "src.onnx_utils",
+)
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - started, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def bench_import_time(args):
+    """Cold import time of each module in a fresh interpreter, and which heavy packages it drags in."""
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    project_root = str(Path(__file__).resolve().parent.parent)
+    failures = []
+    print(f"Cold imports ({args.repeat} fresh interpreters each, best run shown):")
+    for module in args.modules:
+        runs = []
+        for _ in range(args.repeat):
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                cwd=project_root, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                print(f"  {module:<28} failed: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode}")
+                failures.append(module)
+                break
+            runs.append((json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr))
+        if not runs:
+            continue
+        result, importtime_log = min(runs, key=lambda run: run[0]["seconds"])
+
+        # `-X importtime` lines: "import time: self [us] | cumulative | package"; unindented names are top level
+        top_level = []
+        for line in importtime_log.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and line.startswith("import time:") and not parts[2].startswith("  ") and parts[1].strip().isdigit():
+                top_level.append((int(parts[1]), parts[2].strip()))
+        slowest = ", ".join(f"{name} {us / 1000:.0f} ms" for us, name in sorted(top_level, reverse=True)[:args.top])
+
+        heavy = ", ".join(result["loaded"]) or "none"
+        print(f"  {module:<28} {result['seconds'] * 1000:8.0f} ms | heavy: {heavy}")
+        print(f"  {'':<28} slowest: {slowest}")
+        if module in LIGHT_MODULES and result["loaded"]:
+            failures.append(f"{module} imports {heavy}")
+        if args.max_seconds and result["seconds"] > args.max_seconds:
+            failures.append(f"{module} took {result['seconds']:.2f} s (limit {args.max_seconds} s)")
+
+    if failures:
+        raise SystemExit("Import-time regression: " + "; ".join(failures))
+    print("No light module imports torch, sentence-transformers, transformers, litellm or onnxruntime.")
+
+
+def main():
+    """Main entry point for the benchmark script."""
+    parser = argparse.ArgumentParser(description="Benchmark the similarity search stack.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    vector_params = subparsers.add_parser("vector-params", help="Inline vector literals vs. bound pgvector parameters.")
+    vector_params.add_argument("--iterations", type=int, default=200, help="Queries per variant.")
+    vector_params.add_argument("--explain-samples", type=int, default=20, help="Queries to EXPLAIN per variant.")
+    vector_params.set_defaults(func=bench_vector_params)
+
+    binary_prefilter = subparsers.add_parser("binary-prefilter", help="Exact vs. HNSW vs. binary-quantized prefilter with rescoring.")
+    binary_prefilter.add_argument("--table", default="issues", help="Table to search.")
+    binary_prefilter.add_argument("--column", default="issue_embedding", help="Embedding column to search.")
+    binary_prefilter.add_argument("--queries", type=int, default=50, help="Stored embeddings used as queries.")
+    binary_prefilter.add_argument("--k", type=int, default=20, help="Rows per query (recall@k).")
+    binary_prefilter.add_argument("--candidates", type=int, nargs="+", default=[100, 200, 400, 800], help="Stage-one candidate counts to compare.")
+    binary_prefilter.set_defaults(func=bench_binary_prefilter)
+
+    rerank_fanout = subparsers.add_parser("rerank-fanout", help="Per-source reranks vs. one unified cross-encoder pass.")
+    rerank_fanout.add_argument("--query", default="dashboard filters are slow to load", help="Search text used to collect candidates.")
+    rerank_fanout.add_argument("--iterations", type=int, default=20, help="Rerank rounds per variant.")
+    rerank_fanout.set_defaults(func=bench_rerank_fanout)
+
+    reranker_backends = subparsers.add_parser("reranker-backends", help="PyTorch vs. ONNX Runtime (fp32, int8) cross-encoder on CPU.")
+    reranker_backends.add_argument("--query", default="dashboard filters are slow to load", help="Query paired with every document.")
+    reranker_backends.add_argument("--pairs", type=int, default=64, help="Documents to score, spread over the content tables.")
+    reranker_backends.add_argument("--iterations", type=int, default=10, help="Scoring rounds per backend.")
+    reranker_backends.set_defaults(func=bench_reranker_backends)
+
+    embedding_backends = subparsers.add_parser("embedding-backends", help="PyTorch vs. ONNX Runtime (fp32, int8) embeddings on CPU.")
+    embedding_backends.add_argument("--texts", type=int, default=256, help="Texts to embed per backend.")
+    embedding_backends.add_argument("--iterations", type=int, default=20, help="Single-query rounds per backend.")
+    embedding_backends.add_argument("--min-cosine", type=float, default=0.99, help="Fail when any ONNX embedding is less similar to torch.")
+    embedding_backends.set_defaults(func=bench_embedding_backends)
+
+    embedding_batching = subparsers.add_parser("embedding-batching", help="Concurrent embeddings with and without micro-batching.")
+    embedding_batching.add_argument("--requests", type=int, default=500, help="Texts to embed per variant.")
+    embedding_batching.add_argument("--concurrency", type=int, default=32, help="Concurrent caller threads.")
+    embedding_batching.add_argument("--max-batch-size", type=int, default=32, help="Micro-batch size limit.")
+    embedding_batching.add_argument("--max-wait-ms", type=float, default=5.0, help="Micro-batch collection window.")
+    embedding_batching.set_defaults(func=bench_embedding_batching)
+
+    embedding_transport = subparsers.add_parser("embedding-transport", help="Per-text vs. bulk embedding requests against a running API.")
+    embedding_transport.add_argument("--url", default="http://localhost:8000", help="API base URL.")
+    embedding_transport.add_argument("--api-key", default=None, help="X-API-Key header value.")
+    embedding_transport.add_argument("--texts", type=int, default=128, help="Texts per round.")
+    embedding_transport.add_argument("--chunk-size", type=int, default=64, help="Texts per bulk request.")
+    embedding_transport.add_argument("--iterations", type=int, default=3, help="Rounds per variant.")
+    embedding_transport.set_defaults(func=bench_embedding_transport)
+
+    http_load = subparsers.add_parser("http-load", help="Concurrent HTTP load against a running API.")
+    http_load.add_argument("--url", default="http://localhost:8000", help="API base URL.")
+    http_load.add_argument("--endpoint", default="/v2/similar", help="Search endpoint to POST to.")
+    http_load.add_argument("--api-key", default=None, help="X-API-Key header value.")
+    http_load.add_argument("--text", default="dashboard filters are slow to load", help="Search text.")
+    http_load.add_argument("--state", default=None, help="Optional issue state filter.")
+    http_load.add_argument("--concurrency", type=int, default=50, help="Concurrent clients.")
+    http_load.add_argument("--requests", type=int, default=500, help="Total requests.")
+    http_load.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    http_load.add_argument("--unique", action=argparse.BooleanOptionalAction, default=True, help="Append the request number to the text to defeat caches.")
+    http_load.set_defaults(func=bench_http_load)
+
+    rate_limiter = subparsers.add_parser("rate-limiter", help="In-memory vs. shared SQLite rate-limit storage.")
+    rate_limiter.add_argument("--iterations", type=int, default=5000, help="Limit checks per storage.")
+    rate_limiter.add_argument("--keys", type=int, default=1000, help="Distinct buckets in the many-keys run.")
+    rate_limiter.add_argument("--processes", type=int, default=4, help="Processes sharing one client's limit.")
+    rate_limiter.add_argument("--hits", type=int, default=20, help="Requests per process.")
+    rate_limiter.set_defaults(func=bench_rate_limiter)
+
+    import_time = subparsers.add_parser("import-time", help="Cold import time per module; fails when a CLI module loads torch or litellm.")
+    import_time.add_argument("--modules", nargs="+", default=list(LIGHT_MODULES), help="Modules to import.")
+    import_time.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module.")
+    import_time.add_argument("--top", type=int, default=5, help="Slowest top-level imports to list per module.")
+    import_time.add_argument("--max-seconds", type=float, default=None, help="Fail when any module takes longer to import.")
+    import_time.set_defaults(func=bench_import_time)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from sqlalchemy import text
 from src.db import SessionLocal
 from src.models import Issue
 from src.settings import GITHUB_REPO_OWNER, GITHUB_REPO_NAME
+from src.similarity_query_builder import QUERY_EMBEDDING_PARAM, vector_param_sql, to_vector_param
 
 def find_similar_issues_for_issue(db: Session, target_issue: Issue, min_similarity: float = 0.8) -> List[Tuple[int, str, str, str, float]]:
     """
@@ -41,9 +42,9 @@ def find_similar_issues_for_issue(db: Session, target_issue: Issue, min_similari
     if target_embedding is None:
         return []
     
-    # Convert embedding to SQL format
-    embedding_str = ','.join(str(v) for v in target_embedding)
-    embedding_sql = f"'[{embedding_str}]'::vector"
+    # The embedding, issue number and threshold are bound parameters, so the
+    # statement text is identical for every issue and gets prepared once
+    embedding_sql = vector_param_sql()
     
     # SQL query to find similar issues (excluding the target issue itself)
     sql = f"""
@@ -51,7 +52,7 @@ def find_similar_issues_for_issue(db: Session, target_issue: Issue, min_similari
         SELECT number, title, state, 1 - (issue_embedding <=> {embedding_sql}) AS similarity
         FROM issues
         WHERE issue_embedding IS NOT NULL 
-        AND number != {target_issue.number}
+        AND number != :target_number
         ORDER BY issue_embedding <=> {embedding_sql}
         LIMIT 50
     ),
@@ -59,7 +60,7 @@ def find_similar_issues_for_issue(db: Session, target_issue: Issue, min_similari
         SELECT number, title, state, 1 - (summary_embedding <=> {embedding_sql}) AS similarity
         FROM issues
         WHERE summary_embedding IS NOT NULL 
-        AND number != {target_issue.number}
+        AND number != :target_number
         ORDER BY summary_embedding <=> {embedding_sql}
         LIMIT 50
     ),
@@ -70,13 +71,17 @@ def find_similar_issues_for_issue(db: Session, target_issue: Issue, min_similari
     )
     SELECT number, title, state, MAX(similarity) AS similarity
     FROM all_sim
-    WHERE similarity >= {min_similarity}
+    WHERE similarity >= :min_similarity
     GROUP BY number, title, state
     ORDER BY similarity DESC
     LIMIT 20;
     """
     
-    result = db.execute(text(sql))
+    result = db.execute(text(sql), {
+        QUERY_EMBEDDING_PARAM: to_vector_param(target_embedding),
+        "target_number": target_issue.number,
+        "min_similarity": min_similarity,
+    })
     similar_issues = []
     
     for row in result:
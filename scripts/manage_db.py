@@ -1,9 +1,23 @@
 import argparse
 import secrets
 from sqlalchemy import text, or_
+from src import settings
 from src.db import engine, Base, SessionLocal
 from src.models import ApiKey, ChatSession, ChatSessionEntity, DiscoursePost, Issue, MetabaseDoc, Question, SourceType, KeywordDefinition, Synonym, BatchProcess
+from src.security import notify_api_keys_changed
 from src.text_utils import calculate_token_count
+from src.vector_indexes import (
+    create_hnsw_indexes, rebuild_hnsw_indexes, drop_hnsw_indexes, get_hnsw_index_status, get_session_ef_search,
+    migrate_vector_storage, create_binary_indexes, drop_binary_indexes
+)
+from src.data_version import (
+    CONTENT_TABLES, install_data_version_triggers, drop_data_version_triggers, bump_data_version, read_data_version
+)
+from src.rerank_text import install_rerank_text_columns, get_rerank_text_status
+from src.source_urls import install_source_urls, install_source_url_triggers, get_source_url_status
+from src.search_vectors import (
+    install_search_vector_triggers, drop_search_vector_triggers, sync_search_vectors, get_search_vector_status
+)
 
 def enable_vector_extension():
     """Enables the pgvector extension in the database."""
@@ -19,6 +33,10 @@ def recreate_database():
     Base.metadata.drop_all(bind=engine)
     print("Recreating all tables...")
     Base.metadata.create_all(bind=engine)
+    install_data_version_triggers()
+    install_source_url_triggers()
+    if settings.SEARCH_VECTORS_ENABLED:
+        install_search_vector_triggers()
     print("Database has been reset successfully.")
 
 def recreate_issues_table():
@@ -43,12 +61,42 @@ def add_api_key(description: str):
     new_key = secrets.token_urlsafe(32)
     api_key_record = ApiKey(key=new_key, description=description)
     db.add(api_key_record)
+    # Drops cached rejections of this key in running API processes
+    notify_api_keys_changed(db)
     db.commit()
     print(f"New API Key created successfully!")
     print(f"  Description: {description}")
     print(f"  Key: {new_key}")
     db.close()
 
+def revoke_api_key(key_or_id: str):
+    """Deletes an API key, given the key itself or its id, and evicts it from the API caches."""
+    db = SessionLocal()
+    condition = ApiKey.key == key_or_id
+    if key_or_id.isdigit():
+        condition = or_(condition, ApiKey.id == int(key_or_id))
+    api_keys = db.query(ApiKey).filter(condition).all()
+    if not api_keys:
+        print("No matching API key found.")
+        db.close()
+        return
+    for api_key_record in api_keys:
+        db.delete(api_key_record)
+    notify_api_keys_changed(db)
+    db.commit()
+    for api_key_record in api_keys:
+        print(f"Revoked API key {api_key_record.id} ({api_key_record.description}).")
+    db.close()
+
+def list_api_keys():
+    """Lists API keys by id and description; only a prefix of each key is shown."""
+    db = SessionLocal()
+    api_keys = db.query(ApiKey).order_by(ApiKey.id).all()
+    print(f"API keys: {len(api_keys)}")
+    for api_key_record in api_keys:
+        print(f"  {api_key_record.id}: {api_key_record.key[:6]}... {api_key_record.description} (created {api_key_record.created_at})")
+    db.close()
+
 def clear_discourse_posts():
     """Clears all discourse posts from the database."""
     db = SessionLocal()
@@ -153,6 +201,7 @@ def recreate_questions_table():
     Question.__table__.drop(bind=engine, checkfirst=True)
     print("Recreating questions table...")
     Question.__table__.create(bind=engine, checkfirst=True)
+    install_source_url_triggers()
     print("Questions table has been recreated successfully.")
 
 def clear_questions():
@@ -596,6 +645,151 @@ def add_sample_keywords():
     
     print(f"\nAdded {added_count} sample keyword definitions.")
 
+def create_vector_indexes(tables=None, m=None, ef_construction=None):
+    """Builds the missing HNSW indexes on the embedding columns."""
+    print("Building HNSW vector indexes (CONCURRENTLY)...")
+    created = create_hnsw_indexes(tables, m=m, ef_construction=ef_construction)
+    for index_name in created:
+        print(f"  ✓ Created {index_name}")
+    print(f"Created {len(created)} index(es).")
+
+def rebuild_vector_indexes(tables=None, m=None, ef_construction=None):
+    """Rebuilds the HNSW indexes on the embedding columns without blocking writes."""
+    print("Rebuilding HNSW vector indexes (CONCURRENTLY)...")
+    rebuilt = rebuild_hnsw_indexes(tables, m=m, ef_construction=ef_construction)
+    for index_name in rebuilt:
+        print(f"  ✓ Rebuilt {index_name}")
+    print(f"Rebuilt {len(rebuilt)} index(es).")
+
+def drop_vector_indexes(tables=None):
+    """Drops the HNSW indexes on the embedding columns."""
+    print("Dropping HNSW vector indexes (CONCURRENTLY)...")
+    dropped = drop_hnsw_indexes(tables)
+    for index_name in dropped:
+        print(f"  ✓ Dropped {index_name}")
+    print(f"Dropped {len(dropped)} index(es).")
+
+def show_vector_index_status(tables=None):
+    """Shows the HNSW index state for every embedding column."""
+    print("HNSW Vector Index Status:")
+    for row in get_hnsw_index_status(tables):
+        if not row["exists"]:
+            state = "missing"
+        elif not row["valid"]:
+            state = "INVALID (rebuild required)"
+        else:
+            state = f"ok, {row['size_bytes'] / 1024**2:.1f} MB"
+        options = f" [{', '.join(row['options'])}]" if row["options"] else ""
+        binary = {"valid": ", binary prefilter index", "invalid": ", binary prefilter index INVALID (rebuild required)"}.get(
+            row["binary_index"], ""
+        )
+        print(f"  {row['table']}.{row['column']} ({row['storage'] or 'missing'}): {row['index']} - {state}{options}{binary}")
+    print(f"  Session hnsw.ef_search: {get_session_ef_search() or 'default (40)'}")
+
+def create_binary_prefilter_indexes(tables=None, m=None, ef_construction=None):
+    """Builds the binary-quantization indexes for the two-stage search."""
+    print("Building binary prefilter indexes (CONCURRENTLY)...")
+    created = create_binary_indexes(tables, m=m, ef_construction=ef_construction)
+    for index_name in created:
+        print(f"  ✓ Created {index_name}")
+    print(f"Created {len(created)} index(es).")
+    missing = set(tables or settings.BINARY_PREFILTER_TABLES) - set(settings.BINARY_PREFILTER_TABLES)
+    if missing:
+        print(f"Add {', '.join(sorted(missing))} to BINARY_PREFILTER_TABLES to search them in two stages.")
+
+def drop_binary_prefilter_indexes(tables=None):
+    """Drops the binary-quantization indexes."""
+    print("Dropping binary prefilter indexes (CONCURRENTLY)...")
+    dropped = drop_binary_indexes(tables)
+    for index_name in dropped:
+        print(f"  ✓ Dropped {index_name}")
+    print(f"Dropped {len(dropped)} index(es).")
+
+def convert_vector_storage(storage, tables=None, m=None, ef_construction=None):
+    """Converts the embedding columns to vector or halfvec and rebuilds their HNSW indexes."""
+    print(f"Converting embedding columns to {storage} (rewrites each table, then rebuilds indexes CONCURRENTLY)...")
+    converted = migrate_vector_storage(storage, tables, m=m, ef_construction=ef_construction)
+    for name in converted:
+        print(f"  ✓ {name}")
+    print(f"Converted {len(converted)} column(s).")
+    if converted and settings.VECTOR_STORAGE != storage:
+        print(f"Set VECTOR_STORAGE={storage} and restart the API and workers.")
+
+def install_version_triggers():
+    """Installs the data-version triggers that invalidate cached search results."""
+    print("Installing data-version triggers...")
+    install_data_version_triggers()
+    for table in CONTENT_TABLES:
+        print(f"  ✓ {table}")
+    print(f"Current data version: {read_data_version()}")
+
+def drop_version_triggers():
+    """Removes the data-version triggers from the content tables."""
+    print("Dropping data-version triggers...")
+    drop_data_version_triggers()
+    print("Data-version triggers dropped. Cached search results will no longer be invalidated on ingest.")
+
+def bump_version():
+    """Bumps the content data version by hand, dropping every cached search result."""
+    print(f"Data version bumped to {bump_data_version()}.")
+
+def install_rerank_text(tables=None):
+    """(Re)creates the generated rerank_text columns with the current RERANK_TEXT_MAX_CHARS."""
+    print("Installing generated rerank_text columns (rewrites each table)...")
+    for table in install_rerank_text_columns(tables):
+        print(f"  ✓ {table}")
+
+def show_rerank_text_status(tables=None):
+    """Shows whether each content table has the generated rerank_text column."""
+    print("Rerank Text Columns:")
+    for row in get_rerank_text_status(tables):
+        if not row["exists"]:
+            state = "missing (run --install-rerank-text)"
+        elif not row["generated"]:
+            state = "present but not generated (run --install-rerank-text)"
+        else:
+            state = row["expression"]
+        print(f"  {row['table']}.rerank_text: {state}")
+
+def install_source_url_columns():
+    """(Re)creates the generated url columns and questions.source_url, then backfills it."""
+    print("Installing url columns and question source-url triggers (rewrites issues and discourse_posts)...")
+    changed = install_source_urls()
+    print(f"  ✓ {changed} question source URL(s) updated")
+
+def show_source_url_status():
+    """Shows the generated url columns and how many questions have a source URL."""
+    print("Source URLs:")
+    for row in get_source_url_status():
+        state = row["detail"] if row["ok"] else f"{row['detail']} (run --install-source-urls)"
+        print(f"  {row['column']}: {state}")
+
+def install_search_vectors(tables=None):
+    """Installs the search_vectors sync triggers and backfills the table."""
+    print("Installing search_vectors triggers...")
+    for table in install_search_vector_triggers(tables):
+        print(f"  ✓ {table}")
+    sync_search_vector_rows(tables)
+    print("Build its HNSW index with `run.py db indexes build --table search_vectors`, then set SEARCH_VECTORS_ENABLED=true.")
+
+def sync_search_vector_rows(tables=None):
+    """Upserts changed embeddings into search_vectors and removes stale rows."""
+    print("Syncing search_vectors with the content tables...")
+    for table, counts in sync_search_vectors(tables).items():
+        print(f"  ✓ {table}: {counts['upserted']} upserted, {counts['deleted']} deleted")
+
+def drop_search_vectors(tables=None):
+    """Removes the search_vectors sync triggers."""
+    drop_search_vector_triggers(tables)
+    print("search_vectors triggers dropped. Disable SEARCH_VECTORS_ENABLED; the table is no longer kept in sync.")
+
+def show_search_vector_status(tables=None):
+    """Shows how many embeddings each content table mirrors into search_vectors."""
+    print("Search Vectors:")
+    for row in get_search_vector_status(tables):
+        trigger = "trigger installed" if row["trigger"] else "NO TRIGGER (run db search-vectors)"
+        in_sync = "in sync" if row["embeddings"] == row["search_vectors"] else "out of sync (run --sync-search-vectors)"
+        print(f"  {row['table']}: {row['search_vectors']}/{row['embeddings']} vectors, {in_sync}, {trigger}")
 
 
 def main():
@@ -605,6 +799,8 @@ def main():
     parser.add_argument("--recreate-issues", action="store_true", help="Drop and recreate only the issues table.")
     parser.add_argument("--recreate-discourse", action="store_true", help="Drop and recreate only the discourse_posts table.")
     parser.add_argument("--add-api-key", type=str, metavar="DESCRIPTION", help="Add a new API key with the given description.")
+    parser.add_argument("--revoke-api-key", type=str, metavar="KEY_OR_ID", help="Delete an API key, given the key or its id.")
+    parser.add_argument("--list-api-keys", action="store_true", help="List API key ids and descriptions.")
     parser.add_argument("--enable-vector", action="store_true", help="Enable the pgvector extension.")
     parser.add_argument("--clear-discourse", action="store_true", help="Clear all discourse posts from the database.")
     parser.add_argument("--discourse-stats", action="store_true", help="Show discourse posts statistics.")
@@ -631,6 +827,27 @@ def main():
     parser.add_argument("--clear-batch-processes", action="store_true", help="Clear all batch processes from the database.")
     parser.add_argument("--batch-processes-stats", action="store_true", help="Show batch processes statistics.")
     parser.add_argument("--migrate-keyword-boolean", action="store_true", help="Migrate keyword_definitions.is_active strings to boolean.")
+    parser.add_argument("--create-indexes", action="store_true", help="Build missing HNSW indexes on the embedding columns.")
+    parser.add_argument("--rebuild-indexes", action="store_true", help="Rebuild HNSW indexes concurrently (applies new m/ef_construction).")
+    parser.add_argument("--drop-indexes", action="store_true", help="Drop HNSW indexes on the embedding columns.")
+    parser.add_argument("--index-status", action="store_true", help="Show HNSW index status for the embedding columns.")
+    parser.add_argument("--create-binary-indexes", action="store_true", help="Build the binary prefilter indexes (defaults to BINARY_PREFILTER_TABLES).")
+    parser.add_argument("--drop-binary-indexes", action="store_true", help="Drop the binary prefilter indexes.")
+    parser.add_argument("--vector-storage", choices=["vector", "halfvec"], help="Convert the embedding columns to this type in place and rebuild their HNSW indexes.")
+    parser.add_argument("--index-table", action="append", metavar="TABLE", help="Restrict index, vector-storage and rerank-text operations to a table (repeatable).")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW m parameter (defaults to HNSW_M).")
+    parser.add_argument("--hnsw-ef-construction", type=int, help="HNSW ef_construction parameter (defaults to HNSW_EF_CONSTRUCTION).")
+    parser.add_argument("--install-version-triggers", action="store_true", help="Install the data-version triggers that invalidate cached search results.")
+    parser.add_argument("--drop-version-triggers", action="store_true", help="Drop the data-version triggers.")
+    parser.add_argument("--bump-data-version", action="store_true", help="Bump the content data version (drops cached search results).")
+    parser.add_argument("--install-source-urls", action="store_true", help="(Re)create the url columns and questions.source_url, with triggers and backfill.")
+    parser.add_argument("--source-urls-status", action="store_true", help="Show the url columns and question source URL coverage.")
+    parser.add_argument("--install-search-vectors", action="store_true", help="Install the search_vectors sync triggers and backfill the table.")
+    parser.add_argument("--sync-search-vectors", action="store_true", help="Upsert changed embeddings into search_vectors and remove stale rows.")
+    parser.add_argument("--drop-search-vectors", action="store_true", help="Drop the search_vectors sync triggers.")
+    parser.add_argument("--search-vectors-status", action="store_true", help="Show search_vectors row counts and triggers per content table.")
+    parser.add_argument("--install-rerank-text", action="store_true", help="(Re)create the generated rerank_text columns on the content tables.")
+    parser.add_argument("--rerank-text-status", action="store_true", help="Show the rerank_text column on each content table.")
 
     args = parser.parse_args()
 
@@ -644,6 +861,10 @@ def main():
         recreate_metabase_docs_table()
     elif args.add_api_key:
         add_api_key(args.add_api_key)
+    elif args.revoke_api_key:
+        revoke_api_key(args.revoke_api_key)
+    elif args.list_api_keys:
+        list_api_keys()
     elif args.enable_vector:
         enable_vector_extension()
     elif args.clear_discourse:
@@ -694,8 +915,44 @@ def main():
         show_batch_processes_stats()
     elif args.migrate_keyword_boolean:
         migrate_keyword_is_active_to_boolean()
+    elif args.create_indexes:
+        create_vector_indexes(args.index_table, args.hnsw_m, args.hnsw_ef_construction)
+    elif args.rebuild_indexes:
+        rebuild_vector_indexes(args.index_table, args.hnsw_m, args.hnsw_ef_construction)
+    elif args.drop_indexes:
+        drop_vector_indexes(args.index_table)
+    elif args.index_status:
+        show_vector_index_status(args.index_table)
+    elif args.create_binary_indexes:
+        create_binary_prefilter_indexes(args.index_table, args.hnsw_m, args.hnsw_ef_construction)
+    elif args.drop_binary_indexes:
+        drop_binary_prefilter_indexes(args.index_table)
+    elif args.vector_storage:
+        convert_vector_storage(args.vector_storage, args.index_table, args.hnsw_m, args.hnsw_ef_construction)
+    elif args.install_version_triggers:
+        install_version_triggers()
+    elif args.drop_version_triggers:
+        drop_version_triggers()
+    elif args.bump_data_version:
+        bump_version()
+    elif args.install_source_urls:
+        install_source_url_columns()
+    elif args.source_urls_status:
+        show_source_url_status()
+    elif args.install_search_vectors:
+        install_search_vectors(args.index_table)
+    elif args.sync_search_vectors:
+        sync_search_vector_rows(args.index_table)
+    elif args.drop_search_vectors:
+        drop_search_vectors(args.index_table)
+    elif args.search_vectors_status:
+        show_search_vector_status(args.index_table)
+    elif args.install_rerank_text:
+        install_rerank_text(args.index_table)
+    elif args.rerank_text_status:
+        show_rerank_text_status(args.index_table)
     else:
-        print("No action specified. Use --recreate, --recreate-issues, --recreate-discourse, --recreate-metabase-docs, --recreate-questions, --recreate-chat-sessions, --recreate-chat-session-entities, --recreate-keyword-definitions, --recreate-synonyms, --recreate-batch-processes, --add-api-key, --enable-vector, --clear-discourse, --discourse-stats, --clear-metabase-docs, --metabase-docs-stats, --clear-questions, --questions-stats, --clear-chat-sessions, --chat-sessions-stats, --clear-chat-session-entities, --chat-session-entities-stats, --clear-keyword-definitions, --keyword-definitions-stats, --clear-synonyms, --synonyms-stats, --clear-batch-processes, --batch-processes-stats, or --add-sample-keywords.")
+        print("No action specified. Use --recreate, --recreate-issues, --recreate-discourse, --recreate-metabase-docs, --recreate-questions, --recreate-chat-sessions, --recreate-chat-session-entities, --recreate-keyword-definitions, --recreate-synonyms, --recreate-batch-processes, --add-api-key, --revoke-api-key, --list-api-keys, --enable-vector, --clear-discourse, --discourse-stats, --clear-metabase-docs, --metabase-docs-stats, --clear-questions, --questions-stats, --clear-chat-sessions, --chat-sessions-stats, --clear-chat-session-entities, --chat-session-entities-stats, --clear-keyword-definitions, --keyword-definitions-stats, --clear-synonyms, --synonyms-stats, --clear-batch-processes, --batch-processes-stats, --create-indexes, --rebuild-indexes, --drop-indexes, --index-status, --create-binary-indexes, --drop-binary-indexes, --vector-storage, --install-version-triggers, --drop-version-triggers, --bump-data-version, --install-rerank-text, --rerank-text-status, --install-source-urls, --source-urls-status, --install-search-vectors, --sync-search-vectors, --drop-search-vectors, --search-vectors-status, or --add-sample-keywords.")
 
 if __name__ == "__main__":
     main()
@@ -24,6 +24,7 @@ from src.db import SessionLocal
 from src.models import Issue, DiscoursePost, MetabaseDoc, Question, KeywordDefinition, Synonym
 from src.llm_client import llm_client
 from src.text_utils import combine_discourse_posts, get_topic_creator_username, combine_all_discourse_posts, calculate_token_count
+from src.embedding_codec import decode_embeddings
 from src.settings import (
     GITHUB_REPO_OWNER,
     GITHUB_REPO_NAME,
@@ -373,9 +374,12 @@ class UnifiedMonitorWorker:
         db.add(issue)
         db.commit()
 
-        # Generate embeddings using API endpoint
+        # Generate embeddings using one bulk API request
+        embeddings = self._create_embeddings_via_api({
+            field: str(value) for field, value in (("title", issue.title), ("body", issue.body)) if value
+        })
         if getattr(issue, "title", None):
-            title_embedding = self._create_embedding_via_api(str(issue.title))
+            title_embedding = embeddings.get("title")
             if title_embedding:
                 db.execute(
                     text("UPDATE issues SET title_embedding = :embedding WHERE id = :issue_id"),
@@ -383,7 +387,7 @@ class UnifiedMonitorWorker:
                 )
         
         if getattr(issue, "body", None):
-            embedding = self._create_embedding_via_api(str(issue.body))
+            embedding = embeddings.get("body")
             if embedding:
                 db.execute(
                     text("UPDATE issues SET issue_embedding = :embedding WHERE id = :issue_id"),
@@ -529,23 +533,24 @@ class UnifiedMonitorWorker:
         
         try:
             content = self.get_content_for_embedding(issue, 'issues')
+            embeddings = self._create_embeddings_via_api(content)
             
             if 'title_embedding' in content:
-                embedding = self._create_embedding_via_api(content['title_embedding'])
+                embedding = embeddings.get('title_embedding')
                 if embedding:
                     db.execute(text("UPDATE issues SET title_embedding = :embedding WHERE id = :issue_id"), {"embedding": str(embedding), "issue_id": issue.id})
                     results['title_embedding'] = True
                     logger.info(f"Generated title embedding for issue #{issue.number}")
             
             if 'issue_embedding' in content:
-                embedding = self._create_embedding_via_api(content['issue_embedding'])
+                embedding = embeddings.get('issue_embedding')
                 if embedding:
                     db.execute(text("UPDATE issues SET issue_embedding = :embedding WHERE id = :issue_id"), {"embedding": str(embedding), "issue_id": issue.id})
                     results['issue_embedding'] = True
                     logger.info(f"Generated issue embedding for issue #{issue.number}")
             
             if 'summary_embedding' in content:
-                embedding = self._create_embedding_via_api(content['summary_embedding'])
+                embedding = embeddings.get('summary_embedding')
                 if embedding:
                     db.execute(text("UPDATE issues SET summary_embedding = :embedding WHERE id = :issue_id"), {"embedding": str(embedding), "issue_id": issue.id})
                     results['summary_embedding'] = True
@@ -562,16 +567,17 @@ class UnifiedMonitorWorker:
         
         try:
             content = self.get_content_for_embedding(post, 'discourse_posts')
+            embeddings = self._create_embeddings_via_api(content)
             
             if 'conversation_embedding' in content:
-                embedding = self._create_embedding_via_api(content['conversation_embedding'])
+                embedding = embeddings.get('conversation_embedding')
                 if embedding:
                     db.execute(text("UPDATE discourse_posts SET conversation_embedding = :embedding WHERE id = :post_id"), {"embedding": str(embedding), "post_id": post.id})
                     results['conversation_embedding'] = True
                     logger.info(f"Generated conversation embedding for discourse post #{post.topic_id}")
             
             if 'summary_embedding' in content:
-                embedding = self._create_embedding_via_api(content['summary_embedding'])
+                embedding = embeddings.get('summary_embedding')
                 if embedding:
                     db.execute(text("UPDATE discourse_posts SET summary_embedding = :embedding WHERE id = :post_id"), {"embedding": str(embedding), "post_id": post.id})
                     results['summary_embedding'] = True
@@ -588,16 +594,17 @@ class UnifiedMonitorWorker:
         
         try:
             content = self.get_content_for_embedding(doc, 'metabase_docs')
+            embeddings = self._create_embeddings_via_api(content)
             
             if 'markdown_embedding' in content:
-                embedding = self._create_embedding_via_api(content['markdown_embedding'])
+                embedding = embeddings.get('markdown_embedding')
                 if embedding:
                     db.execute(text("UPDATE metabase_docs SET markdown_embedding = :embedding WHERE id = :doc_id"), {"embedding": str(embedding), "doc_id": doc.id})
                     results['markdown_embedding'] = True
                     logger.info(f"Generated markdown embedding for metabase doc #{doc.id}")
             
             if 'summary_embedding' in content:
-                embedding = self._create_embedding_via_api(content['summary_embedding'])
+                embedding = embeddings.get('summary_embedding')
                 if embedding:
                     db.execute(text("UPDATE metabase_docs SET summary_embedding = :embedding WHERE id = :doc_id"), {"embedding": str(embedding), "doc_id": doc.id})
                     results['summary_embedding'] = True
@@ -614,16 +621,17 @@ class UnifiedMonitorWorker:
         
         try:
             content = self.get_content_for_embedding(question, 'questions')
+            embeddings = self._create_embeddings_via_api(content)
             
             if 'question_embedding' in content:
-                embedding = self._create_embedding_via_api(content['question_embedding'])
+                embedding = embeddings.get('question_embedding')
                 if embedding:
                     db.execute(text("UPDATE questions SET question_embedding = :embedding WHERE id = :question_id"), {"embedding": str(embedding), "question_id": question.id})
                     results['question_embedding'] = True
                     logger.info(f"Generated question embedding for question #{question.id}")
             
             if 'answer_embedding' in content:
-                embedding = self._create_embedding_via_api(content['answer_embedding'])
+                embedding = embeddings.get('answer_embedding')
                 if embedding:
                     db.execute(text("UPDATE questions SET answer_embedding = :embedding WHERE id = :question_id"), {"embedding": str(embedding), "question_id": question.id})
                     results['answer_embedding'] = True
@@ -706,6 +714,21 @@ class UnifiedMonitorWorker:
         
         return processed_counts
     
+    def _create_embeddings_via_api(self, content: Dict[str, str]) -> Dict[str, Optional[List[float]]]:
+        """Create embeddings for several named texts with one bulk API request (binary float32 response)."""
+        if not content:
+            return {}
+        names = list(content)
+        try:
+            headers = {"X-API-Key": str(API_KEY)}
+            payload = {"texts": [str(content[name]) for name in names], "format": "float32"}
+            response = requests.post("http://localhost:8000/embeddings", headers=headers, json=payload)
+            response.raise_for_status()
+            return dict(zip(names, decode_embeddings(response.content)))
+        except Exception as e:
+            logger.warning(f"Bulk embedding request failed ({e}); falling back to one request per text")
+            return {name: self._create_embedding_via_api(content[name]) for name in names}
+    
     def _create_embedding_via_api(self, text: str) -> Optional[List[float]]:
         """Create an embedding using the API endpoint."""
         try:
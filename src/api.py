@@ -1,39 +1,66 @@
-from fastapi import FastAPI, Depends, Security, HTTPException, Request
+from fastapi import FastAPI, Depends, Security, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, field_validator
 from sqlalchemy.orm import Session
-from sqlalchemy import text as sql_text
-from typing import List, Optional, Dict, Any
+from sqlalchemy import select, text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Literal
+import json
 import logging
 import re
 import html
 import uuid
 import asyncio
+from contextlib import asynccontextmanager
 
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from src.db import get_db, SessionLocal
-from src.models import Issue, DiscoursePost, MetabaseDoc, Question, ChatSession, ChatSessionEntity
+from src.db import get_db, get_async_db, SessionLocal, AsyncSessionLocal
+from src.models import MetabaseDoc, Question, ChatSession, ChatSessionEntity, KeywordDefinition
 from src.embedding_service import get_embedding_service
-from src.similarity_query_builder import SimilarityQueryBuilder
+from src.embedding_codec import EMBEDDINGS_MEDIA_TYPE, encode_embeddings
+from src.similarity_query_builder import SimilarityQueryBuilder, QUERY_EMBEDDING_PARAM, vector_param_sql, to_vector_param
+from src.search_context import SearchContext, build_search_context
+from src.search_vectors import SEARCH_VECTOR_COLUMNS
+from src.result_cache import VersionedResultCache
+from src.candidate_pruning import CandidatePruner
+from src.data_version import DataVersionTracker
+from src.db_listener import get_notification_listener
 # Removed unused imports from src.api_utils
-from src.security import get_api_key
+from src.security import get_api_key, api_key_cache
+from src.rate_limit import create_limiter
 from src.llm_client import llm_client
 from src.reranker_service import get_reranker_service
+from src.warmup import ModelWarmup
+from src.schema_check import verify_database_schema
 from src.utils import get_device
 from src import settings
+from src.constants import MAX_SIMILARITY_CANDIDATES
 from src.prompts import get_api_chat_system_prompt, get_api_context_prompt
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-limiter = Limiter(key_func=get_remote_address)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background listeners for the lifetime of the app and warm the models up."""
+    # Fail fast on a database that still needs a migration command, instead of on every search
+    verify_database_schema()
+    if similar_results_cache is not None or api_key_cache is not None:
+        notification_listener.start()
+    # In the background, so /ready can answer 503 while the warmup runs
+    model_warmup.start()
+    yield
+    notification_listener.stop()
+
+limiter = create_limiter()
 app = FastAPI(
     title="GitHub Duplicate Issue Finder API",
     description="An API to find semantically similar GitHub issues stored in a PostgreSQL database.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Auto-detect best available device
@@ -46,6 +73,19 @@ query_builder = SimilarityQueryBuilder()
 
 # Initialize reranker service (local or API) if enabled
 reranker_service = get_reranker_service()
+# Startup warmup of the local models; /ready reports it
+model_warmup = ModelWarmup(embedding_service, reranker_service)
+# Drops hopeless candidates before they reach the cross-encoder
+candidate_pruner = CandidatePruner() if settings.RERANK_PRUNING_ENABLED else None
+
+# /v2/similar results cache, dropped whenever ingestion bumps the content data version
+notification_listener = get_notification_listener()
+data_version_tracker = DataVersionTracker(notification_listener)
+similar_results_cache = (
+    VersionedResultCache(lambda: data_version_tracker.version, maxsize=settings.RESULT_CACHE_SIZE)
+    if settings.RESULT_CACHE_ENABLED else None
+)
+SIMILAR_V2_CACHE_SCOPE = "v2/similar"
 
 class SearchRequest(BaseModel):
     """Request model for the similarity search endpoint."""
@@ -122,6 +162,19 @@ class EmbeddingResponse(BaseModel):
     """Response model for the embedding endpoint."""
     embedding: List[float] = Field(..., description="The 768-dimensional embedding vector.")
 
+class EmbeddingsRequest(BaseModel):
+    """Request model for the bulk embeddings endpoint."""
+    texts: List[str] = Field(
+        ..., min_length=1, max_length=settings.EMBEDDING_BULK_MAX_TEXTS, description="The texts to create embeddings for."
+    )
+    format: Literal["json", "float32", "float16"] = Field(
+        "json", description=f"'json' for a JSON body, or 'float32'/'float16' for a binary {EMBEDDINGS_MEDIA_TYPE} payload."
+    )
+
+class EmbeddingsResponse(BaseModel):
+    """JSON response model for the bulk embeddings endpoint."""
+    embeddings: List[Optional[List[float]]] = Field(..., description="One embedding per input text, null where it failed.")
+
 class ChatRequest(BaseModel):
     """Request model for the chat endpoint."""
     text: str = Field(..., description="The user's question or request.")
@@ -160,6 +213,62 @@ def create_embedding(
         logger.error(f"❌ Error creating embedding: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating embedding: {str(e)}")
 
+# --- POST endpoint for bulk embeddings ---
+@app.post(
+    "/embeddings",
+    response_model=EmbeddingsResponse,
+    responses={200: {"content": {EMBEDDINGS_MEDIA_TYPE: {}}, "description": "JSON or binary embeddings."}},
+)
+def create_embeddings(
+    request: Request,
+    embeddings_request: EmbeddingsRequest,
+    api_key: str = Security(get_api_key)
+):
+    """
+    Create embeddings for a list of texts in one call.
+    With format 'float32' or 'float16' the body is the compact binary encoding from `src.embedding_codec`.
+    """
+    logger.info(f"🌐 POST /embeddings for {len(embeddings_request.texts)} texts (format: {embeddings_request.format})")
+
+    try:
+        embeddings = embedding_service.create_embeddings_batch(embeddings_request.texts)
+    except Exception as e:
+        logger.error(f"❌ Error creating embeddings: {e}")
+        raise HTTPException(status_code=500, detail=f"Error creating embeddings: {str(e)}")
+    logger.info(f"⚡ {sum(e is not None for e in embeddings)}/{len(embeddings)} embeddings generated")
+
+    if embeddings_request.format == "json":
+        return EmbeddingsResponse(embeddings=embeddings)
+    return Response(
+        content=encode_embeddings(embeddings, embeddings_request.format),
+        media_type=EMBEDDINGS_MEDIA_TYPE
+    )
+
+# --- Readiness probe for load balancers ---
+@app.get("/ready", response_model=Dict[str, Any])
+def ready(response: Response) -> Dict[str, Any]:
+    """
+    200 once this worker's models are loaded and warmed up, 503 before that or
+    if the warmup failed. Reports model load and warmup times. No API key needed.
+    """
+    report = model_warmup.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+# --- GET endpoint for embedding cache metrics ---
+@app.get("/embedding/cache-stats", response_model=Dict[str, Any])
+def embedding_cache_stats(
+    api_key: str = Security(get_api_key)
+) -> Dict[str, Any]:
+    """
+    Hit/miss counters and size of the query embedding cache for this worker process.
+    """
+    stats = embedding_service.cache_stats()
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
 # --- POST endpoint for reranking ---
 @app.post("/rerank", response_model=RerankResponse)
 @limiter.limit("10/minute")
@@ -183,77 +292,53 @@ def rerank_results(
 
     return RerankResponse(reranked_candidates=reranked_candidates)
 
-# --- POST endpoint at /v1/similar-github-issues ---
-@app.post("/v1/similar-github-issues", response_model=List[SimilarIssueResponse])
-@limiter.limit("10/minute")
-def find_similar_github_issues_v1(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
+@app.get("/rerank/cache-stats", response_model=Dict[str, Any])
+def rerank_cache_stats(
     api_key: str = Security(get_api_key)
-) -> List[SimilarIssueResponse]:
+) -> Dict[str, Any]:
     """
-    Find most similar GitHub issues based on a text query, with optional state filtering.
-    The search is performed across issue titles, bodies, and summaries using vector embeddings.
+    Hit/miss counters and size of the reranker score cache for this worker process.
     """
-    logger.info(f"🌐 POST /v1/similar-github-issues for text: '{search_request.text[:50]}...' state: {search_request.state}")
+    stats = reranker_service.cache_stats() if reranker_service else None
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
 
-    state = search_request.state
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
+# --- Search implementations shared by the single-source and aggregate endpoints ---
+# Each takes a SearchContext so aggregate requests embed the query only once.
 
+async def search_github_issues_v1(db: AsyncSession, search_context: SearchContext) -> List[SimilarIssueResponse]:
+    """Vector search over issue titles, bodies and summaries."""
     # Use the new query builder
     columns = {
         'id': 'number',
-        'select_cols': 'number, title, state',
+        'select_cols': 'number, title, state, url',
         'title_embedding': 'title_embedding',
-        'issue_embedding': 'issue_embedding', 
+        'issue_embedding': 'issue_embedding',
         'summary_embedding': 'summary_embedding',
-        'group_by': 'number, title, state'
+        'group_by': 'number, title, state, url'
     }
-    
-    where_clause = "state = :state_param" if state else None
-    where_params = {'state_param': state} if state else None
-    
+
     logger.info("Executing similarity CTE query...")
-    
-    result = query_builder.execute_similarity_query(
-        db, 'issues', embedding, columns, where_clause, where_params
+
+    result = await query_builder.execute_similarity_query_async(
+        db, 'issues', search_context.embedding, columns,
+        search_context.state_where_clause, search_context.state_where_params
     )
-    
+
     issues = []
     for row in result:
         issues.append(SimilarIssueResponse(
             number=row.number,
             title=row.title,
             state=row.state,
-            url=f"{settings.GITHUB_BASE_URL}/issues/{row.number}",
+            url=row.url,
             similarity_score=float(row.similarity)
         ))
     return issues
 
-# --- POST endpoint at /v1/similar-metabase-docs ---
-@app.post("/v1/similar-metabase-docs", response_model=List[SimilarDocumentationResponse])
-@limiter.limit("10/minute")
-def find_similar_metabase_docs_v1(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarDocumentationResponse]:
-    """
-    Find most similar Metabase documentation pages based on a text query.
-    The search is performed across markdown content and summaries using vector embeddings.
-    """
-    logger.info(f"POST /v1/similar-metabase-docs for text: '{search_request.text[:50]}...'")
-
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
-
+async def search_metabase_docs_v1(db: AsyncSession, search_context: SearchContext) -> List[SimilarDocumentationResponse]:
+    """Vector search over documentation markdown and summaries."""
     # Use centralized query builder
     logger.info("Executing metabase docs similarity query via builder...")
     columns = {
@@ -263,8 +348,8 @@ def find_similar_metabase_docs_v1(
         'summary_embedding': 'summary_embedding',
         'group_by': 'id, url'
     }
-    result = query_builder.execute_similarity_query(
-        db, 'metabase_docs', embedding, columns, None, None, limit=10
+    result = await query_builder.execute_similarity_query_async(
+        db, 'metabase_docs', search_context.embedding, columns, None, None, limit=10
     )
     docs = []
     for row in result:
@@ -275,211 +360,115 @@ def find_similar_metabase_docs_v1(
         ))
     return docs
 
-# --- POST endpoint at /v1/similar-discourse-posts ---
-@app.post("/v1/similar-discourse-posts", response_model=List[SimilarDiscourseResponse])
-@limiter.limit("10/minute")
-def find_similar_discourse_posts_v1(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarDiscourseResponse]:
-    """
-    Find most similar discourse posts based on a text query.
-    The search is performed across conversation content and summaries using vector embeddings.
-    """
-    logger.info(f"POST /v1/similar-discourse-posts for text: '{search_request.text[:50]}...'")
-
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
-
+async def search_discourse_posts_v1(db: AsyncSession, search_context: SearchContext) -> List[SimilarDiscourseResponse]:
+    """Vector search over discourse conversations and summaries."""
     # Use centralized query builder
     logger.info("Executing discourse similarity query via builder...")
     columns = {
         'id': 'id',
-        'select_cols': 'id, topic_id, title, slug',
+        'select_cols': 'id, title, url',
         'content_embedding': 'conversation_embedding',
         'summary_embedding': 'summary_embedding',
-        'group_by': 'id, topic_id, title, slug'
+        'group_by': 'id, title, url'
     }
-    result = query_builder.execute_similarity_query(
-        db, 'discourse_posts', embedding, columns, None, None, limit=10
+    result = await query_builder.execute_similarity_query_async(
+        db, 'discourse_posts', search_context.embedding, columns, None, None, limit=10
     )
     posts = []
     for row in result:
         posts.append(SimilarDiscourseResponse(
             id=row.id,
             title=row.title,
-            url=f"{settings.DISCOURSE_BASE_URL}/t/{row.slug}/{row.topic_id}",
+            url=row.url,
             similarity_score=float(row.similarity)
         ))
     return posts
 
-# --- POST endpoint at /v1/similar-questions ---
-@app.post("/v1/similar-questions", response_model=List[SimilarQuestionResponse])
-@limiter.limit("10/minute")
-def find_similar_questions_v1(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarQuestionResponse]:
-    """
-    Find most similar questions based on a text query.
-    The search is performed across question and answer embeddings using vector embeddings.
-    """
-    logger.info(f"POST /v1/similar-questions for text: '{search_request.text[:50]}...'")
-
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
-
-    # Use centralized query builder, then construct URLs in Python
+async def search_questions_v1(db: AsyncSession, search_context: SearchContext) -> List[SimilarQuestionResponse]:
+    """Vector search over question and answer embeddings."""
+    # source_url is stored on the row, so one statement returns ready-to-serve results
     logger.info("Executing questions similarity query via builder...")
     columns = {
         'id': 'id',
-        'select_cols': 'id, question, answer, source_type, source_id',
+        'select_cols': 'id, question, answer, source_url',
         'question_embedding': 'question_embedding',
         'answer_embedding': 'answer_embedding',
-        'group_by': 'id, question, answer, source_type, source_id'
+        'group_by': 'id, question, answer, source_url'
     }
-    result = query_builder.execute_similarity_query(
-        db, 'questions', embedding, columns, None, None, limit=20
+    result = await query_builder.execute_similarity_query_async(
+        db, 'questions', search_context.embedding, columns, 'source_url IS NOT NULL', None, limit=10
     )
 
-    # Collect IDs per source type for URL building
-    from src.models import Issue, DiscoursePost, MetabaseDoc, SourceType
-    issue_ids = []
-    discourse_ids = []
-    doc_ids = []
-    rows = list(result)
-    for row in rows:
-        st = str(row.source_type)
-        if st.endswith('ISSUE') or st.endswith('issue'):
-            issue_ids.append(row.source_id)
-        elif st.endswith('DISCOURSE_POST') or st.endswith('discourse_post'):
-            discourse_ids.append(row.source_id)
-        elif st.endswith('METABASE_DOC') or st.endswith('metabase_doc'):
-            doc_ids.append(row.source_id)
-
-    issues_map = {}
-    discourse_map = {}
-    docs_map = {}
-    if issue_ids:
-        for i in db.query(Issue).filter(Issue.id.in_(issue_ids)).all():
-            issues_map[i.id] = i
-    if discourse_ids:
-        for d in db.query(DiscoursePost).filter(DiscoursePost.id.in_(discourse_ids)).all():
-            discourse_map[d.id] = d
-    if doc_ids:
-        for m in db.query(MetabaseDoc).filter(MetabaseDoc.id.in_(doc_ids)).all():
-            docs_map[m.id] = m
-
-    responses = []
-    for row in rows:
-        url = None
-        st = str(row.source_type)
-        if st.endswith('ISSUE') or st.endswith('issue'):
-            issue = issues_map.get(row.source_id)
-            if issue and getattr(issue, 'number', None) is not None:
-                url = f"{settings.GITHUB_BASE_URL}/issues/{issue.number}"
-        elif st.endswith('DISCOURSE_POST') or st.endswith('discourse_post'):
-            post = discourse_map.get(row.source_id)
-            if post and getattr(post, 'slug', None) is not None and getattr(post, 'topic_id', None) is not None:
-                url = f"{settings.DISCOURSE_BASE_URL}/t/{post.slug}/{post.topic_id}"
-        elif st.endswith('METABASE_DOC') or st.endswith('metabase_doc'):
-            doc = docs_map.get(row.source_id)
-            if doc and getattr(doc, 'url', None):
-                url = doc.url
-
-        if url:
-            responses.append(SimilarQuestionResponse(
-                id=row.id,
-                question=row.question,
-                answer=row.answer,
-                url=url,
-                similarity_score=float(row.similarity)
-            ))
-
-    # Limit to top 10
-    responses = sorted(responses, key=lambda r: r.similarity_score, reverse=True)[:10]
-    return responses
-
-
+    return [
+        SimilarQuestionResponse(
+            id=row.id,
+            question=row.question,
+            answer=row.answer,
+            url=row.source_url,
+            similarity_score=float(row.similarity)
+        )
+        for row in result
+    ]
 
-# --- POST endpoint at /v2/similar-github-issues ---
-@app.post("/v2/similar-github-issues", response_model=List[SimilarIssueResponse])
-@limiter.limit("10/minute")
-def find_similar_github_issues_v2(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarIssueResponse]:
-    """
-    Find most similar GitHub issues based on a text query with reranking.
-    The search is performed across issue titles, bodies, and summaries using vector embeddings,
-    then reranked using the reranker model for better relevance.
-    """
-    logger.info(f"🌐 POST /v2/similar-github-issues for text: '{search_request.text[:50]}...' state: {search_request.state}")
+def rerank_candidates(query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Prune, rerank with the reranker service and keep the configured top results."""
+    if candidate_pruner is not None:
+        candidates = candidate_pruner.prune(candidates, query)
+    logger.info(f"Reranking {len(candidates)} candidates...")
+    reranked_candidates = reranker_service.rerank_results(query=query, candidates=candidates)
 
-    if not reranker_service:
-        logger.warning("Reranker not available, falling back to v1 endpoint")
-        return find_similar_github_issues_v1(request, search_request, db, api_key)
+    # Limit the number of results after reranking
+    return reranked_candidates[:settings.RERANKER_MAX_CANDIDATES]
 
-    state = search_request.state
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
+async def collect_github_issue_candidates(db: AsyncSession, search_context: SearchContext) -> List[Dict[str, Any]]:
+    """Vector search candidates from GitHub issues, ready for the cross-encoder."""
+    state = search_context.state
 
-    # Build the SQL query with CTEs
-    embedding_str = ','.join(str(v) for v in embedding)
-    embedding_sql = f"'[{embedding_str}]'::vector"
+    # Build the SQL query with CTEs; the query vector is bound once as a typed parameter
+    embedding_sql = vector_param_sql()
     state_filter = ""
     if state:
         state_filter = "AND state = :state_param"
+    issue_sim_sql = query_builder.nearest_rows_sql(
+        "issues", "issue_embedding", "number", embedding_sql, MAX_SIMILARITY_CANDIDATES, state_filter, min_similarity=0.5
+    )
+    summary_sim_sql = query_builder.nearest_rows_sql(
+        "issues", "summary_embedding", "number", embedding_sql, MAX_SIMILARITY_CANDIDATES, state_filter, min_similarity=0.5
+    )
     sql = f"""
     WITH issue_sim AS (
-        SELECT number, title, state, body, 1 - (issue_embedding <=> {embedding_sql}) AS similarity
-        FROM issues
-        WHERE issue_embedding IS NOT NULL {state_filter}
-        AND 1 - (issue_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY issue_embedding <=> {embedding_sql}
-        LIMIT 50
+        {issue_sim_sql}
     ),
     summary_sim AS (
-        SELECT number, title, state, body, 1 - (summary_embedding <=> {embedding_sql}) AS similarity
-        FROM issues
-        WHERE summary_embedding IS NOT NULL {state_filter}
-        AND 1 - (summary_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY summary_embedding <=> {embedding_sql}
-        LIMIT 50
+        {summary_sim_sql}
     ),
     all_sim AS (
         SELECT * FROM issue_sim
         UNION ALL
         SELECT * FROM summary_sim
+    ),
+    best_sim AS (
+        SELECT number, MAX(similarity) AS similarity
+        FROM all_sim
+        GROUP BY number
+        ORDER BY similarity DESC
+        LIMIT 50
     )
-    SELECT number, title, state, body, MAX(similarity) AS similarity
-    FROM all_sim
-    GROUP BY number, title, state, body
-    ORDER BY similarity DESC
-    LIMIT 50;
+    SELECT i.number, i.title, i.state, i.url, i.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN issues i ON i.number = b.number
+    ORDER BY b.similarity DESC;
     """
 
     logger.info("Executing similarity query for reranking...")
-    
+
     # Execute with parameters to prevent SQL injection
-    params = {}
+    params = {QUERY_EMBEDDING_PARAM: to_vector_param(search_context.embedding)}
     if state:
         params['state_param'] = state
-    
-    result = db.execute(sql_text(sql), params)
-    
+
+    result = await db.execute(sql_text(sql), params)
+
     # Prepare candidates for reranking
     candidates = []
     for row in result:
@@ -487,28 +476,16 @@ def find_similar_github_issues_v2(
             'id': row.number,
             'title': row.title,
             'state': row.state,
-            'body': row.body or '',
+            'rerank_text': row.rerank_text,
             'source_type': 'issue',
-            'url': f"{settings.GITHUB_BASE_URL}/issues/{row.number}",
+            'url': row.url,
             'similarity_score': float(row.similarity)
         })
-    
-    if not candidates:
-        logger.info("No candidates found for reranking")
-        return []
-    
-    # Rerank the candidates
-    logger.info(f"Reranking {len(candidates)} candidates...")
-    reranked_response = rerank_results(
-        request,
-        RerankRequest(query=search_request.text, candidates=candidates),
-        api_key
-    )
-    reranked_candidates = reranked_response.reranked_candidates
-    
-    # Limit the number of results after reranking
-    reranked_candidates = reranked_candidates[:settings.RERANKER_MAX_CANDIDATES]
-    
+
+    return candidates
+
+def github_issues_from_candidates(reranked_candidates: List[Dict[str, Any]]) -> List[SimilarIssueResponse]:
+    """Convert reranked GitHub issue candidates to the response format."""
     # Convert to response format - only return items with positive similarity scores
     issues = []
     for candidate in reranked_candidates:
@@ -521,98 +498,79 @@ def find_similar_github_issues_v2(
                 url=candidate['url'],
                 similarity_score=similarity_score
             ))
-    
-    return issues
 
-# --- POST endpoint at /v2/similar-metabase-docs ---
-@app.post("/v2/similar-metabase-docs", response_model=List[SimilarDocumentationResponse])
-@limiter.limit("10/minute")
-def find_similar_metabase_docs_v2(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarDocumentationResponse]:
-    """
-    Find most similar Metabase documentation pages based on a text query with reranking.
-    The search is performed across markdown content and summaries using vector embeddings,
-    then reranked using the reranker model for better relevance.
-    """
-    logger.info(f"🌐 POST /v2/similar-metabase-docs for text: '{search_request.text[:50]}...'")
+    return issues
 
+async def search_github_issues_v2(db: AsyncSession, search_context: SearchContext) -> List[SimilarIssueResponse]:
+    """Vector search over issue bodies and summaries, reranked with the cross-encoder."""
     if not reranker_service:
         logger.warning("Reranker not available, falling back to v1 endpoint")
-        return find_similar_metabase_docs_v1(request, search_request, db, api_key)
+        return await search_github_issues_v1(db, search_context)
 
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
+    candidates = await collect_github_issue_candidates(db, search_context)
+    if not candidates:
+        logger.info("No candidates found for reranking")
+        return []
+
+    # Cross-encoder scoring is CPU-bound; keep it off the event loop
+    reranked_candidates = await asyncio.to_thread(rerank_candidates, search_context.text, candidates)
+    return github_issues_from_candidates(reranked_candidates)
 
-    # Build the SQL query with CTEs
-    embedding_str = ','.join(str(v) for v in embedding)
-    embedding_sql = f"'[{embedding_str}]'::vector"
+async def collect_metabase_doc_candidates(db: AsyncSession, search_context: SearchContext) -> List[Dict[str, Any]]:
+    """Vector search candidates from Metabase documentation pages, ready for the cross-encoder."""
+    # Build the SQL query with CTEs; the query vector is bound once as a typed parameter
+    embedding_sql = vector_param_sql()
+    content_sim_sql = query_builder.nearest_rows_sql(
+        "metabase_docs", "markdown_embedding", "id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5
+    )
+    summary_sim_sql = query_builder.nearest_rows_sql(
+        "metabase_docs", "summary_embedding", "id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5
+    )
     sql = f"""
     WITH content_sim AS (
-        SELECT id, url, markdown, 1 - (markdown_embedding <=> {embedding_sql}) AS similarity
-        FROM metabase_docs
-        WHERE markdown_embedding IS NOT NULL
-        AND 1 - (markdown_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY markdown_embedding <=> {embedding_sql}
-        LIMIT 50
+        {content_sim_sql}
     ),
     summary_sim AS (
-        SELECT id, url, markdown, 1 - (summary_embedding <=> {embedding_sql}) AS similarity
-        FROM metabase_docs
-        WHERE summary_embedding IS NOT NULL
-        AND 1 - (summary_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY summary_embedding <=> {embedding_sql}
-        LIMIT 50
+        {summary_sim_sql}
     ),
     all_sim AS (
         SELECT * FROM content_sim
         UNION ALL
         SELECT * FROM summary_sim
+    ),
+    best_sim AS (
+        SELECT id, MAX(similarity) AS similarity
+        FROM all_sim
+        GROUP BY id
+        ORDER BY similarity DESC
+        LIMIT 50
     )
-    SELECT id, url, markdown, MAX(similarity) AS similarity
-    FROM all_sim
-    GROUP BY id, url, markdown
-    ORDER BY similarity DESC
-    LIMIT 50;
+    SELECT m.id, m.url, m.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN metabase_docs m ON m.id = b.id
+    ORDER BY b.similarity DESC;
     """
 
     logger.info("Executing metabase docs similarity query for reranking...")
-    
-    result = db.execute(sql_text(sql))
-    
+
+    result = await db.execute(sql_text(sql), {QUERY_EMBEDDING_PARAM: to_vector_param(search_context.embedding)})
+
     # Prepare candidates for reranking
     candidates = []
     for row in result:
         candidates.append({
             'id': row.id,
             'title': row.url,
-            'markdown': row.markdown or '',
+            'rerank_text': row.rerank_text,
             'source_type': 'docs',
             'url': row.url,
             'similarity_score': float(row.similarity)
         })
-    
-    if not candidates:
-        logger.info("No candidates found for reranking")
-        return []
-    
-    # Rerank the candidates
-    logger.info(f"Reranking {len(candidates)} candidates...")
-    reranked_response = rerank_results(
-        request,
-        RerankRequest(query=search_request.text, candidates=candidates),
-        api_key
-    )
-    reranked_candidates = reranked_response.reranked_candidates
-    
-    # Limit the number of results after reranking
-    reranked_candidates = reranked_candidates[:settings.RERANKER_MAX_CANDIDATES]
-    
+
+    return candidates
+
+def metabase_docs_from_candidates(reranked_candidates: List[Dict[str, Any]]) -> List[SimilarDocumentationResponse]:
+    """Convert reranked Metabase documentation pages candidates to the response format."""
     # Convert to response format - only return items with positive similarity scores
     docs = []
     for candidate in reranked_candidates:
@@ -623,98 +581,79 @@ def find_similar_metabase_docs_v2(
                 url=candidate['url'],
                 similarity_score=similarity_score
             ))
-    
-    return docs
 
-# --- POST endpoint at /v2/similar-discourse-posts ---
-@app.post("/v2/similar-discourse-posts", response_model=List[SimilarDiscourseResponse])
-@limiter.limit("10/minute")
-def find_similar_discourse_posts_v2(
-    request: Request,
-    search_request: SearchRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> List[SimilarDiscourseResponse]:
-    """
-    Find most similar discourse posts based on a text query with reranking.
-    The search is performed across conversation content and summaries using vector embeddings,
-    then reranked using the reranker model for better relevance.
-    """
-    logger.info(f"🌐 POST /v2/similar-discourse-posts for text: '{search_request.text[:50]}...'")
+    return docs
 
+async def search_metabase_docs_v2(db: AsyncSession, search_context: SearchContext) -> List[SimilarDocumentationResponse]:
+    """Vector search over documentation markdown and summaries, reranked with the cross-encoder."""
     if not reranker_service:
         logger.warning("Reranker not available, falling back to v1 endpoint")
-        return find_similar_discourse_posts_v1(request, search_request, db, api_key)
+        return await search_metabase_docs_v1(db, search_context)
 
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
+    candidates = await collect_metabase_doc_candidates(db, search_context)
+    if not candidates:
+        logger.info("No candidates found for reranking")
+        return []
+
+    # Cross-encoder scoring is CPU-bound; keep it off the event loop
+    reranked_candidates = await asyncio.to_thread(rerank_candidates, search_context.text, candidates)
+    return metabase_docs_from_candidates(reranked_candidates)
 
-    # Build the SQL query with CTEs
-    embedding_str = ','.join(str(v) for v in embedding)
-    embedding_sql = f"'[{embedding_str}]'::vector"
+async def collect_discourse_post_candidates(db: AsyncSession, search_context: SearchContext) -> List[Dict[str, Any]]:
+    """Vector search candidates from discourse posts, ready for the cross-encoder."""
+    # Build the SQL query with CTEs; the query vector is bound once as a typed parameter
+    embedding_sql = vector_param_sql()
+    conversation_sim_sql = query_builder.nearest_rows_sql(
+        "discourse_posts", "conversation_embedding", "id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5
+    )
+    summary_sim_sql = query_builder.nearest_rows_sql(
+        "discourse_posts", "summary_embedding", "id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5
+    )
     sql = f"""
     WITH conversation_sim AS (
-        SELECT id, topic_id, title, slug, conversation, 1 - (conversation_embedding <=> {embedding_sql}) AS similarity
-        FROM discourse_posts
-        WHERE conversation_embedding IS NOT NULL
-        AND 1 - (conversation_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY conversation_embedding <=> {embedding_sql}
-        LIMIT 50
+        {conversation_sim_sql}
     ),
     summary_sim AS (
-        SELECT id, topic_id, title, slug, conversation, 1 - (summary_embedding <=> {embedding_sql}) AS similarity
-        FROM discourse_posts
-        WHERE summary_embedding IS NOT NULL
-        AND 1 - (summary_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY summary_embedding <=> {embedding_sql}
-        LIMIT 50
+        {summary_sim_sql}
     ),
     all_sim AS (
         SELECT * FROM conversation_sim
         UNION ALL
         SELECT * FROM summary_sim
+    ),
+    best_sim AS (
+        SELECT id, MAX(similarity) AS similarity
+        FROM all_sim
+        GROUP BY id
+        ORDER BY similarity DESC
+        LIMIT 50
     )
-    SELECT id, topic_id, title, slug, conversation, MAX(similarity) AS similarity
-    FROM all_sim
-    GROUP BY id, topic_id, title, slug, conversation
-    ORDER BY similarity DESC
-    LIMIT 50;
+    SELECT d.id, d.title, d.url, d.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN discourse_posts d ON d.id = b.id
+    ORDER BY b.similarity DESC;
     """
 
     logger.info("Executing discourse similarity query for reranking...")
-    
-    result = db.execute(sql_text(sql))
-    
+
+    result = await db.execute(sql_text(sql), {QUERY_EMBEDDING_PARAM: to_vector_param(search_context.embedding)})
+
     # Prepare candidates for reranking
     candidates = []
     for row in result:
         candidates.append({
             'id': row.id,
             'title': row.title,
-            'conversation': row.conversation or '',
+            'rerank_text': row.rerank_text,
             'source_type': 'discourse',
-            'url': f"{settings.DISCOURSE_BASE_URL}/t/{row.slug}/{row.topic_id}",
+            'url': row.url,
             'similarity_score': float(row.similarity)
         })
-    
-    if not candidates:
-        logger.info("No candidates found for reranking")
-        return []
-    
-    # Rerank the candidates
-    logger.info(f"Reranking {len(candidates)} candidates...")
-    reranked_response = rerank_results(
-        request,
-        RerankRequest(query=search_request.text, candidates=candidates),
-        api_key
-    )
-    reranked_candidates = reranked_response.reranked_candidates
-    
-    # Limit the number of results after reranking
-    reranked_candidates = reranked_candidates[:settings.RERANKER_MAX_CANDIDATES]
-    
+
+    return candidates
+
+def discourse_posts_from_candidates(reranked_candidates: List[Dict[str, Any]]) -> List[SimilarDiscourseResponse]:
+    """Convert reranked discourse posts candidates to the response format."""
     # Convert to response format - only return items with positive similarity scores
     posts = []
     for candidate in reranked_candidates:
@@ -726,16 +665,443 @@ def find_similar_discourse_posts_v2(
                 url=candidate['url'],
                 similarity_score=similarity_score
             ))
-    
+
     return posts
 
+async def search_discourse_posts_v2(db: AsyncSession, search_context: SearchContext) -> List[SimilarDiscourseResponse]:
+    """Vector search over discourse conversations and summaries, reranked with the cross-encoder."""
+    if not reranker_service:
+        logger.warning("Reranker not available, falling back to v1 endpoint")
+        return await search_discourse_posts_v1(db, search_context)
+
+    candidates = await collect_discourse_post_candidates(db, search_context)
+    if not candidates:
+        logger.info("No candidates found for reranking")
+        return []
+
+    # Cross-encoder scoring is CPU-bound; keep it off the event loop
+    reranked_candidates = await asyncio.to_thread(rerank_candidates, search_context.text, candidates)
+    return discourse_posts_from_candidates(reranked_candidates)
+
+async def collect_question_candidates(db: AsyncSession, search_context: SearchContext) -> List[Dict[str, Any]]:
+    """Vector search candidates from questions, ready for the cross-encoder."""
+    # Build the SQL query with CTEs; the query vector is bound once as a typed parameter
+    embedding_sql = vector_param_sql()
+    question_sim_sql = query_builder.nearest_rows_sql(
+        "questions", "q.question_embedding", "q.id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5, table_alias="q"
+    )
+    answer_sim_sql = query_builder.nearest_rows_sql(
+        "questions", "q.answer_embedding", "q.id", embedding_sql, MAX_SIMILARITY_CANDIDATES, min_similarity=0.5, table_alias="q"
+    )
+    sql = f"""
+    WITH question_sim AS (
+        {question_sim_sql}
+    ),
+    answer_sim AS (
+        {answer_sim_sql}
+    ),
+    all_sim AS (
+        SELECT * FROM question_sim
+        UNION ALL
+        SELECT * FROM answer_sim
+    ),
+    grouped_sim AS (
+        SELECT id, MAX(similarity) AS similarity
+        FROM all_sim
+        GROUP BY id
+    )
+    SELECT q.id, q.question, q.answer, q.rerank_text, q.source_url AS url, g.similarity
+    FROM grouped_sim g
+    JOIN questions q ON q.id = g.id
+    WHERE q.source_url IS NOT NULL
+    ORDER BY g.similarity DESC
+    LIMIT 50;
+    """
+
+    logger.info("Executing questions similarity query for reranking...")
+
+    result = await db.execute(sql_text(sql), {QUERY_EMBEDDING_PARAM: to_vector_param(search_context.embedding)})
+
+    # Prepare candidates for reranking
+    candidates = []
+    for row in result:
+        candidates.append({
+            'id': row.id,
+            'title': row.question,
+            'content': row.answer,
+            'rerank_text': row.rerank_text,
+            'source_type': 'question',
+            'url': row.url,
+            'similarity_score': float(row.similarity)
+        })
+
+    return candidates
+
+def questions_from_candidates(reranked_candidates: List[Dict[str, Any]]) -> List[SimilarQuestionResponse]:
+    """Convert reranked questions candidates to the response format."""
+    # Convert to response format - only return items with positive similarity scores
+    questions = []
+    for candidate in reranked_candidates:
+        similarity_score = candidate.get('reranker_score', candidate['similarity_score'])
+        if similarity_score > 0:
+            questions.append(SimilarQuestionResponse(
+                id=candidate['id'],
+                question=candidate['title'],
+                answer=candidate['content'],
+                url=candidate['url'],
+                similarity_score=similarity_score
+            ))
+
+    return questions
+
+async def search_questions_v2(db: AsyncSession, search_context: SearchContext) -> List[SimilarQuestionResponse]:
+    """Vector search over question and answer embeddings, reranked with the cross-encoder."""
+    if not reranker_service:
+        logger.warning("Reranker not available, falling back to v1 endpoint")
+        return await search_questions_v1(db, search_context)
+
+    candidates = await collect_question_candidates(db, search_context)
+    if not candidates:
+        logger.info("No candidates found for reranking")
+        return []
+
+    # Cross-encoder scoring is CPU-bound; keep it off the event loop
+    reranked_candidates = await asyncio.to_thread(rerank_candidates, search_context.text, candidates)
+    return questions_from_candidates(reranked_candidates)
+
+async def run_parallel_searches(search_context: SearchContext, search_fns: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """
+    Run sub-searches concurrently on the event loop, each with its own async DB session, sharing one SearchContext.
+    A failing sub-search is logged and contributes an empty list.
+    """
+    async def call_search(search_fn):
+        # Concurrent queries need their own connection; the async pool hands them out without threads
+        async with AsyncSessionLocal() as search_db:
+            return await search_fn(search_db, search_context)
+
+    names = list(search_fns.keys())
+    results = await asyncio.gather(
+        *(call_search(search_fns[name]) for name in names),
+        return_exceptions=True
+    )
+
+    # Handle any exceptions that occurred during parallel execution
+    search_results = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching similar {name.replace('_', ' ')}: {result}")
+            search_context.failed_sources.append(name)
+            result = []
+        search_results[name] = result
+    return search_results
+
+async def search_similar_v1(search_context: SearchContext) -> V2SimilarResponse:
+    """Run all v1 searches in parallel for one query embedding."""
+    results = await run_parallel_searches(search_context, {
+        'issues': search_github_issues_v1,
+        'discourse_posts': search_discourse_posts_v1,
+        'metabase_docs': search_metabase_docs_v1,
+        'questions': search_questions_v1,
+    })
+    return V2SimilarResponse(
+        issues=results['issues'],
+        discourse_posts=results['discourse_posts'],
+        metabase_docs=results['metabase_docs'],
+        questions=results['questions'],
+        keywords=[]  # Keywords not implemented in v1 endpoints yet
+    )
+
+# Response field, candidate collector and response converter per v2 candidate source_type
+V2_SOURCES = {
+    'issue': ('issues', collect_github_issue_candidates, github_issues_from_candidates),
+    'discourse': ('discourse_posts', collect_discourse_post_candidates, discourse_posts_from_candidates),
+    'docs': ('metabase_docs', collect_metabase_doc_candidates, metabase_docs_from_candidates),
+    'question': ('questions', collect_question_candidates, questions_from_candidates),
+}
+
+async def collect_unified_candidates(db: AsyncSession, search_context: SearchContext) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Candidates for every v2 source from one statement over `search_vectors`: an ANN
+    probe per source, aggregated per entity and joined back to the content tables.
+    Returns the same candidate dicts as the per-source collectors, keyed by response field.
+    """
+    embedding_sql = vector_param_sql()
+    # Top SEARCH_VECTORS_CANDIDATES per source, so the largest table cannot crowd out the others
+    nearest_sql = query_builder.nearest_rows_sql(
+        "search_vectors", "sv.embedding", "sv.entity_type, sv.entity_id", embedding_sql,
+        settings.SEARCH_VECTORS_CANDIDATES, where="AND sv.entity_type = s.entity_type",
+        min_similarity=0.5, table_alias="sv"
+    )
+    sources_sql = ", ".join(f"('{table}')" for table in SEARCH_VECTOR_COLUMNS)
+    # The issue state filter applies after the probe, so it can leave fewer issue candidates
+    state_filter = "AND i.state = :state_param" if search_context.state else ""
+    sql = f"""
+    WITH nearest AS (
+        SELECT n.*
+        FROM (VALUES {sources_sql}) AS s(entity_type)
+        CROSS JOIN LATERAL (
+        {nearest_sql}
+        ) n
+    ),
+    best_sim AS (
+        SELECT entity_type, entity_id, MAX(similarity) AS similarity
+        FROM nearest
+        GROUP BY entity_type, entity_id
+    )
+    SELECT 'issue' AS source_type, i.number AS id, i.title, i.state, NULL AS content, i.url, i.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN issues i ON b.entity_type = 'issues' AND i.id = b.entity_id {state_filter}
+    UNION ALL
+    SELECT 'discourse', d.id, d.title, NULL, NULL, d.url, d.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN discourse_posts d ON b.entity_type = 'discourse_posts' AND d.id = b.entity_id
+    UNION ALL
+    SELECT 'docs', m.id, m.url, NULL, NULL, m.url, m.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN metabase_docs m ON b.entity_type = 'metabase_docs' AND m.id = b.entity_id
+    UNION ALL
+    SELECT 'question', q.id, q.question, NULL, q.answer, q.source_url, q.rerank_text, b.similarity
+    FROM best_sim b
+    JOIN questions q ON b.entity_type = 'questions' AND q.id = b.entity_id
+    ORDER BY similarity DESC;
+    """
+
+    logger.info("Executing unified search_vectors query for reranking...")
+
+    params = {QUERY_EMBEDDING_PARAM: to_vector_param(search_context.embedding)}
+    if search_context.state:
+        params['state_param'] = search_context.state
+    result = await db.execute(sql_text(sql), params)
+
+    collected = {field: [] for field, _, _ in V2_SOURCES.values()}
+    for row in result:
+        if row.url is None:
+            continue
+        candidate = {
+            'id': row.id,
+            'title': row.title,
+            'rerank_text': row.rerank_text,
+            'source_type': row.source_type,
+            'url': row.url,
+            'similarity_score': float(row.similarity)
+        }
+        if row.source_type == 'issue':
+            candidate['state'] = row.state
+        elif row.source_type == 'question':
+            candidate['content'] = row.content
+        source_candidates = collected[V2_SOURCES[row.source_type][0]]
+        # Same per-source cap as the per-column collectors
+        if len(source_candidates) < MAX_SIMILARITY_CANDIDATES:
+            source_candidates.append(candidate)
+    return collected
+
+async def collect_v2_candidates(search_context: SearchContext) -> Dict[str, List[Dict[str, Any]]]:
+    """Candidates per v2 response field, from `search_vectors` or from the per-source collectors."""
+    if settings.SEARCH_VECTORS_ENABLED:
+        try:
+            async with AsyncSessionLocal() as db:
+                return await collect_unified_candidates(db, search_context)
+        except Exception as e:
+            logger.error(f"Unified search_vectors query failed, falling back to per-source queries: {e}")
+    return await run_parallel_searches(search_context, {
+        field: collect for field, collect, _ in V2_SOURCES.values()
+    })
+
+async def search_similar_v2(search_context: SearchContext) -> V2SimilarResponse:
+    """
+    Run all v2 searches for one query embedding with a single rerank stage.
+    Candidates from every source are collected in parallel, scored together in one
+    cross-encoder pass and split back out per source.
+    """
+    if not reranker_service:
+        logger.warning("Reranker not available, falling back to v1 endpoint")
+        return await search_similar_v1(search_context)
+
+    collected = await collect_v2_candidates(search_context)
+    if candidate_pruner is not None:
+        collected = candidate_pruner.prune_groups(collected, search_context.text)
+    candidates = [candidate for field, _, _ in V2_SOURCES.values() for candidate in collected[field]]
+
+    reranked_candidates = []
+    if candidates:
+        logger.info(f"Reranking {len(candidates)} candidates from all sources in one pass...")
+        reranked_candidates = await asyncio.to_thread(
+            reranker_service.rerank_results, search_context.text, candidates
+        )
+    else:
+        logger.info("No candidates found for reranking")
+
+    # Split back per source, keeping the reranked order, then limit each source
+    per_source = {source_type: [] for source_type in V2_SOURCES}
+    for candidate in reranked_candidates:
+        source_candidates = per_source.get(candidate.get('source_type'))
+        if source_candidates is not None:
+            source_candidates.append(candidate)
+
+    results = {}
+    for source_type, (field, _, to_responses) in V2_SOURCES.items():
+        results[field] = to_responses(per_source[source_type][:settings.RERANKER_MAX_CANDIDATES])
+
+    return V2SimilarResponse(
+        issues=results['issues'],
+        discourse_posts=results['discourse_posts'],
+        metabase_docs=results['metabase_docs'],
+        questions=results['questions'],
+        keywords=[]  # Keywords not implemented in v2 endpoints yet
+    )
+
+async def cached_search_similar_v2(text: str, state: Optional[str] = None) -> V2SimilarResponse:
+    """
+    /v2/similar results for a query, served from the versioned result cache when possible.
+    On a miss the search runs and is cached only if every source answered.
+    """
+    if similar_results_cache is None:
+        search_context = await asyncio.to_thread(build_search_context, text, state)
+        return await search_similar_v2(search_context)
+
+    cached = similar_results_cache.get(SIMILAR_V2_CACHE_SCOPE, text, state)
+    if cached is not None:
+        logger.info("⚡ Serving /v2/similar results from cache")
+        return cached
+
+    # Capture the version first so results computed across an ingest are not stored
+    version = similar_results_cache.current_version()
+    # Embed once in a worker thread to avoid blocking the event loop
+    search_context = await asyncio.to_thread(build_search_context, text, state)
+    response = await search_similar_v2(search_context)
+    if not search_context.failed_sources:
+        similar_results_cache.set(SIMILAR_V2_CACHE_SCOPE, text, state, response, version)
+    return response
+
+# --- POST endpoint at /v1/similar-github-issues ---
+@app.post("/v1/similar-github-issues", response_model=List[SimilarIssueResponse])
+@limiter.limit("10/minute")
+async def find_similar_github_issues_v1(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarIssueResponse]:
+    """
+    Find most similar GitHub issues based on a text query, with optional state filtering.
+    The search is performed across issue titles, bodies, and summaries using vector embeddings.
+    """
+    logger.info(f"🌐 POST /v1/similar-github-issues for text: '{search_request.text[:50]}...' state: {search_request.state}")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_github_issues_v1(db, search_context)
+
+# --- POST endpoint at /v1/similar-metabase-docs ---
+@app.post("/v1/similar-metabase-docs", response_model=List[SimilarDocumentationResponse])
+@limiter.limit("10/minute")
+async def find_similar_metabase_docs_v1(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarDocumentationResponse]:
+    """
+    Find most similar Metabase documentation pages based on a text query.
+    The search is performed across markdown content and summaries using vector embeddings.
+    """
+    logger.info(f"POST /v1/similar-metabase-docs for text: '{search_request.text[:50]}...'")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_metabase_docs_v1(db, search_context)
+
+# --- POST endpoint at /v1/similar-discourse-posts ---
+@app.post("/v1/similar-discourse-posts", response_model=List[SimilarDiscourseResponse])
+@limiter.limit("10/minute")
+async def find_similar_discourse_posts_v1(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarDiscourseResponse]:
+    """
+    Find most similar discourse posts based on a text query.
+    The search is performed across conversation content and summaries using vector embeddings.
+    """
+    logger.info(f"POST /v1/similar-discourse-posts for text: '{search_request.text[:50]}...'")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_discourse_posts_v1(db, search_context)
+
+# --- POST endpoint at /v1/similar-questions ---
+@app.post("/v1/similar-questions", response_model=List[SimilarQuestionResponse])
+@limiter.limit("10/minute")
+async def find_similar_questions_v1(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarQuestionResponse]:
+    """
+    Find most similar questions based on a text query.
+    The search is performed across question and answer embeddings using vector embeddings.
+    """
+    logger.info(f"POST /v1/similar-questions for text: '{search_request.text[:50]}...'")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_questions_v1(db, search_context)
+
+# --- POST endpoint at /v2/similar-github-issues ---
+@app.post("/v2/similar-github-issues", response_model=List[SimilarIssueResponse])
+@limiter.limit("10/minute")
+async def find_similar_github_issues_v2(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarIssueResponse]:
+    """
+    Find most similar GitHub issues based on a text query with reranking.
+    The search is performed across issue titles, bodies, and summaries using vector embeddings,
+    then reranked using the reranker model for better relevance.
+    """
+    logger.info(f"🌐 POST /v2/similar-github-issues for text: '{search_request.text[:50]}...' state: {search_request.state}")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_github_issues_v2(db, search_context)
+
+# --- POST endpoint at /v2/similar-metabase-docs ---
+@app.post("/v2/similar-metabase-docs", response_model=List[SimilarDocumentationResponse])
+@limiter.limit("10/minute")
+async def find_similar_metabase_docs_v2(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarDocumentationResponse]:
+    """
+    Find most similar Metabase documentation pages based on a text query with reranking.
+    The search is performed across markdown content and summaries using vector embeddings,
+    then reranked using the reranker model for better relevance.
+    """
+    logger.info(f"🌐 POST /v2/similar-metabase-docs for text: '{search_request.text[:50]}...'")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_metabase_docs_v2(db, search_context)
+
+# --- POST endpoint at /v2/similar-discourse-posts ---
+@app.post("/v2/similar-discourse-posts", response_model=List[SimilarDiscourseResponse])
+@limiter.limit("10/minute")
+async def find_similar_discourse_posts_v2(
+    request: Request,
+    search_request: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> List[SimilarDiscourseResponse]:
+    """
+    Find most similar discourse posts based on a text query with reranking.
+    The search is performed across conversation content and summaries using vector embeddings,
+    then reranked using the reranker model for better relevance.
+    """
+    logger.info(f"🌐 POST /v2/similar-discourse-posts for text: '{search_request.text[:50]}...'")
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_discourse_posts_v2(db, search_context)
+
 # --- POST endpoint at /v2/similar-questions ---
 @app.post("/v2/similar-questions", response_model=List[SimilarQuestionResponse])
 @limiter.limit("10/minute")
-def find_similar_questions_v2(
+async def find_similar_questions_v2(
     request: Request,
     search_request: SearchRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     api_key: str = Security(get_api_key)
 ) -> List[SimilarQuestionResponse]:
     """
@@ -744,119 +1110,8 @@ def find_similar_questions_v2(
     then reranked using the reranker model for better relevance.
     """
     logger.info(f"🌐 POST /v2/similar-questions for text: '{search_request.text[:50]}...'")
-
-    # Use reranker_service (the unified service); previous reference to reranker_client was incorrect
-    if not reranker_service:
-        logger.warning("Reranker not available, falling back to v1 endpoint")
-        return find_similar_questions_v1(request, search_request, db, api_key)
-
-    embedding = embedding_service.create_embedding(search_request.text)
-    if embedding is None:
-        raise HTTPException(status_code=500, detail="Failed to create embedding")
-    logger.info(f"⚡ Embedding generated (dim: {len(embedding)})")
-
-    # Build the SQL query with CTEs
-    embedding_str = ','.join(str(v) for v in embedding)
-    embedding_sql = f"'[{embedding_str}]'::vector"
-    sql = f"""
-    WITH question_sim AS (
-        SELECT q.id, q.question, q.answer, q.source_type, q.source_id, 1 - (q.question_embedding <=> {embedding_sql}) AS similarity
-        FROM questions q
-        WHERE q.question_embedding IS NOT NULL
-        AND 1 - (q.question_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY q.question_embedding <=> {embedding_sql}
-        LIMIT 50
-    ),
-    answer_sim AS (
-        SELECT q.id, q.question, q.answer, q.source_type, q.source_id, 1 - (q.answer_embedding <=> {embedding_sql}) AS similarity
-        FROM questions q
-        WHERE q.answer_embedding IS NOT NULL
-        AND 1 - (q.answer_embedding <=> {embedding_sql}) > 0.5
-        ORDER BY q.answer_embedding <=> {embedding_sql}
-        LIMIT 50
-    ),
-    all_sim AS (
-        SELECT * FROM question_sim
-        UNION ALL
-        SELECT * FROM answer_sim
-    ),
-    grouped_sim AS (
-        SELECT id, question, answer, source_type, source_id, MAX(similarity) AS similarity
-        FROM all_sim
-        GROUP BY id, question, answer, source_type, source_id
-    ),
-    questions_with_urls AS (
-        SELECT 
-            g.id, 
-            g.question, 
-            g.answer, 
-            g.similarity,
-            CASE 
-                WHEN g.source_type = 'ISSUE' THEN CONCAT('{settings.GITHUB_BASE_URL}/issues/', i.number)
-                WHEN g.source_type = 'DISCOURSE_POST' THEN CONCAT('{settings.DISCOURSE_BASE_URL}/t/', d.slug, '/', d.topic_id)
-                WHEN g.source_type = 'METABASE_DOC' THEN m.url
-                ELSE NULL
-            END AS url
-        FROM grouped_sim g
-        LEFT JOIN issues i ON g.source_type = 'ISSUE' AND g.source_id = i.id
-        LEFT JOIN discourse_posts d ON g.source_type = 'DISCOURSE_POST' AND g.source_id = d.id
-        LEFT JOIN metabase_docs m ON g.source_type = 'METABASE_DOC' AND g.source_id = m.id
-    )
-    SELECT id, question, answer, url, similarity
-    FROM questions_with_urls
-    WHERE url IS NOT NULL
-    ORDER BY similarity DESC
-    LIMIT 50;
-    """
-
-    logger.info("Executing questions similarity query for reranking...")
-    
-    result = db.execute(sql_text(sql))
-    
-    # Prepare candidates for reranking
-    candidates = []
-    for row in result:
-        candidates.append({
-            'id': row.id,
-            'title': row.question,
-            'content': row.answer,
-            'source_type': 'question',
-            'url': row.url,
-            'similarity_score': float(row.similarity)
-        })
-    
-    if not candidates:
-        logger.info("No candidates found for reranking")
-        return []
-    
-    # Rerank the candidates
-    logger.info(f"Reranking {len(candidates)} candidates...")
-    reranked_response = rerank_results(
-        request,
-        RerankRequest(query=search_request.text, candidates=candidates),
-        api_key
-    )
-    reranked_candidates = reranked_response.reranked_candidates
-    
-    # Limit the number of results after reranking
-    reranked_candidates = reranked_candidates[:settings.RERANKER_MAX_CANDIDATES]
-    
-    # Convert to response format - only return items with positive similarity scores
-    questions = []
-    for candidate in reranked_candidates:
-        similarity_score = candidate.get('reranker_score', candidate['similarity_score'])
-        if similarity_score > 0:
-            questions.append(SimilarQuestionResponse(
-                id=candidate['id'],
-                question=candidate['title'],
-                answer=candidate['content'],
-                url=candidate['url'],
-                similarity_score=similarity_score
-            ))
-    
-    return questions
-
-
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_questions_v2(db, search_context)
 
 # --- POST endpoint at /v1/similar ---
 @app.post("/v1/similar", response_model=V2SimilarResponse)
@@ -864,76 +1119,18 @@ def find_similar_questions_v2(
 async def find_similar_v1(
     request: Request,
     search_request: SearchRequest,
-    db: Session = Depends(get_db),
     api_key: str = Security(get_api_key)
 ) -> V2SimilarResponse:
     """
     Find similar content across all types (issues, discourse posts, documentation, questions).
     Returns issues, discourse posts, documentation pages, and questions that match the query.
-    This endpoint calls all v1 endpoints in parallel for better performance.
+    The query is embedded once and the v1 searches run in parallel.
     """
     logger.info(f"🌐 POST /v1/similar for text: '{search_request.text[:50]}...' state: {search_request.state}")
 
-    # Call individual v1 endpoints in parallel using threads to avoid blocking the event loop
-    async def call_issues():
-        # Create a dedicated DB session for thread execution
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_github_issues_v1, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_discourse():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_discourse_posts_v1, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_docs():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_metabase_docs_v1, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_questions():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_questions_v1, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-
-    # Execute all calls in parallel
-    issues, discourse_posts, metabase_docs, questions = await asyncio.gather(
-        call_issues(),
-        call_discourse(),
-        call_docs(),
-        call_questions(),
-        return_exceptions=True
-    )
-    
-    # Handle any exceptions that occurred during parallel execution
-    if isinstance(issues, Exception):
-        logger.error(f"Error fetching similar issues: {issues}")
-        issues = []
-    if isinstance(discourse_posts, Exception):
-        logger.error(f"Error fetching similar discourse posts: {discourse_posts}")
-        discourse_posts = []
-    if isinstance(metabase_docs, Exception):
-        logger.error(f"Error fetching similar metabase docs: {metabase_docs}")
-        metabase_docs = []
-    if isinstance(questions, Exception):
-        logger.error(f"Error fetching similar questions: {questions}")
-        questions = []
-
-    return V2SimilarResponse(
-        issues=issues,
-        discourse_posts=discourse_posts,
-        metabase_docs=metabase_docs,
-        questions=questions,
-        keywords=[]  # Keywords not implemented in v1 endpoints yet
-    )
+    # Embed once in a worker thread to avoid blocking the event loop
+    search_context = await asyncio.to_thread(build_search_context, search_request.text, search_request.state)
+    return await search_similar_v1(search_context)
 
 # --- POST endpoint at /v2/similar ---
 @app.post("/v2/similar", response_model=V2SimilarResponse)
@@ -941,78 +1138,28 @@ async def find_similar_v1(
 async def find_similar_v2(
     request: Request,
     search_request: SearchRequest,
-    db: Session = Depends(get_db),
     api_key: str = Security(get_api_key)
 ) -> V2SimilarResponse:
     """
     Find similar content across all types (issues, discourse posts, documentation, questions) with reranking.
     Returns issues, discourse posts, documentation pages, and questions that match the query.
-    This endpoint calls all v2 endpoints in parallel with reranker functionality.
+    The query is embedded once and the v2 searches run in parallel with reranker functionality.
+    Responses are cached until ingestion bumps the content data version.
     """
     logger.info(f"🌐 POST /v2/similar for text: '{search_request.text[:50]}...' state: {search_request.state}")
+    return await cached_search_similar_v2(search_request.text, search_request.state)
 
-    # Call individual v2 endpoints in parallel using threads to avoid blocking the event loop
-    async def call_issues_v2():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_github_issues_v2, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_discourse_v2():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_discourse_posts_v2, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_docs_v2():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_metabase_docs_v2, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-    
-    async def call_questions_v2():
-        thread_db = SessionLocal()
-        try:
-            return await asyncio.to_thread(find_similar_questions_v2, request, search_request, thread_db, api_key)
-        finally:
-            thread_db.close()
-
-    # Execute all calls in parallel
-    issues, discourse_posts, metabase_docs, questions = await asyncio.gather(
-        call_issues_v2(),
-        call_discourse_v2(),
-        call_docs_v2(),
-        call_questions_v2(),
-        return_exceptions=True
-    )
-    
-    # Handle any exceptions that occurred during parallel execution
-    if isinstance(issues, Exception):
-        logger.error(f"Error fetching similar issues v2: {issues}")
-        issues = []
-    if isinstance(discourse_posts, Exception):
-        logger.error(f"Error fetching similar discourse posts v2: {discourse_posts}")
-        discourse_posts = []
-    if isinstance(metabase_docs, Exception):
-        logger.error(f"Error fetching similar metabase docs v2: {metabase_docs}")
-        metabase_docs = []
-    if isinstance(questions, Exception):
-        logger.error(f"Error fetching similar questions v2: {questions}")
-        questions = []
-
-    return V2SimilarResponse(
-        issues=issues,
-        discourse_posts=discourse_posts,
-        metabase_docs=metabase_docs,
-        questions=questions,
-        keywords=[]  # Keywords not implemented in v2 endpoints yet
-    )
-
-
-
+# --- GET endpoint for /v2/similar result cache metrics ---
+@app.get("/v2/similar/cache-stats", response_model=Dict[str, Any])
+def similar_cache_stats(
+    api_key: str = Security(get_api_key)
+) -> Dict[str, Any]:
+    """
+    Hit/miss counters, size and data version of the /v2/similar result cache for this worker process.
+    """
+    if similar_results_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **similar_results_cache.stats()}
 
 
 # Custom rate limit error handler
@@ -1434,6 +1581,53 @@ def sanitize_user_input(user_input: str) -> str:
     
     return user_input
 
+# Guardrail patterns that indicate prompt injection or prompt leakage in model output.
+# None of them match across a newline, which the streaming validator relies on.
+SUSPICIOUS_OUTPUT_PATTERNS = [re.compile(pattern) for pattern in (
+    r"(?i)as an ai language model",
+    r"(?i)i'm (an ai|chatgpt|gpt|claude)",
+    r"(?i)system prompt",
+    r"(?i)ignore previous",
+    r"(?i)my instructions (are|were)",
+    r"(?i)i (was|am) told to",
+    r"(?i)the user asked me to",
+    r"(?i)jailbreak",
+    r"(?i)developer mode",
+    r"(?i)god mode",
+    r"(?i)pretend to be",
+    r"(?i)role.*play",
+    r"(?i)as requested.*ignore",
+    r"(?i)reset.*instructions",
+    # Check if the model is repeating/leaking the system prompt
+    r"(?i)metabase.*business intelligence.*analytics platform",
+    r"(?i)context information.*keywords.*documentation",
+)]
+MAX_LLM_OUTPUT_CHARS = 5000
+SUSPICIOUS_OUTPUT_ANSWER = (
+    "I apologize, but I cannot process that request. "
+    "Please rephrase your question about Metabase in a different way."
+)
+LONG_OUTPUT_ANSWER = (
+    "I apologize, but I cannot provide a response to that request. "
+    "Please ask a more specific question about Metabase."
+)
+
+def _output_guardrail_violation(output: str, start: int = 0) -> Optional[str]:
+    """
+    Return the refusal answer if `output` trips a guardrail, else None.
+    Pattern matching begins at `start` so streams can skip already-checked lines.
+    """
+    for pattern in SUSPICIOUS_OUTPUT_PATTERNS:
+        if pattern.search(output, start):
+            logger.warning(f"Suspicious output pattern detected: {pattern.pattern}")
+            return SUSPICIOUS_OUTPUT_ANSWER
+
+    # Check for potential data leakage (system instructions in output)
+    if len(output) > MAX_LLM_OUTPUT_CHARS:  # Unusually long responses might contain leaked prompts
+        logger.warning("Response unusually long, potential prompt leakage")
+        return LONG_OUTPUT_ANSWER
+    return None
+
 def validate_llm_output(output: str, user_input: str) -> tuple[bool, str]:
     """
     Enhanced output validation based on OWASP recommendations.
@@ -1442,42 +1636,9 @@ def validate_llm_output(output: str, user_input: str) -> tuple[bool, str]:
     if not output or not isinstance(output, str):
         return False, "Invalid response generated."
     
-    # Check for prompt injection signs in output
-    suspicious_output_patterns = [
-        r"(?i)as an ai language model",
-        r"(?i)i'm (an ai|chatgpt|gpt|claude)",
-        r"(?i)system prompt",
-        r"(?i)ignore previous",
-        r"(?i)my instructions (are|were)",
-        r"(?i)i (was|am) told to",
-        r"(?i)the user asked me to",
-        r"(?i)jailbreak",
-        r"(?i)developer mode",
-        r"(?i)god mode",
-        r"(?i)pretend to be",
-        r"(?i)role.*play",
-        r"(?i)as requested.*ignore",
-        r"(?i)reset.*instructions",
-        # Check if the model is repeating/leaking the system prompt
-        r"(?i)metabase.*business intelligence.*analytics platform",
-        r"(?i)context information.*keywords.*documentation",
-    ]
-    
-    for pattern in suspicious_output_patterns:
-        if re.search(pattern, output):
-            logger.warning(f"Suspicious output pattern detected: {pattern}")
-            return False, (
-                "I apologize, but I cannot process that request. "
-                "Please rephrase your question about Metabase in a different way."
-            )
-    
-    # Check for potential data leakage (system instructions in output)
-    if len(output) > 5000:  # Unusually long responses might contain leaked prompts
-        logger.warning("Response unusually long, potential prompt leakage")
-        return False, (
-            "I apologize, but I cannot provide a response to that request. "
-            "Please ask a more specific question about Metabase."
-        )
+    refusal = _output_guardrail_violation(output)
+    if refusal:
+        return False, refusal
     
     # Basic content validation - ensure it's related to Metabase
     metabase_keywords = ['metabase', 'dashboard', 'database', 'query', 'analytics', 'visualization', 'chart']
@@ -1487,6 +1648,49 @@ def validate_llm_output(output: str, user_input: str) -> tuple[bool, str]:
     
     return True, output
 
+class StreamingOutputValidator:
+    """
+    Apply the `validate_llm_output` guardrails to a token stream.
+
+    The last `holdback` characters are withheld until more text arrives, so a
+    flagged phrase split across chunks is caught before any of it is sent.
+    Once a check fails nothing more is released and `answer` holds the refusal.
+    """
+
+    def __init__(self, user_input: str, holdback: int = settings.CHAT_STREAM_HOLDBACK_CHARS):
+        self.user_input = user_input
+        self.holdback = holdback
+        self.text = ""
+        self.released = 0
+        self.is_safe = True
+        self.answer: Optional[str] = None
+
+    def feed(self, delta: str) -> str:
+        """Add a delta and return the text that is now safe to send (possibly empty)."""
+        if not self.is_safe or not delta:
+            return ""
+        # Patterns never span lines, so only the line the previous text ended on needs re-checking
+        start = self.text.rfind("\n") + 1
+        self.text += delta
+        refusal = _output_guardrail_violation(self.text, start)
+        if refusal:
+            self.is_safe = False
+            self.answer = refusal
+            return ""
+        end = max(self.released, len(self.text) - self.holdback)
+        released, self.released = self.text[self.released:end], end
+        return released
+
+    def finish(self) -> str:
+        """Run the full validation on the complete answer and return the withheld tail if safe."""
+        if not self.is_safe:
+            return ""
+        self.is_safe, self.answer = validate_llm_output(self.text, self.user_input)
+        if not self.is_safe:
+            return ""
+        released, self.released = self.text[self.released:], len(self.text)
+        return released
+
 def log_security_event(event_type: str, user_input: str, details: str, chat_id: int):
     """Log security events for monitoring and analysis."""
     logger.warning(
@@ -1496,21 +1700,36 @@ def log_security_event(event_type: str, user_input: str, details: str, chat_id:
         f"Details: {details}"
     )
 
-@app.post("/v2/chat", response_model=ChatResponse)
-@limiter.limit("10/minute")
-async def chat_service_v2(
-    request: Request,
-    chat_request: ChatRequest,
-    db: Session = Depends(get_db),
-    api_key: str = Security(get_api_key)
-) -> ChatResponse:
+def sanitize_chat_input(chat_request: ChatRequest) -> str:
     """
-    Enhanced chat service v2 with comprehensive prompt injection protection.
-    Implements OWASP LLM security recommendations.
+    Sanitize the chat text, logging significant changes.
+
+    Raises:
+        HTTPException: If the sanitized input is too short to answer
     """
-    logger.info(f"🌐 POST /chat/v2 for text: '{chat_request.text[:50]}...' chat_id: {chat_request.chat_id}")
+    # Enhanced input validation and sanitization
+    original_input = chat_request.text
+    sanitized_input = sanitize_user_input(chat_request.text)
+    
+    # Log if significant sanitization occurred
+    if len(original_input) != len(sanitized_input) or original_input != sanitized_input:
+        log_security_event(
+            "INPUT_SANITIZED", 
+            original_input, 
+            f"Sanitized from {len(original_input)} to {len(sanitized_input)} chars",
+            chat_request.chat_id
+        )
     
-    # Create chat session record
+    # Input length validation
+    if len(sanitized_input.strip()) < 3:
+        raise HTTPException(
+            status_code=400, 
+            detail="Input too short. Please provide a meaningful question about Metabase."
+        )
+    return sanitized_input
+
+async def create_chat_session(chat_request: ChatRequest, db: AsyncSession) -> ChatSession:
+    """Insert the chat session row that the rest of the request fills in."""
     chat_session = ChatSession(
         chat_id=chat_request.chat_id,
         user_request=chat_request.text,
@@ -1518,187 +1737,223 @@ async def chat_service_v2(
         response=None
     )
     db.add(chat_session)
-    db.commit()
-    
+    await db.commit()
+    return chat_session
+
+async def finalize_chat_session(
+    db: AsyncSession,
+    chat_session_id: int,
+    response: str,
+    prompt: str,
+    tokens_sent: int = 0,
+    tokens_received: int = 0,
+    cache_hit: bool = False
+) -> None:
+    """Store the final response, prompt, token usage, and cache hit status."""
+    await db.execute(
+        sql_text("UPDATE chat_sessions SET response = :response, prompt = :prompt, tokens_sent = :tokens_sent, tokens_received = :tokens_received, cache_hit = :cache_hit WHERE id = :id"),
+        {
+            "response": response, 
+            "prompt": prompt, 
+            "tokens_sent": tokens_sent,
+            "tokens_received": tokens_received,
+            "cache_hit": cache_hit,
+            "id": chat_session_id
+        }
+    )
+    await db.commit()
+
+def get_relevant_keywords(message: str) -> List[Dict[str, str]]:
+    """Keyword matching on its own sync session; KeywordService is sync, so call this in a worker thread."""
+    with SessionLocal() as keyword_db:
+        return keyword_service.get_relevant_keywords(message, keyword_db)
+
+async def build_chat_v2_prompt(sanitized_input: str, chat_session_id: int, db: AsyncSession) -> tuple[List[Dict[str, str]], List[str], str]:
+    """
+    Retrieve keywords, docs and Q&A for the question and build the LLM messages.
+    Records the injected entities and sources on the chat session.
+
+    Returns:
+        (messages, sources, full_prompt)
+    """
+    # Step 1: Get relevant keywords for the context (direct service call)
+    logger.info("🔍 Step 1: Getting relevant keywords...")
     try:
-        # Initialize prompt tracking variable
-        full_prompt = f"Initial user request: {chat_request.text}"
-        
-        # Enhanced input validation and sanitization
-        original_input = chat_request.text
-        sanitized_input = sanitize_user_input(chat_request.text)
-        
-        # Log if significant sanitization occurred
-        if len(original_input) != len(sanitized_input) or original_input != sanitized_input:
-            log_security_event(
-                "INPUT_SANITIZED", 
-                original_input, 
-                f"Sanitized from {len(original_input)} to {len(sanitized_input)} chars",
-                chat_request.chat_id
-            )
-        
-        # Input length validation
-        if len(sanitized_input.strip()) < 3:
-            raise HTTPException(
-                status_code=400, 
-                detail="Input too short. Please provide a meaningful question about Metabase."
-            )
-        
-        # Step 1: Get relevant keywords for the context (direct service call)
-        logger.info("🔍 Step 1: Getting relevant keywords...")
-        try:
-            relevant_keywords = keyword_service.get_relevant_keywords(sanitized_input, db)
-        except Exception:
-            logger.exception("Failed to fetch relevant keywords")
-            relevant_keywords = []
-        
-        logger.info(f"📝 Found {len(relevant_keywords)} relevant keywords")
-        
-        # Step 2: Call /v2/similar endpoint to get documentation and questions/answers
-        logger.info("🔍 Step 2: Getting similar content from v2/similar endpoint...")
-        similar_response = await find_similar_v2(
-            request, 
-            SearchRequest(text=sanitized_input, state=None), 
-            db, 
-            api_key
-        )
-        
-        logger.info(f"📊 Found {len(similar_response.metabase_docs)} docs, {len(similar_response.questions)} questions")
-        
-        # Step 3: Fetch detailed content from database (only documentation and questions/answers)
-        detailed_data = []
-        sources = []
+        # Keyword matching runs sync DB queries; keep them off the event loop
+        relevant_keywords = await asyncio.to_thread(get_relevant_keywords, sanitized_input)
+    except Exception:
+        logger.exception("Failed to fetch relevant keywords")
+        relevant_keywords = []
+    
+    logger.info(f"📝 Found {len(relevant_keywords)} relevant keywords")
+    
+    # Step 2: Call /v2/similar endpoint to get documentation and questions/answers
+    logger.info("🔍 Step 2: Getting similar content from v2/similar endpoint...")
+    similar_response = await cached_search_similar_v2(sanitized_input)
+    
+    logger.info(f"📊 Found {len(similar_response.metabase_docs)} docs, {len(similar_response.questions)} questions")
+    
+    # Step 3: Fetch detailed content from database (only documentation and questions/answers)
+    detailed_data = []
+    sources = []
+    
+    # Bulk fetch metabase doc details
+    doc_ids = [doc.id for doc in similar_response.metabase_docs if doc and hasattr(doc, 'id') and doc.id is not None]
+    if doc_ids:
+        db_docs = (await db.execute(select(MetabaseDoc).where(MetabaseDoc.id.in_(doc_ids)))).scalars().all()
+        doc_dict = {doc.id: doc for doc in db_docs}
         
-        # Bulk fetch metabase doc details
-        doc_ids = [doc.id for doc in similar_response.metabase_docs if doc and hasattr(doc, 'id') and doc.id is not None]
-        if doc_ids:
-            db_docs = db.query(MetabaseDoc).filter(MetabaseDoc.id.in_(doc_ids)).all()
-            doc_dict = {doc.id: doc for doc in db_docs}
-            
-            for doc in similar_response.metabase_docs:
-                if doc and hasattr(doc, 'id') and doc.id is not None and doc.id in doc_dict:
-                    db_doc = doc_dict[doc.id]
-                    detailed_data.append({
-                        "type": "metabase_doc",
-                        "url": db_doc.url,
-                        "markdown": db_doc.markdown
-                    })
-                    sources.append(doc.url)
-                    
-                    # Track entity injection
-                    entity = ChatSessionEntity(
-                        chat_id=chat_session.id,
-                        entity_type="metabase_doc",
-                        entity_id=doc.id,
-                        entity_url=doc.url,
-                        similarity_score=doc.similarity_score
-                    )
-                    db.add(entity)
+        for doc in similar_response.metabase_docs:
+            if doc and hasattr(doc, 'id') and doc.id is not None and doc.id in doc_dict:
+                db_doc = doc_dict[doc.id]
+                detailed_data.append({
+                    "type": "metabase_doc",
+                    "url": db_doc.url,
+                    "markdown": db_doc.markdown
+                })
+                sources.append(doc.url)
+                
+                # Track entity injection
+                entity = ChatSessionEntity(
+                    chat_id=chat_session_id,
+                    entity_type="metabase_doc",
+                    entity_id=doc.id,
+                    entity_url=doc.url,
+                    similarity_score=doc.similarity_score
+                )
+                db.add(entity)
+    
+    # Bulk fetch question/answer details
+    qa_ids = [qa.id for qa in similar_response.questions if qa and hasattr(qa, 'id') and qa.id is not None]
+    if qa_ids:
+        db_qas = (await db.execute(select(Question).where(Question.id.in_(qa_ids)))).scalars().all()
+        qa_dict = {qa.id: qa for qa in db_qas}
         
-        # Bulk fetch question/answer details
-        qa_ids = [qa.id for qa in similar_response.questions if qa and hasattr(qa, 'id') and qa.id is not None]
-        if qa_ids:
-            db_qas = db.query(Question).filter(Question.id.in_(qa_ids)).all()
-            qa_dict = {qa.id: qa for qa in db_qas}
+        for qa in similar_response.questions:
+            if qa and hasattr(qa, 'id') and qa.id is not None and qa.id in qa_dict:
+                db_qa = qa_dict[qa.id]
+                detailed_data.append({
+                    "type": "question_answer",
+                    "question": db_qa.question,
+                    "answer": db_qa.answer,
+                    "url": qa.url
+                })
+                sources.append(qa.url)
+                
+                # Track entity injection
+                entity = ChatSessionEntity(
+                    chat_id=chat_session_id,
+                    entity_type="question_answer",
+                    entity_id=qa.id,
+                    entity_url=qa.url,
+                    similarity_score=qa.similarity_score
+                )
+                db.add(entity)
+    
+    # Update chat session with sources (convert to JSON serializable format)
+    serializable_sources = []
+    for source in sources:
+        if hasattr(source, '__dict__'):
+            serializable_sources.append(source.__dict__)
+        else:
+            serializable_sources.append(str(source))
+    
+    # Update the sources column properly for SQLAlchemy
+    await db.execute(
+        sql_text("UPDATE chat_sessions SET sources = :sources WHERE id = :id"),
+        {"sources": json.dumps(serializable_sources) if serializable_sources else None, "id": chat_session_id}
+    )
+    await db.commit()
+    
+    # Step 4: Build context with keywords and content
+    context_parts = []
+    
+    # Add relevant keywords
+    if relevant_keywords:
+        keyword_info = "Relevant Keywords:\n"
+        # Track keyword entity injection; look the IDs up in one query
+        keyword_ids = dict((await db.execute(
+            select(KeywordDefinition.keyword, KeywordDefinition.id)
+            .where(KeywordDefinition.keyword.in_([keyword['keyword'] for keyword in relevant_keywords]))
+        )).all())
+        for keyword in relevant_keywords:
+            keyword_info += f"- {keyword['keyword']}: {keyword['definition']}\n"
+            keyword_id = keyword_ids.get(keyword['keyword'])
             
-            for qa in similar_response.questions:
-                if qa and hasattr(qa, 'id') and qa.id is not None and qa.id in qa_dict:
-                    db_qa = qa_dict[qa.id]
-                    detailed_data.append({
-                        "type": "question_answer",
-                        "question": db_qa.question,
-                        "answer": db_qa.answer,
-                        "url": qa.url
-                    })
-                    sources.append(qa.url)
-                    
-                    # Track entity injection
-                    entity = ChatSessionEntity(
-                        chat_id=chat_session.id,
-                        entity_type="question_answer",
-                        entity_id=qa.id,
-                        entity_url=qa.url,
-                        similarity_score=qa.similarity_score
-                    )
-                    db.add(entity)
-        
-        # Update chat session with sources (convert to JSON serializable format)
-        import json
-        serializable_sources = []
-        for source in sources:
-            if hasattr(source, '__dict__'):
-                serializable_sources.append(source.__dict__)
+            if keyword_id is not None:
+                entity = ChatSessionEntity(
+                    chat_id=chat_session_id,
+                    entity_type="keyword",
+                    entity_id=keyword_id,
+                    entity_url=None,
+                    similarity_score=None  # NULL for keywords since they don't have similarity scores
+                )
+                db.add(entity)
+                logger.info(f"Added keyword entity: {keyword['keyword']} with actual ID: {keyword_id}")
             else:
-                serializable_sources.append(str(source))
-        
-        # Update the sources column properly for SQLAlchemy
-        db.execute(
-            sql_text("UPDATE chat_sessions SET sources = :sources WHERE id = :id"),
-            {"sources": json.dumps(serializable_sources) if serializable_sources else None, "id": chat_session.id}
-        )
-        db.commit()
-        
-        # Step 4: Build context with keywords and content
-        context_parts = []
-        
-        # Add relevant keywords
-        if relevant_keywords:
-            keyword_info = "Relevant Keywords:\n"
-            for keyword in relevant_keywords:
-                keyword_info += f"- {keyword['keyword']}: {keyword['definition']}\n"
-                # Track keyword entity injection
-                from src.models import KeywordDefinition
-                db_keyword = db.query(KeywordDefinition).filter(
-                    KeywordDefinition.keyword == keyword['keyword']
-                ).first()
-                
-                if db_keyword:
-                    entity = ChatSessionEntity(
-                        chat_id=chat_session.id,
-                        entity_type="keyword",
-                        entity_id=db_keyword.id,
-                        entity_url=None,
-                        similarity_score=None  # NULL for keywords since they don't have similarity scores
-                    )
-                    db.add(entity)
-                    logger.info(f"Added keyword entity: {keyword['keyword']} with actual ID: {db_keyword.id}")
-                else:
-                    logger.warning(f"Keyword '{keyword['keyword']}' not found in database, skipping entity tracking")
-            context_parts.append(keyword_info)
-        
-        # Add content from database (only documentation and questions/answers)
-        for item in detailed_data:
-            if item["type"] == "metabase_doc":
-                context_parts.append(f"Documentation: {item['markdown']}\nURL: {item['url']}")
-            elif item["type"] == "question_answer":
-                context_parts.append(f"Q&A: {item['question']}\nAnswer: {item['answer']}\nURL: {item['url']}")
+                logger.warning(f"Keyword '{keyword['keyword']}' not found in database, skipping entity tracking")
+        context_parts.append(keyword_info)
+    
+    # Add content from database (only documentation and questions/answers)
+    for item in detailed_data:
+        if item["type"] == "metabase_doc":
+            context_parts.append(f"Documentation: {item['markdown']}\nURL: {item['url']}")
+        elif item["type"] == "question_answer":
+            context_parts.append(f"Q&A: {item['question']}\nAnswer: {item['answer']}\nURL: {item['url']}")
+    
+    context = "\n\n---\n\n".join(context_parts)
+    
+    # Strict message construction - complete separation of user input and system instructions
+    system_prompt = get_api_chat_system_prompt()
+    context_prompt = get_api_context_prompt(context)
+    
+    # Construct messages with strict separation
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": context_prompt},
+        {"role": "user", "content": sanitized_input}
+    ]
+
+    # Capture the full prompt for storage
+    full_prompt = "\n\n".join([
+        f"[SYSTEM]: {system_prompt}",
+        f"[CONTEXT]: {context_prompt}",
+        f"[USER]: {sanitized_input}"
+    ])
+    return messages, sources, full_prompt
+
+@app.post("/v2/chat", response_model=ChatResponse)
+@limiter.limit("10/minute")
+async def chat_service_v2(
+    request: Request,
+    chat_request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> ChatResponse:
+    """
+    Enhanced chat service v2 with comprehensive prompt injection protection.
+    Implements OWASP LLM security recommendations.
+    """
+    logger.info(f"🌐 POST /chat/v2 for text: '{chat_request.text[:50]}...' chat_id: {chat_request.chat_id}")
+    
+    # Create chat session record; keep the id, since a rollback expires the ORM object
+    chat_session = await create_chat_session(chat_request, db)
+    chat_session_id = chat_session.id
+    # Initialize prompt tracking variable
+    full_prompt = f"Initial user request: {chat_request.text}"
+    
+    try:
+        sanitized_input = sanitize_chat_input(chat_request)
         
-        context = "\n\n---\n\n".join(context_parts)
+        # Steps 1-4: keywords, similar content and context
+        messages, sources, full_prompt = await build_chat_v2_prompt(sanitized_input, chat_session_id, db)
         
         # Step 5: Enhanced LLM interaction with strict separation
         logger.info("🤖 Step 5: Generating final answer with enhanced security...")
-        
-        # Strict message construction - complete separation of user input and system instructions
-        system_prompt = get_api_chat_system_prompt()
-        context_prompt = get_api_context_prompt(context)
-        
-        # Construct messages with strict separation
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": context_prompt},
-            {"role": "user", "content": sanitized_input}
-        ]
-
-        # Capture the full prompt for storage
-        full_prompt = "\n\n".join([
-            f"[SYSTEM]: {system_prompt}",
-            f"[CONTEXT]: {context_prompt}",
-            f"[USER]: {sanitized_input}"
-        ])
 
         # Call LLM with enhanced error handling and token tracking
         try:
-            llm_response = llm_client.call_llm_with_usage(
+            llm_response = await llm_client.acall_llm_with_usage(
                 messages=messages,
                 model="openai-slow",
                 max_retries=3
@@ -1738,18 +1993,7 @@ async def chat_service_v2(
             final_answer = validated_answer
 
         # Update chat session with final response, prompt, token usage, and cache hit status
-        db.execute(
-            sql_text("UPDATE chat_sessions SET response = :response, prompt = :prompt, tokens_sent = :tokens_sent, tokens_received = :tokens_received, cache_hit = :cache_hit WHERE id = :id"),
-            {
-                "response": final_answer, 
-                "prompt": full_prompt, 
-                "tokens_sent": tokens_sent,
-                "tokens_received": tokens_received,
-                "cache_hit": cache_hit,
-                "id": chat_session.id
-            }
-        )
-        db.commit()
+        await finalize_chat_session(db, chat_session_id, final_answer, full_prompt, tokens_sent, tokens_received, cache_hit)
         
         logger.info(f"✅ Chat v2 response generated successfully")
         
@@ -1766,24 +2010,116 @@ async def chat_service_v2(
         log_security_event("SYSTEM_ERROR", chat_request.text, str(e), chat_request.chat_id)
         
         # Rollback any pending changes and update chat session with error information
-        db.rollback()
-        # Use the full_prompt if it was created, otherwise use a fallback
-        error_prompt = locals().get('full_prompt', f"Error occurred before prompt construction: {chat_request.text}")
-        
-        db.execute(
-            sql_text("UPDATE chat_sessions SET response = :response, prompt = :prompt, tokens_sent = :tokens_sent, tokens_received = :tokens_received, cache_hit = :cache_hit WHERE id = :id"),
-            {
-                "response": f"Error: {str(e)}", 
-                "prompt": error_prompt, 
-                "tokens_sent": 0,
-                "tokens_received": 0,
-                "cache_hit": False,
-                "id": chat_session.id
-            }
-        )
-        db.commit()
+        await db.rollback()
+        await finalize_chat_session(db, chat_session_id, f"Error: {str(e)}", full_prompt)
         raise HTTPException(status_code=500, detail="An error occurred processing your request. Please try again.")
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_v2_event_stream(chat_request: ChatRequest, sanitized_input: str, chat_session_id: int):
+    """
+    Server-sent events for /v2/chat/stream.
+
+    Events, in order: `sources` once retrieval finishes, `token` for each
+    released chunk of the answer, `replace` if a guardrail trips (the client
+    must discard the streamed text and show `answer` instead), and finally
+    `done` with the answer and token usage, or `error`.
+    """
+    # The request-scoped session is closed before the body streams, so use our own
+    db = AsyncSessionLocal()
+    full_prompt = f"Initial user request: {chat_request.text}"
+    validator = StreamingOutputValidator(sanitized_input)
+    stream = None
+    finalized = False
+    try:
+        messages, sources, full_prompt = await build_chat_v2_prompt(sanitized_input, chat_session_id, db)
+        yield sse_event("sources", {"sources": sources})
+
+        logger.info("🤖 Step 5: Streaming final answer with enhanced security...")
+        stream = await llm_client.astream_llm_with_usage(messages=messages, model="openai-slow", max_retries=3)
+        async for delta in stream:
+            released = validator.feed(delta)
+            if released:
+                yield sse_event("token", {"content": released})
+            if not validator.is_safe:
+                await stream.aclose()
+                break
+
+        released = validator.finish()
+        if released:
+            yield sse_event("token", {"content": released})
+        if not validator.is_safe:
+            log_security_event("UNSAFE_OUTPUT", sanitized_input, validator.text[:200], chat_request.chat_id)
+            yield sse_event("replace", {"answer": validator.answer})
+
+        usage = stream.usage()
+        tokens_sent = usage['tokens_sent']
+        tokens_received = 0 if usage['cache_hit'] else usage['tokens_received']
+        await finalize_chat_session(
+            db, chat_session_id, validator.answer, full_prompt, tokens_sent, tokens_received, usage['cache_hit']
+        )
+        finalized = True
+        logger.info(f"✅ Chat v2 stream completed (response id: {usage['response_id']})")
+
+        yield sse_event("done", {
+            "answer": validator.answer,
+            "sources": sources,
+            "tokens_sent": tokens_sent,
+            "tokens_received": tokens_received,
+            "cache_hit": usage['cache_hit'],
+        })
+    except Exception as e:
+        logger.error(f"❌ Error in chat v2 stream: {e}")
+        log_security_event("SYSTEM_ERROR", chat_request.text, str(e), chat_request.chat_id)
+        await db.rollback()
+        await finalize_chat_session(db, chat_session_id, f"Error: {str(e)}", full_prompt)
+        finalized = True
+        yield sse_event("error", {"detail": "An error occurred processing your request. Please try again."})
+    finally:
+        if not finalized:
+            # Client went away mid-stream; keep whatever had been generated
+            if stream is not None:
+                await stream.aclose()
+            try:
+                await db.rollback()
+                await finalize_chat_session(
+                    db, chat_session_id, f"Disconnected: {validator.text}", full_prompt,
+                    stream.tokens_sent if stream else 0, stream.tokens_received if stream else 0
+                )
+            except Exception as e:
+                logger.warning(f"Could not record disconnected chat session {chat_session_id}: {e}")
+        await db.close()
+
+@app.post("/v2/chat/stream")
+@limiter.limit("10/minute")
+async def chat_service_v2_stream(
+    request: Request,
+    chat_request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: str = Security(get_api_key)
+) -> StreamingResponse:
+    """
+    Streaming variant of /v2/chat using server-sent events.
+    Sources are sent as soon as retrieval finishes, then the answer token by token.
+    """
+    logger.info(f"🌐 POST /chat/v2/stream for text: '{chat_request.text[:50]}...' chat_id: {chat_request.chat_id}")
+
+    chat_session = await create_chat_session(chat_request, db)
+    try:
+        sanitized_input = sanitize_chat_input(chat_request)
+    except HTTPException as e:
+        await finalize_chat_session(db, chat_session.id, f"Error: {e.detail}", f"Initial user request: {chat_request.text}")
+        raise
+
+    return StreamingResponse(
+        chat_v2_event_stream(chat_request, sanitized_input, chat_session.id),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Server startup code
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,237 @@
+"""
+Small bounded caches with TTL expiry and hit/miss counters.
+
+`LRUCache` lives in process memory. `SQLiteCache` keeps entries in a SQLite
+file so several processes (uvicorn workers, monitor workers) on the same
+host share one cache.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(Protocol):
+    """Protocol for key/value caches."""
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss."""
+        ...
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value."""
+        ...
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size information."""
+        ...
+
+
+class _CacheStats:
+    """Thread-safe hit/miss/eviction counters shared by the cache implementations."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self, size: int, maxsize: int, ttl_seconds: Optional[float]) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "maxsize": maxsize,
+            "ttl_seconds": ttl_seconds,
+        }
+
+
+class LRUCache:
+    """In-process LRU cache with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = _CacheStats()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = self._stats.as_dict(len(self._entries), self.maxsize, self.ttl_seconds)
+        result["backend"] = "memory"
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    LRU cache stored in a SQLite file, shared by every process that opens the same path.
+
+    Keys are strings. Values go through `dumps`/`loads` (JSON by default) and are
+    stored as BLOBs. Hit/miss counters are per process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        dumps: Callable[[Any], bytes] = lambda value: json.dumps(value).encode("utf-8"),
+        loads: Callable[[bytes], Any] = lambda data: json.loads(data),
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._dumps = dumps
+        self._loads = loads
+        self._lock = threading.Lock()
+        self._stats = _CacheStats()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Connections inherited across fork(); kept referenced so they are never closed in the child
+        self._inherited_connections = []
+        self._pid = os.getpid()
+        self._conn = self._open()
+        logger.info(f"Opened SQLite cache at {path} (maxsize={maxsize}, ttl={ttl_seconds})")
+
+    def _open(self) -> sqlite3.Connection:
+        # One connection per process, serialized by the lock; SQLite handles cross-process locking
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)")
+        return conn
+
+    def _reopen_after_fork(self) -> None:
+        """
+        Give a forked child (e.g. a `src.server --preload` worker) its own connection and lock.
+        SQLite connections must not cross fork(), and the inherited lock may be held by a parent thread.
+        """
+        if self._pid == os.getpid():
+            return
+        self._lock = threading.Lock()
+        self._inherited_connections.append(self._conn)
+        self._conn = self._open()
+        self._pid = os.getpid()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.time()
+        self._reopen_after_fork()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE key = ?", (str(key),)
+            ).fetchone()
+            if row is None:
+                self._stats.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (str(key),))
+                self._stats.misses += 1
+                return None
+            self._conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, str(key)))
+            self._stats.hits += 1
+        return self._loads(value)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        data = self._dumps(value)
+        self._reopen_after_fork()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (str(key), data, expires_at, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently used ones above maxsize."""
+        expired = self._conn.execute(
+            "DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        size = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        overflow = size - self.maxsize
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+        self._stats.evictions += max(expired, 0) + max(overflow, 0)
+
+    def clear(self) -> None:
+        self._reopen_after_fork()
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+
+    def stats(self) -> Dict[str, Any]:
+        self._reopen_after_fork()
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+            result = self._stats.as_dict(size, self.maxsize, self.ttl_seconds)
+        result["backend"] = "sqlite"
+        result["path"] = self.path
+        return result
+
+    def __len__(self) -> int:
+        self._reopen_after_fork()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
@@ -0,0 +1,101 @@
+"""
+Prune vector-search candidates before they reach the cross-encoder.
+
+Reranking is the most expensive CPU stage of a v2 request, yet vector scores
+often fall off a cliff after the first few hits. Candidates past that point
+almost never make it into the results, so scoring them is wasted work.
+Within each source, `CandidatePruner`:
+
+- always keeps the `min_keep` best candidates
+- drops candidates scoring below `relative_floor` x the source's best score
+- cuts the list at the first drop between neighbours larger than `max_gap`
+
+Across the whole request it then enforces a `max_pairs` budget. Each source's
+guaranteed candidates come first; the budget left over goes to the best
+remaining candidates by vector score.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _score(candidate: Dict[str, Any]) -> float:
+    return float(candidate.get('similarity_score') or 0.0)
+
+
+class CandidatePruner:
+    """Score-gap aware pruning of rerank candidates, per source and per request."""
+
+    def __init__(
+        self,
+        min_keep: Optional[int] = None,
+        relative_floor: Optional[float] = None,
+        max_gap: Optional[float] = None,
+        max_pairs: Optional[int] = None,
+    ):
+        self.min_keep = settings.RERANK_PRUNE_MIN_KEEP if min_keep is None else min_keep
+        self.relative_floor = settings.RERANK_PRUNE_RELATIVE_FLOOR if relative_floor is None else relative_floor
+        self.max_gap = settings.RERANK_PRUNE_MAX_GAP if max_gap is None else max_gap
+        self.max_pairs = settings.RERANK_MAX_PAIRS if max_pairs is None else max_pairs
+
+    def _prune_source(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply the floor and gap cutoffs to one source's candidates (best first)."""
+        ranked = sorted(candidates, key=_score, reverse=True)
+        if len(ranked) <= self.min_keep:
+            return ranked
+
+        floor = _score(ranked[0]) * self.relative_floor if self.relative_floor > 0 else None
+        kept = ranked[:self.min_keep]
+        for candidate in ranked[self.min_keep:]:
+            score = _score(candidate)
+            if floor is not None and score < floor:
+                break
+            if self.max_gap > 0 and _score(kept[-1]) - score > self.max_gap:
+                break
+            kept.append(candidate)
+        return kept
+
+    def _apply_budget(self, groups: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Trim the request to `max_pairs` candidates (each group is already best first)."""
+        total = sum(len(candidates) for candidates in groups.values())
+        if self.max_pairs <= 0 or total <= self.max_pairs:
+            return groups
+
+        guaranteed = [(name, c) for name, candidates in groups.items() for c in candidates[:self.min_keep]]
+        extra = [(name, c) for name, candidates in groups.items() for c in candidates[self.min_keep:]]
+        # Each source's guaranteed candidates outrank the rest; within a tier the best vector scores win
+        ordered = (
+            sorted(guaranteed, key=lambda item: _score(item[1]), reverse=True)
+            + sorted(extra, key=lambda item: _score(item[1]), reverse=True)
+        )
+        kept: Dict[str, List[Dict[str, Any]]] = {name: [] for name in groups}
+        for name, candidate in ordered[:self.max_pairs]:
+            kept[name].append(candidate)
+        for candidates in kept.values():
+            candidates.sort(key=_score, reverse=True)
+        return kept
+
+    def prune_groups(self, groups: Dict[str, List[Dict[str, Any]]], query: str = "") -> Dict[str, List[Dict[str, Any]]]:
+        """Prune candidates grouped by source and log how many rerank pairs were saved."""
+        pruned = self._apply_budget({name: self._prune_source(candidates) for name, candidates in groups.items()})
+
+        before = sum(len(candidates) for candidates in groups.values())
+        after = sum(len(candidates) for candidates in pruned.values())
+        if before:
+            per_source = ", ".join(
+                f"{name} {len(groups[name])}->{len(pruned[name])}" for name in groups
+            )
+            logger.info(
+                f"✂️ Rerank pruning for '{query[:50]}': kept {after}/{before} pairs, "
+                f"saved {before - after} ({per_source})"
+            )
+        return pruned
+
+    def prune(self, candidates: List[Dict[str, Any]], query: str = "") -> List[Dict[str, Any]]:
+        """Prune a single source's candidates."""
+        return self.prune_groups({"candidates": candidates}, query)["candidates"]
+
@@ -0,0 +1,149 @@
+"""
+Data-version counter for the searchable content tables.
+
+Statement-level triggers on the tables read by the similarity endpoints bump a
+row in `data_versions` and NOTIFY the new value, so every writer (ingestion,
+embedding workers, manual SQL) invalidates cached search results without having
+to remember to. API processes follow the counter through `DataVersionTracker`.
+"""
+
+import logging
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+
+from .db import engine
+from .db_listener import NotificationListener
+
+logger = logging.getLogger(__name__)
+
+# Tables whose rows feed /v1/similar, /v2/similar and /v2/chat
+CONTENT_TABLES = ("issues", "discourse_posts", "metabase_docs", "questions")
+CONTENT_VERSION_NAME = "content"
+DATA_VERSION_CHANNEL = "data_version"
+
+_BUMP_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    INSERT INTO data_versions (name, version, updated_at)
+    VALUES (TG_ARGV[0], 1, now())
+    ON CONFLICT (name) DO UPDATE
+        SET version = data_versions.version + 1, updated_at = now()
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('{DATA_VERSION_CHANNEL}', new_version::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _trigger_name(table: str) -> str:
+    return f"trg_{table}_data_version"
+
+
+def install_data_version_triggers(tables: Iterable[str] = CONTENT_TABLES) -> None:
+    """Create the bump function and one statement-level trigger per content table (idempotent)."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS data_versions ("
+            " name VARCHAR PRIMARY KEY,"
+            " version BIGINT NOT NULL DEFAULT 0,"
+            " updated_at TIMESTAMP NOT NULL DEFAULT now())"
+        ))
+        conn.execute(text(
+            "INSERT INTO data_versions (name, version) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING"
+        ), {"name": CONTENT_VERSION_NAME})
+        conn.execute(text(_BUMP_FUNCTION_SQL))
+        for table in tables:
+            trigger = _trigger_name(table)
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER {trigger} "
+                f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('{CONTENT_VERSION_NAME}')"
+            ))
+            logger.info(f"Installed data-version trigger on {table}")
+
+
+def drop_data_version_triggers(tables: Iterable[str] = CONTENT_TABLES) -> None:
+    """Remove the content triggers; cached results then stay valid until the API restarts."""
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_trigger_name(table)} ON {table}"))
+        conn.execute(text("DROP FUNCTION IF EXISTS bump_data_version()"))
+
+
+def bump_data_version(name: str = CONTENT_VERSION_NAME) -> int:
+    """Bump a counter by hand, e.g. after changes made with the triggers disabled."""
+    with engine.begin() as conn:
+        version = conn.execute(text(
+            "INSERT INTO data_versions (name, version, updated_at) VALUES (:name, 1, now()) "
+            "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1, updated_at = now() "
+            "RETURNING version"
+        ), {"name": name}).scalar_one()
+        conn.execute(text("SELECT pg_notify(:channel, :payload)"), {
+            "channel": DATA_VERSION_CHANNEL, "payload": str(version)
+        })
+    return version
+
+
+def read_data_version(name: str = CONTENT_VERSION_NAME) -> Optional[int]:
+    """Current counter value, or None when the version table has not been installed."""
+    with engine.connect() as conn:
+        exists = conn.execute(text("SELECT to_regclass('data_versions')")).scalar()
+        if exists is None:
+            return None
+        return conn.execute(
+            text("SELECT version FROM data_versions WHERE name = :name"), {"name": name}
+        ).scalar()
+
+
+class DataVersionTracker:
+    """
+    In-process view of the content data version.
+
+    `version` is None until the tracker has read the counter and whenever the
+    listener is disconnected, so callers can treat "unknown" as "do not cache".
+    """
+
+    def __init__(self, listener: NotificationListener, name: str = CONTENT_VERSION_NAME):
+        self.name = name
+        self._listener = listener
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self._warned_missing = False
+        listener.subscribe(DATA_VERSION_CHANNEL, self._on_notify)
+        listener.on_connect(self.refresh)
+
+    @property
+    def version(self) -> Optional[int]:
+        if not self._listener.connected.is_set():
+            return None
+        return self._version
+
+    def refresh(self) -> None:
+        """Re-read the counter from the database (after connecting and on idle polls)."""
+        try:
+            version = read_data_version(self.name)
+        except Exception as e:
+            logger.warning(f"Could not read data version: {e}")
+            version = None
+        if version is None and not self._warned_missing:
+            logger.warning("data_versions table missing; run `run.py db version-triggers` to enable result caching")
+            self._warned_missing = True
+        with self._lock:
+            self._version = version
+
+    def _on_notify(self, payload: str) -> None:
+        try:
+            version = int(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed data version payload: {payload!r}")
+            return
+        with self._lock:
+            # Ignore late notifications carrying an older counter value
+            if self._version is None or version > self._version:
+                self._version = version
@@ -1,9 +1,39 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from .settings import DATABASE_URL
+import psycopg
+from pgvector.psycopg import register_vector, register_vector_async
+
+from .constants import MAX_SIMILARITY_CANDIDATES
+from .settings import (
+    DATABASE_URL, HNSW_EF_SEARCH, DB_PREPARE_THRESHOLD, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW,
+    BINARY_PREFILTER_TABLES, BINARY_PREFILTER_CANDIDATES, SEARCH_VECTORS_ENABLED, SEARCH_VECTORS_CANDIDATES,
+)
+
+logger = logging.getLogger(__name__)
+
+connect_args = {
+    "connect_timeout": 60,  # 60 second connection timeout
+    "keepalives_idle": 30,  # Send keepalive after 30 seconds of inactivity
+    "keepalives_interval": 10,  # Send keepalive every 10 seconds
+    "keepalives_count": 5,  # Allow 5 missed keepalives before considering connection dead
+    "prepare_threshold": DB_PREPARE_THRESHOLD,  # Server-side prepare statements after N executions
+}
+# An HNSW scan returns at most ef_search rows, so it must cover the per-column candidate
+# limit of the v2 queries (pgvector's default of 40 would cut them short), the binary
+# prefilter and the unified search_vectors probe
+ef_search = max(
+    HNSW_EF_SEARCH or 0,
+    MAX_SIMILARITY_CANDIDATES,
+    BINARY_PREFILTER_CANDIDATES if BINARY_PREFILTER_TABLES else 0,
+    SEARCH_VECTORS_CANDIDATES if SEARCH_VECTORS_ENABLED else 0,
+)
+# Applied to every pooled session so HNSW scans return enough candidates for the CTE limits
+connect_args["options"] = f"-c hnsw.ef_search={ef_search}"
 
 # Configure engine with better connection handling
 engine = create_engine(
@@ -13,16 +43,48 @@ engine = create_engine(
     pool_size=10,        # Maximum number of connections
     max_overflow=20,     # Additional connections when pool is full
     echo=False,          # Set to True for SQL debugging
-    connect_args={
-        "connect_timeout": 60,  # 60 second connection timeout
-        "keepalives_idle": 30,  # Send keepalive after 30 seconds of inactivity
-        "keepalives_interval": 10,  # Send keepalive every 10 seconds
-        "keepalives_count": 5,  # Allow 5 missed keepalives before considering connection dead
-    }
+    connect_args=connect_args,
 )
 
+
+@event.listens_for(engine, "connect")
+def _register_vector_types(dbapi_connection, connection_record):
+    """Register pgvector dumpers so numpy query vectors are bound in binary format."""
+    try:
+        register_vector(dbapi_connection)
+    except psycopg.ProgrammingError:
+        # The extension is not installed yet (e.g. while running `db enable-vector`)
+        logger.debug("pgvector extension not found; vector parameters will not be adapted")
+    # The type lookup opened a transaction; leave the connection idle for the pool
+    dbapi_connection.rollback()
+
+
+# Async engine for the search endpoints: psycopg's async connection, so DB waits
+# are multiplexed on the event loop instead of parking executor threads
+async_engine = create_async_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    pool_size=DB_ASYNC_POOL_SIZE,
+    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+    echo=False,
+    connect_args=connect_args,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_vector_types_async(dbapi_connection, connection_record):
+    """Async counterpart of `_register_vector_types`."""
+    try:
+        dbapi_connection.run_async(register_vector_async)
+    except psycopg.ProgrammingError:
+        logger.debug("pgvector extension not found; vector parameters will not be adapted")
+    dbapi_connection.rollback()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -33,4 +95,12 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Async SQLAlchemy dependency to get a database session.
+    Ensures the session is always closed after the request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,125 @@
+"""
+Background LISTEN connection for Postgres notifications.
+
+A single daemon thread holds a dedicated autocommit connection, LISTENs on the
+subscribed channels and dispatches each NOTIFY payload to its callbacks. When
+the connection drops it reconnects and calls the `on_connect` hooks, so
+subscribers can resynchronize any state they may have missed.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import psycopg
+from psycopg import sql
+from sqlalchemy.engine import make_url
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+def libpq_conninfo(database_url: Optional[str] = None) -> str:
+    """Turn the SQLAlchemy DATABASE_URL into a plain libpq URL for psycopg.connect."""
+    url = make_url(database_url or settings.DATABASE_URL).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+class NotificationListener:
+    """Dispatch Postgres NOTIFY messages to in-process callbacks from a background thread."""
+
+    def __init__(self, conninfo: Optional[str] = None, poll_seconds: float = 30.0, retry_seconds: float = 5.0):
+        self.conninfo = conninfo or libpq_conninfo()
+        # How often to wake up without notifications; on_connect hooks also run on this beat
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = {}
+        self._on_connect: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = threading.Event()
+        # Bumped on every (re)connect; notifications sent while disconnected are lost
+        self.connections = 0
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Call `callback(payload)` for every NOTIFY on `channel`. Subscribe before `start()`."""
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+
+    def on_connect(self, callback: Callable[[], None]) -> None:
+        """Call `callback()` after every (re)connect and on each idle poll."""
+        with self._lock:
+            self._on_connect.append(callback)
+
+    def start(self) -> None:
+        """Start the listener thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the listener thread to exit and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.connected.clear()
+
+    def _run_hooks(self) -> None:
+        for hook in list(self._on_connect):
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Notification listener hook failed: {e}")
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for callback in list(self._callbacks.get(channel, [])):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.warning(f"Notification callback for '{channel}' failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    for channel in list(self._callbacks):
+                        conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                    self.connections += 1
+                    self.connected.set()
+                    logger.info(f"Listening for notifications on: {', '.join(self._callbacks) or '(none)'}")
+                    self._run_hooks()
+
+                    while not self._stop.is_set():
+                        received = False
+                        for notify in conn.notifies(timeout=self.poll_seconds):
+                            received = True
+                            self._dispatch(notify.channel, notify.payload)
+                            if self._stop.is_set():
+                                break
+                        if not received:
+                            self._run_hooks()
+            except Exception as e:
+                self.connected.clear()
+                if self._stop.is_set():
+                    break
+                logger.warning(f"Notification listener disconnected ({e}); retrying in {self.retry_seconds}s")
+                time.sleep(self.retry_seconds)
+        self.connected.clear()
+
+
+_listener: Optional[NotificationListener] = None
+_listener_lock = threading.Lock()
+
+
+def get_notification_listener() -> NotificationListener:
+    """Process-wide listener shared by every subscriber."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = NotificationListener(poll_seconds=settings.DATA_VERSION_POLL_SECONDS)
+        return _listener
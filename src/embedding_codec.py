@@ -0,0 +1,79 @@
+"""
+Compact binary encoding for batches of embeddings.
+
+Layout (all little-endian):
+
+    header   16 bytes  magic b"EMB1", version u8, dtype u8, reserved u16, rows u32, dim u32
+    validity rows bytes, 1 when the row holds an embedding, 0 when it failed
+    data     rows * dim values of the header dtype (zeros for invalid rows)
+
+float32 is exact for model outputs; float16 halves the size again at roughly
+1e-3 relative error, which does not change cosine rankings in practice.
+"""
+
+import struct
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDINGS_MEDIA_TYPE = "application/x-embeddings"
+EMBEDDING_FORMATS = ("json", "float32", "float16")
+
+_MAGIC = b"EMB1"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBHII")
+_DTYPES = {"float32": (1, np.dtype("<f4")), "float16": (2, np.dtype("<f2"))}
+_DTYPE_BY_CODE = {code: dtype for code, dtype in _DTYPES.values()}
+
+
+def encode_embeddings(embeddings: Sequence[Optional[Sequence[float]]], dtype: str = "float32") -> bytes:
+    """
+    Pack a batch of embeddings (None for failed rows) into the binary format.
+
+    Raises:
+        ValueError: If the dtype is unsupported or rows have different dimensions
+    """
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}', expected one of {list(_DTYPES)}")
+    code, np_dtype = _DTYPES[dtype]
+
+    dims = {len(embedding) for embedding in embeddings if embedding is not None}
+    if len(dims) > 1:
+        raise ValueError(f"Embeddings have mixed dimensions: {sorted(dims)}")
+    dim = dims.pop() if dims else 0
+
+    rows = len(embeddings)
+    validity = np.zeros(rows, dtype=np.uint8)
+    data = np.zeros((rows, dim), dtype=np_dtype)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None:
+            validity[i] = 1
+            data[i] = embedding
+
+    return _HEADER.pack(_MAGIC, _VERSION, code, 0, rows, dim) + validity.tobytes() + data.tobytes()
+
+
+def decode_embeddings(payload: bytes) -> List[Optional[List[float]]]:
+    """
+    Unpack a binary payload produced by `encode_embeddings`.
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if len(payload) < _HEADER.size:
+        raise ValueError("Embedding payload is shorter than its header")
+    magic, version, code, _, rows, dim = _HEADER.unpack_from(payload)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not an embedding payload (bad magic or version)")
+    if code not in _DTYPE_BY_CODE:
+        raise ValueError(f"Unknown embedding dtype code {code}")
+    np_dtype = _DTYPE_BY_CODE[code]
+
+    expected = _HEADER.size + rows + rows * dim * np_dtype.itemsize
+    if len(payload) != expected:
+        raise ValueError(f"Embedding payload has {len(payload)} bytes, expected {expected}")
+
+    validity = np.frombuffer(payload, dtype=np.uint8, count=rows, offset=_HEADER.size)
+    data = np.frombuffer(payload, dtype=np_dtype, count=rows * dim, offset=_HEADER.size + rows).reshape(rows, dim)
+    values = data.astype(np.float32)
+    return [values[i].tolist() if validity[i] else None for i in range(rows)]
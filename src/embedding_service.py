@@ -5,18 +5,28 @@ Provides a consistent interface for creating text embeddings using either local
 
 import logging
 import json
+import hashlib
+import os
+import threading
+import time
 from typing import Protocol, List, Optional, Union
 from abc import ABC, abstractmethod
 
-import torch
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import requests
 
 from src import settings
-from .utils import get_device
+from .cache import Cache, LRUCache, SQLiteCache
+from .text_utils import normalize_query_text
+from .micro_batcher import MicroBatcher
+from .onnx_utils import create_session, ensure_onnx_model, onnx_model_dir, run_with_io_binding, session_inputs
+from .embedding_codec import EMBEDDING_FORMATS, EMBEDDINGS_MEDIA_TYPE, decode_embeddings
+from .utils import get_device, is_cuda_oom
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
 
 class EmbeddingProvider(Protocol):
     """Protocol for embedding providers."""
@@ -30,15 +40,138 @@ class EmbeddingProvider(Protocol):
         ...
 
 
+class OnnxSentenceEncoder:
+    """
+    CPU stand-in for `SentenceTransformer.encode` backed by ONNX Runtime.
+
+    Only the transformer runs in the ONNX graph; mean pooling over the attention
+    mask and L2 normalization are done in NumPy. The pooling setup of the original
+    model is recorded next to the export, so later starts never load PyTorch weights.
+    """
+
+    CONFIG_FILE = "encoder.json"
+
+    def __init__(self, model_name: str, quantize: bool = False, batch_size: int = 32):
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model_path = ensure_onnx_model(
+            model_name,
+            self._load_torch_model,
+            self.tokenizer,
+            ["last_hidden_state"],
+            quantize,
+            output_axes={"last_hidden_state": {0: "batch", 1: "sequence"}},
+        )
+        config_path = os.path.join(onnx_model_dir(model_name), self.CONFIG_FILE)
+        if not os.path.exists(config_path):
+            # Export predates the config file; re-read it from the original model
+            self._load_torch_model()
+        with open(config_path) as f:
+            config = json.load(f)
+        self.max_seq_length = int(config["max_seq_length"])
+        self.normalize = bool(config["normalize"])
+        self.session = create_session(self.model_path)
+
+    def _load_torch_model(self):
+        """Load the SentenceTransformer once to export it and record its pooling config."""
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(self.model_name, device="cpu")
+        module_types = [type(module).__name__ for module in model]
+        pooling = model[1] if len(module_types) > 1 and module_types[1] == "Pooling" else None
+        if pooling is None or pooling.get_pooling_mode_str() != "mean":
+            raise ValueError(f"ONNX embedding backend only supports mean pooling models, got {module_types}")
+
+        config_path = os.path.join(onnx_model_dir(self.model_name), self.CONFIG_FILE)
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        with open(config_path, "w") as f:
+            json.dump({"max_seq_length": model.max_seq_length, "normalize": "Normalize" in module_types}, f)
+        return model[0].auto_model
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        hidden = run_with_io_binding(self.session, session_inputs(self.session, encoded), "last_hidden_state")
+        mask = encoded["attention_mask"].astype(np.float32)[:, :, None]
+        embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+    def encode(self, sentences: Union[str, List[str]]) -> np.ndarray:
+        """Embed one text (1-D result) or a list of texts (2-D, in input order)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        # Length-sorted batches keep padding low, as SentenceTransformer.encode does
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for text_index, embedding in zip(batch, self._encode_batch([texts[i] for i in batch])):
+                rows[text_index] = embedding
+        embeddings = np.stack(rows)
+        return embeddings[0] if single else embeddings
+
+
 class LocalEmbeddingProvider:
-    """Local embedding provider using SentenceTransformers."""
+    """Local embedding provider using SentenceTransformers, or ONNX Runtime on CPU (EMBEDDING_BACKEND)."""
     
-    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None):
-        """Initialize the local embedding provider."""
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        backend: Optional[str] = None,
+    ):
+        """
+        Initialize the local embedding provider.
+
+        Concurrent `create_embedding` calls are coalesced into one `model.encode`
+        of up to `max_batch_size` texts, waiting at most `max_wait_ms` for the
+        batch to fill. A batch size of 1 disables micro-batching.
+
+        `backend` is 'torch' (SentenceTransformer), 'onnx' or 'onnx-int8'
+        (ONNX Runtime on CPU); it defaults to EMBEDDING_BACKEND.
+        """
         self.model_name = model_name or settings.EMBEDDING_MODEL
-        self.device = device or get_device()
-        self.model = SentenceTransformer(self.model_name, device=self.device)
-        logger.info(f"Initialized local embedding provider with model: {self.model_name}, device: {self.device}")
+        self.backend = str(backend or settings.EMBEDDING_BACKEND).lower()
+        if self.backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unsupported embedding backend '{self.backend}', expected one of {EMBEDDING_BACKENDS}")
+        if self.backend == "torch":
+            # Deferred so that importing this module does not load torch
+            from sentence_transformers import SentenceTransformer
+
+            self.device = device or get_device()
+            self.model = SentenceTransformer(self.model_name, device=self.device)
+        else:
+            self.device = "cpu"
+            self.model = OnnxSentenceEncoder(self.model_name, quantize=self.backend == "onnx-int8")
+
+        if max_batch_size is None:
+            max_batch_size = settings.EMBEDDING_BATCH_MAX_SIZE
+        if max_wait_ms is None:
+            max_wait_ms = settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        self.batcher: Optional[MicroBatcher] = None
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._encode_texts, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="embedding-batcher"
+            )
+        logger.info(
+            f"Initialized local embedding provider with model: {self.model_name}, backend: {self.backend}, device: {self.device}, "
+            f"micro-batching: {f'{max_batch_size} texts / {max_wait_ms} ms' if self.batcher else 'off'}"
+        )
+    
+    def _encode_texts(self, texts: List[str]) -> List[List[float]]:
+        """Encode a list of texts in one forward pass (used by the micro-batcher)."""
+        return [embedding.tolist() for embedding in self.model.encode(texts)]
     
     def create_embedding(self, text: str) -> Optional[List[float]]:
         """Create an embedding for the given text."""
@@ -47,16 +180,19 @@ class LocalEmbeddingProvider:
                 logger.warning("Empty text provided for embedding")
                 return None
             
+            if self.batcher is not None:
+                return self.batcher(text)
+            
             embedding = self.model.encode(text)
             return embedding.tolist()
-        except torch.cuda.OutOfMemoryError as e:
-            logger.error(f"GPU out of memory creating embedding: {e}")
-            return None
         except (OSError, ImportError) as e:
             logger.error(f"Model loading error creating embedding: {e}")
             return None
         except Exception as e:
-            logger.error(f"Unexpected error creating embedding: {e}")
+            if is_cuda_oom(e):
+                logger.error(f"GPU out of memory creating embedding: {e}")
+            else:
+                logger.error(f"Unexpected error creating embedding: {e}")
             return None
     
     def create_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
@@ -84,14 +220,14 @@ class LocalEmbeddingProvider:
                 result[original_position] = embedding.tolist()
             
             return result
-        except torch.cuda.OutOfMemoryError as e:
-            logger.error(f"GPU out of memory creating batch embeddings: {e}")
-            return [None] * len(texts)
         except (OSError, ImportError) as e:
             logger.error(f"Model loading error creating batch embeddings: {e}")
             return [None] * len(texts)
         except Exception as e:
-            logger.error(f"Unexpected error creating batch embeddings: {e}")
+            if is_cuda_oom(e):
+                logger.error(f"GPU out of memory creating batch embeddings: {e}")
+            else:
+                logger.error(f"Unexpected error creating batch embeddings: {e}")
             return [None] * len(texts)
 
 
@@ -103,18 +239,35 @@ class APIEmbeddingProvider:
         api_base_url: str = "http://localhost:8000",
         api_key: Optional[str] = None,
         embedding_path: str = "/embedding",
+        bulk_path: Optional[str] = None,
+        bulk_format: Optional[str] = None,
+        bulk_max_texts: Optional[int] = None,
     ):
-        """Initialize the API embedding provider."""
+        """
+        Initialize the API embedding provider.
+
+        Batches go to the bulk endpoint at `bulk_path` (one request per
+        `bulk_max_texts` texts, binary `bulk_format` responses); an empty path
+        falls back to one `embedding_path` request per text.
+        """
         import requests
         
         self.api_base_url = api_base_url.rstrip('/')
         self.embedding_path = embedding_path if embedding_path.startswith('/') else f"/{embedding_path}"
+        if bulk_path is None:
+            bulk_path = str(getattr(settings, 'EMBEDDING_API_BULK_PATH', '/embeddings') or '')
+        self.bulk_path = (bulk_path if bulk_path.startswith('/') else f"/{bulk_path}") if bulk_path else None
+        self.bulk_format = bulk_format or getattr(settings, 'EMBEDDING_API_BULK_FORMAT', 'float32')
+        if self.bulk_format not in EMBEDDING_FORMATS:
+            raise ValueError(f"Unsupported bulk embedding format '{self.bulk_format}', expected one of {EMBEDDING_FORMATS}")
+        self.bulk_max_texts = bulk_max_texts or getattr(settings, 'EMBEDDING_API_BULK_MAX_TEXTS', 64)
         self.api_key = api_key or settings.API_KEY
         self.session = requests.Session()
         self.session.headers['X-API-Key'] = str(self.api_key or '')
         self.session.headers['Content-Type'] = 'application/json'
         logger.info(
-            f"Initialized API embedding provider with base URL: {self.api_base_url}, path: {self.embedding_path}"
+            f"Initialized API embedding provider with base URL: {self.api_base_url}, path: {self.embedding_path}, "
+            f"bulk path: {self.bulk_path or 'disabled'} ({self.bulk_format})"
         )
     
     def create_embedding(self, text: str) -> Optional[List[float]]:
@@ -162,12 +315,54 @@ class APIEmbeddingProvider:
             logger.error(f"Unexpected error creating embedding via API: {e}")
             return None
     
+    def _create_embeddings_bulk(self, texts: List[str]) -> Optional[List[Optional[List[float]]]]:
+        """
+        Embed a chunk of texts with one request to the bulk endpoint.
+        Returns None when the request failed, so the caller can fall back.
+        """
+        try:
+            url = f"{self.api_base_url}{self.bulk_path}"
+            payload = {"texts": texts, "format": self.bulk_format}
+            response = self.session.post(url, json=payload, timeout=60)
+            
+            if response.status_code == 404:
+                # Older API without the bulk endpoint; stop trying
+                logger.warning(f"Bulk embedding endpoint {url} not found, falling back to per-text requests")
+                self.bulk_path = None
+                return None
+            if response.status_code != 200:
+                logger.error(f"Bulk embedding request failed with status {response.status_code}: {response.text[:200]}")
+                return None
+            
+            if response.headers.get('Content-Type', '').startswith(EMBEDDINGS_MEDIA_TYPE):
+                embeddings = decode_embeddings(response.content)
+            else:
+                embeddings = response.json().get('embeddings')
+            if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+                logger.error("Bulk embedding API returned an unexpected number of embeddings")
+                return None
+            return embeddings
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request error creating bulk embeddings via API: {e}")
+            return None
+        except (KeyError, ValueError, json.JSONDecodeError) as e:
+            logger.error(f"Invalid response format from bulk embedding API: {e}")
+            return None
+    
     def create_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
-        """Create embeddings for multiple texts (sequential API calls)."""
-        embeddings = []
-        for text in texts:
-            embedding = self.create_embedding(text)
-            embeddings.append(embedding)
+        """Create embeddings for multiple texts via the bulk endpoint, or one API call per text."""
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        positions = [i for i, text in enumerate(texts) if text and text.strip()]
+        
+        for start in range(0, len(positions), self.bulk_max_texts):
+            chunk = positions[start:start + self.bulk_max_texts]
+            chunk_embeddings = None
+            if self.bulk_path:
+                chunk_embeddings = self._create_embeddings_bulk([texts[i] for i in chunk])
+            if chunk_embeddings is None:
+                chunk_embeddings = [self.create_embedding(texts[i]) for i in chunk]
+            for i, embedding in zip(chunk, chunk_embeddings):
+                embeddings[i] = embedding
         return embeddings
     
     async def create_embeddings_batch_async(self, texts: List[str]) -> List[Optional[List[float]]]:
@@ -236,28 +431,121 @@ class APIEmbeddingProvider:
             return self.create_embeddings_batch(texts)
 
 
+def encode_embedding(embedding: List[float]) -> bytes:
+    """Serialize an embedding as float32 bytes for the on-disk cache."""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def decode_embedding(data: bytes) -> List[float]:
+    """Inverse of `encode_embedding`."""
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+def create_embedding_cache() -> Optional[Cache]:
+    """Build the embedding cache configured via EMBEDDING_CACHE_* settings, if any."""
+    backend = str(getattr(settings, 'EMBEDDING_CACHE_BACKEND', 'memory')).lower()
+    ttl_seconds = getattr(settings, 'EMBEDDING_CACHE_TTL_SECONDS', None)
+    maxsize = getattr(settings, 'EMBEDDING_CACHE_SIZE', 1024)
+    if backend == 'memory':
+        return LRUCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+    if backend == 'sqlite':
+        return SQLiteCache(
+            path=getattr(settings, 'EMBEDDING_CACHE_PATH', '.cache/embeddings.sqlite3'),
+            maxsize=maxsize,
+            ttl_seconds=ttl_seconds,
+            dumps=encode_embedding,
+            loads=decode_embedding,
+        )
+    if backend not in ('none', ''):
+        logger.warning(f"Unknown EMBEDDING_CACHE_BACKEND '{backend}', embedding cache disabled")
+    return None
+
+
 class EmbeddingService:
     """Unified embedding service that can use different providers."""
     
-    def __init__(self, provider: Optional[EmbeddingProvider] = None):
-        """Initialize with a specific provider or create default local provider."""
+    def __init__(self, provider: Optional[EmbeddingProvider] = None, cache: Optional[Cache] = None):
+        """Initialize with a specific provider or create default local provider, optionally with a cache."""
         if provider is None:
             provider = LocalEmbeddingProvider()
         self.provider = provider
+        self.cache = cache
+        # Seconds spent constructing the provider (loading the model), set by get_embedding_service
+        self.load_seconds: Optional[float] = None
+        # Cache entries are only valid for the model that produced them
+        self.cache_namespace = (
+            getattr(provider, 'model_name', None)
+            or f"{getattr(provider, 'api_base_url', '')}{getattr(provider, 'embedding_path', '')}"
+            or type(provider).__name__
+        )
+    
+    def _cache_key(self, text: str) -> str:
+        """Cache key for a text: hash of the model namespace and the normalized text."""
+        normalized = normalize_query_text(text)
+        return hashlib.sha256(f"{self.cache_namespace}\0{normalized}".encode("utf-8")).hexdigest()
     
     def create_embedding(self, text: str) -> Optional[List[float]]:
-        """Create an embedding for the given text."""
-        return self.provider.create_embedding(text)
+        """Create an embedding for the given text, serving repeated texts from the cache."""
+        if self.cache is None or not text or not text.strip():
+            return self.provider.create_embedding(text)
+        
+        key = self._cache_key(text)
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = self.provider.create_embedding(text)
+        if embedding is not None:
+            self.cache.set(key, embedding)
+        return embedding
     
-    def create_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
-        """Create embeddings for multiple texts."""
-        return self.provider.create_embeddings_batch(texts)
+    def create_embeddings_batch(self, texts: List[str], cache_results: bool = False) -> List[Optional[List[float]]]:
+        """
+        Create embeddings for multiple texts; only cache misses reach the provider.
+
+        Batches are usually documents (ingestion, bulk /embeddings calls), so their
+        embeddings are not written back unless `cache_results` is set; otherwise
+        they would evict the repeated user queries the cache is for.
+        """
+        if self.cache is None:
+            return self.provider.create_embeddings_batch(texts)
+        
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        miss_positions = []
+        miss_texts = []
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self._cache_key(text)) if text and text.strip() else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                miss_positions.append(i)
+                miss_texts.append(text)
+        
+        if miss_texts:
+            for position, text, embedding in zip(miss_positions, miss_texts, self.provider.create_embeddings_batch(miss_texts)):
+                results[position] = embedding
+                if cache_results and embedding is not None:
+                    self.cache.set(self._cache_key(text), embedding)
+        return results
+    
+    def cache_stats(self) -> Optional[dict]:
+        """Hit/miss counters of the embedding cache, or None when caching is disabled."""
+        if self.cache is None:
+            return None
+        stats = self.cache.stats()
+        stats["namespace"] = self.cache_namespace
+        return stats
     
     @classmethod
-    def create_local(cls, model_name: Optional[str] = None, device: Optional[str] = None) -> 'EmbeddingService':
+    def create_local(
+        cls,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        cache: Optional[Cache] = None,
+    ) -> 'EmbeddingService':
         """Create service with local provider."""
         provider = LocalEmbeddingProvider(model_name, device)
-        return cls(provider)
+        return cls(provider, cache)
     
     @classmethod
     def create_api(
@@ -265,55 +553,73 @@ class EmbeddingService:
         api_base_url: str = "http://localhost:8000",
         api_key: Optional[str] = None,
         embedding_path: str = "/embedding",
+        cache: Optional[Cache] = None,
     ) -> 'EmbeddingService':
         """Create service with API provider."""
         provider = APIEmbeddingProvider(api_base_url, api_key, embedding_path)
-        return cls(provider)
+        return cls(provider, cache)
 
 
 # Global instance for backward compatibility
 _embedding_service = None
+_embedding_service_lock = threading.Lock()
 
-def get_embedding_service() -> EmbeddingService:
-    """Get the global embedding service instance, configured via settings."""
-    global _embedding_service
-    if _embedding_service is None:
-        provider = str(getattr(settings, 'EMBEDDING_PROVIDER', 'local')).lower()
-        if provider == 'api':
-            # Prevent accidental self-recursion when the API provider points back to this same API process
-            api_base_url = str(getattr(settings, 'EMBEDDING_API_BASE', 'http://localhost:8000'))
-            embedding_path = str(getattr(settings, 'EMBEDDING_API_EMBEDDING_PATH', '/embedding'))
-
-            is_localhost = (
-                'localhost:8000' in api_base_url
-                or '127.0.0.1:8000' in api_base_url
-                or '0.0.0.0:8000' in api_base_url
-            )
 
-            if is_localhost and embedding_path.rstrip('/') == '/embedding':
-                logger.warning(
-                    "EMBEDDING_PROVIDER=api is configured to call this same API (" 
-                    f"{api_base_url}{embedding_path}). Falling back to local provider to avoid recursion."
-                )
-                _embedding_service = EmbeddingService.create_local(
-                    model_name=getattr(settings, 'EMBEDDING_MODEL', None),
-                    device=getattr(settings, 'EMBEDDING_DEVICE', None),
-                )
-            else:
-                _embedding_service = EmbeddingService.create_api(
-                    api_base_url=api_base_url,
-                    api_key=getattr(settings, 'EMBEDDING_API_KEY', None),
-                    embedding_path=embedding_path,
-                )
-        else:
-            # Default to local
-            _embedding_service = EmbeddingService.create_local(
+def _create_embedding_service() -> EmbeddingService:
+    provider = str(getattr(settings, 'EMBEDDING_PROVIDER', 'local')).lower()
+    if provider == 'api':
+        # Prevent accidental self-recursion when the API provider points back to this same API process
+        api_base_url = str(getattr(settings, 'EMBEDDING_API_BASE', 'http://localhost:8000'))
+        embedding_path = str(getattr(settings, 'EMBEDDING_API_EMBEDDING_PATH', '/embedding'))
+
+        is_localhost = (
+            'localhost:8000' in api_base_url
+            or '127.0.0.1:8000' in api_base_url
+            or '0.0.0.0:8000' in api_base_url
+        )
+
+        if is_localhost and embedding_path.rstrip('/') == '/embedding':
+            logger.warning(
+                "EMBEDDING_PROVIDER=api is configured to call this same API (" 
+                f"{api_base_url}{embedding_path}). Falling back to local provider to avoid recursion."
+            )
+            return EmbeddingService.create_local(
                 model_name=getattr(settings, 'EMBEDDING_MODEL', None),
                 device=getattr(settings, 'EMBEDDING_DEVICE', None),
+                cache=create_embedding_cache(),
             )
+        else:
+            return EmbeddingService.create_api(
+                api_base_url=api_base_url,
+                api_key=getattr(settings, 'EMBEDDING_API_KEY', None),
+                embedding_path=embedding_path,
+                cache=create_embedding_cache(),
+            )
+    else:
+        # Default to local
+        return EmbeddingService.create_local(
+            model_name=getattr(settings, 'EMBEDDING_MODEL', None),
+            device=getattr(settings, 'EMBEDDING_DEVICE', None),
+            cache=create_embedding_cache(),
+        )
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Get the global embedding service instance, configured via settings."""
+    global _embedding_service
+    if _embedding_service is not None:
+        return _embedding_service
+    # Concurrent first callers wait for one model load instead of each starting their own
+    with _embedding_service_lock:
+        if _embedding_service is None:
+            started = time.perf_counter()
+            service = _create_embedding_service()
+            service.load_seconds = time.perf_counter() - started
+            _embedding_service = service
     return _embedding_service
 
 def set_embedding_service(service: EmbeddingService):
     """Set the global embedding service instance."""
     global _embedding_service
-    _embedding_service = service
+    with _embedding_service_lock:
+        _embedding_service = service
@@ -3,7 +3,8 @@ Centralized LiteLLM client for the project.
 Provides unified access to different models with consistent configuration.
 """
 
-import litellm
+import asyncio
+import threading
 import time
 import logging
 from typing import List, Dict, Optional, Any
@@ -15,6 +16,101 @@ from .db import SessionLocal
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def _litellm():
+    """Import litellm on first use; it takes seconds to import and most commands never call an LLM."""
+    import litellm
+    return litellm
+
+class AsyncRateLimiter:
+    """
+    Awaitable pacing of LLM calls to `rpm` requests per minute.
+
+    Each caller reserves the next free start slot and sleeps until it without
+    blocking the event loop; nothing waits after a call completes.
+    """
+
+    def __init__(self, rpm: int):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next_slot = 0.0
+        # Slot bookkeeping is shared with callers on other threads/event loops
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LLMStream:
+    """
+    Async iterator over the content deltas of a streaming `litellm.acompletion`.
+
+    Token usage and response metadata are filled in as chunks arrive and are
+    complete once iteration finishes.
+    """
+
+    def __init__(self, response: Any):
+        self._response = response
+        self.content = ""
+        self.tokens_sent = 0
+        self.tokens_received = 0
+        self.cache_hit = False
+        self.response_id: Optional[str] = None
+        self.response_model: Optional[str] = None
+
+    def _consume(self, chunk: Any) -> Optional[str]:
+        """Record metadata from a chunk and return its content delta, if any."""
+        self.response_id = self.response_id or getattr(chunk, 'id', None)
+        self.response_model = self.response_model or getattr(chunk, 'model', None)
+
+        usage = getattr(chunk, 'usage', None)
+        if usage:
+            self.tokens_sent = getattr(usage, 'prompt_tokens', 0) or 0
+            self.tokens_received = getattr(usage, 'completion_tokens', 0) or 0
+            details = getattr(usage, 'prompt_tokens_details', None)
+            if details and (getattr(details, 'cached_tokens', 0) or 0) > 0:
+                self.cache_hit = True
+        if getattr(chunk, 'cache_hit', False):
+            self.cache_hit = True
+
+        delta = None
+        try:
+            delta = chunk.choices[0].delta.content
+        except (AttributeError, IndexError, TypeError):
+            pass
+        if delta:
+            self.content += delta
+        return delta
+
+    async def __aiter__(self):
+        async for chunk in self._response:
+            delta = self._consume(chunk)
+            if delta:
+                yield delta
+
+    async def aclose(self) -> None:
+        """Stop reading from the underlying stream (e.g. after a guardrail trips)."""
+        aclose = getattr(self._response, 'aclose', None)
+        if callable(aclose):
+            try:
+                await aclose()
+            except Exception as e:
+                logger.debug(f"Error closing LLM stream: {e}")
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            'content': self.content,
+            'tokens_sent': self.tokens_sent,
+            'tokens_received': self.tokens_received,
+            'cache_hit': self.cache_hit,
+            'response_id': self.response_id,
+            'response_model': self.response_model,
+        }
+
 class LLMClient:
     """Centralized LiteLLM client for the project."""
     
@@ -24,6 +120,7 @@ class LLMClient:
         self.api_key = settings.LITELLM_API_KEY
         self.rpm_limit = settings.LITELLM_RPM
         self.delay = 60.0 / self.rpm_limit if self.rpm_limit > 0 else 0
+        self.async_rate_limiter = AsyncRateLimiter(self.rpm_limit)
         self.keyword_service = KeywordService()
         
         # Model configurations
@@ -69,25 +166,14 @@ class LLMClient:
         if inject_keywords:
             messages = self._inject_keywords_into_messages(messages)
         
+        kwargs = self._completion_kwargs(
+            actual_model, messages, temperature, response_format=response_format, max_tokens=max_tokens
+        )
         for attempt in range(1, max_retries + 1):
             try:
-                kwargs = {
-                    "model": f"litellm_proxy/{actual_model}",
-                    "messages": messages,
-                    "api_base": self.api_base,
-                    "api_key": self.api_key,
-                    "temperature": temperature,
-                }
-                
-                if response_format:
-                    kwargs["response_format"] = response_format
-                
-                if max_tokens:
-                    kwargs["max_tokens"] = max_tokens
-                
                 logger.debug(f"Calling LLM (attempt {attempt}/{max_retries}) with model {actual_model}")
                 
-                response = litellm.completion(**kwargs)
+                response = _litellm().completion(**kwargs)
                 
                 # Rate limiting
                 if self.delay > 0:
@@ -153,25 +239,14 @@ class LLMClient:
         if inject_keywords:
             messages = self._inject_keywords_into_messages(messages)
         
+        kwargs = self._completion_kwargs(
+            actual_model, messages, temperature, response_format=response_format, max_tokens=max_tokens
+        )
         for attempt in range(1, max_retries + 1):
             try:
-                kwargs = {
-                    "model": f"litellm_proxy/{actual_model}",
-                    "messages": messages,
-                    "api_base": self.api_base,
-                    "api_key": self.api_key,
-                    "temperature": temperature,
-                }
-                
-                if response_format:
-                    kwargs["response_format"] = response_format
-                
-                if max_tokens:
-                    kwargs["max_tokens"] = max_tokens
-                
                 logger.debug(f"Calling LLM (attempt {attempt}/{max_retries}) with model {actual_model}")
                 
-                response = litellm.completion(**kwargs)
+                response = _litellm().completion(**kwargs)
                 
                 # Log relevant properties for troubleshooting litellm call
                 logger.info(f"🔍 LiteLLM Response Type: {type(response)}")
@@ -184,88 +259,220 @@ class LLMClient:
                 if self.delay > 0:
                     time.sleep(self.delay)
                 
-                # Extract content
-                content = None
-                try:
-                    # Try standard OpenAI-style response structure
-                    content = getattr(getattr(getattr(response, 'choices', [{}])[0], 'message', {}), 'content', None)
-                except (AttributeError, IndexError, TypeError):
-                    pass
+                return self._response_metadata(response)
                 
-                # Fallback to string conversion if no content extracted
-                if not content:
-                    content = str(response)
+            except Exception as e:
+                logger.error(f"Error calling LLM (attempt {attempt}/{max_retries}): {e}")
+                if attempt == max_retries:
+                    logger.error(f"Failed to call LLM after {max_retries} attempts")
+                    return None
+                time.sleep(1)  # Brief delay before retry
+        
+        return None
+    
+    def _response_metadata(self, response: Any) -> Optional[Dict[str, Any]]:
+        """Extract content, token usage and cache hit status from a completion response."""
+        # Extract content
+        content = None
+        try:
+            # Try standard OpenAI-style response structure
+            content = getattr(getattr(getattr(response, 'choices', [{}])[0], 'message', {}), 'content', None)
+        except (AttributeError, IndexError, TypeError):
+            pass
+        
+        # Fallback to string conversion if no content extracted
+        if not content:
+            content = str(response)
+        
+        # Extract usage information
+        tokens_sent = 0
+        tokens_received = 0
+        cache_hit = False
+        
+        try:
+            usage = getattr(response, 'usage', None)
+            if usage:
+                tokens_sent = getattr(usage, 'prompt_tokens', 0)
+                tokens_received = getattr(usage, 'completion_tokens', 0)
                 
-                # Extract usage information
-                tokens_sent = 0
-                tokens_received = 0
-                cache_hit = False
+                # Debug: Log the response structure to understand LiteLLM proxy format
+                logger.debug(f"LLM Response structure - has cache_hit: {hasattr(response, 'cache_hit')}")
+                if hasattr(response, 'choices') and len(response.choices) > 0:
+                    choice = response.choices[0]
+                    logger.debug(f"First choice has cache_hit: {hasattr(choice, 'cache_hit')}")
                 
-                try:
-                    usage = getattr(response, 'usage', None)
-                    if usage:
-                        tokens_sent = getattr(usage, 'prompt_tokens', 0)
-                        tokens_received = getattr(usage, 'completion_tokens', 0)
-                        
-                        # Debug: Log the response structure to understand LiteLLM proxy format
-                        logger.debug(f"LLM Response structure - has cache_hit: {hasattr(response, 'cache_hit')}")
-                        if hasattr(response, 'choices') and len(response.choices) > 0:
-                            choice = response.choices[0]
-                            logger.debug(f"First choice has cache_hit: {hasattr(choice, 'cache_hit')}")
-                        
-                        # Extract cache hit information directly from LiteLLM proxy response
-                        # LiteLLM proxy includes cache hit information in the response
-                        # Check if the response has cache hit information
-                        if hasattr(response, 'cache_hit'):
-                            cache_hit = getattr(response, 'cache_hit', False)
-                            logger.debug(f"Cache hit from response.cache_hit: {cache_hit}")
-                        elif hasattr(response, 'choices') and len(response.choices) > 0:
-                            # Check if cache hit info is in the first choice
-                            choice = response.choices[0]
-                            if hasattr(choice, 'cache_hit'):
-                                cache_hit = getattr(choice, 'cache_hit', False)
-                                logger.debug(f"Cache hit from choice.cache_hit: {cache_hit}")
-                        
-                        # If no explicit cache hit info, check for cached tokens in usage details
-                        if not cache_hit and hasattr(usage, 'prompt_tokens_details'):
-                            prompt_tokens_details = getattr(usage, 'prompt_tokens_details', None)
-                            if prompt_tokens_details and hasattr(prompt_tokens_details, 'cached_tokens'):
-                                cached_tokens = getattr(prompt_tokens_details, 'cached_tokens', 0)
-                                cache_hit = cached_tokens > 0
-                                logger.debug(f"Cache hit from cached_tokens: {cache_hit} (cached_tokens: {cached_tokens})")
-                        
-                        logger.debug(f"Token usage - Sent: {tokens_sent}, Received: {tokens_received}, Cache hit: {cache_hit}")
-                except (AttributeError, TypeError):
-                    logger.warning("Could not extract token usage from response")
+                # Extract cache hit information directly from LiteLLM proxy response
+                # LiteLLM proxy includes cache hit information in the response
+                # Check if the response has cache hit information
+                if hasattr(response, 'cache_hit'):
+                    cache_hit = getattr(response, 'cache_hit', False)
+                    logger.debug(f"Cache hit from response.cache_hit: {cache_hit}")
+                elif hasattr(response, 'choices') and len(response.choices) > 0:
+                    # Check if cache hit info is in the first choice
+                    choice = response.choices[0]
+                    if hasattr(choice, 'cache_hit'):
+                        cache_hit = getattr(choice, 'cache_hit', False)
+                        logger.debug(f"Cache hit from choice.cache_hit: {cache_hit}")
                 
-                if content:
-                    logger.debug(f"LLM response received (length: {len(content)})")
-                    
-                    # Capture relevant metadata from the response
-                    response_metadata = {
-                        'content': content,
-                        'tokens_sent': tokens_sent,
-                        'tokens_received': tokens_received,
-                        'cache_hit': cache_hit,
-                        'response_id': getattr(response, 'id', None),
-                        'response_model': getattr(response, 'model', None),
-                        'response_type': str(type(response))
-                    }
-                    
-                    return response_metadata
-                else:
-                    logger.warning("LLM returned empty content")
-                    return None
+                # If no explicit cache hit info, check for cached tokens in usage details
+                if not cache_hit and hasattr(usage, 'prompt_tokens_details'):
+                    prompt_tokens_details = getattr(usage, 'prompt_tokens_details', None)
+                    if prompt_tokens_details and hasattr(prompt_tokens_details, 'cached_tokens'):
+                        cached_tokens = getattr(prompt_tokens_details, 'cached_tokens', 0)
+                        cache_hit = cached_tokens > 0
+                        logger.debug(f"Cache hit from cached_tokens: {cache_hit} (cached_tokens: {cached_tokens})")
                 
+                logger.debug(f"Token usage - Sent: {tokens_sent}, Received: {tokens_received}, Cache hit: {cache_hit}")
+        except (AttributeError, TypeError):
+            logger.warning("Could not extract token usage from response")
+        
+        if content:
+            logger.debug(f"LLM response received (length: {len(content)})")
+            
+            # Capture relevant metadata from the response
+            response_metadata = {
+                'content': content,
+                'tokens_sent': tokens_sent,
+                'tokens_received': tokens_received,
+                'cache_hit': cache_hit,
+                'response_id': getattr(response, 'id', None),
+                'response_model': getattr(response, 'model', None),
+                'response_type': str(type(response))
+            }
+            
+            return response_metadata
+        else:
+            logger.warning("LLM returned empty content")
+            return None
+
+    async def acall_llm(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "openai-fast",
+        max_retries: int = 3,
+        response_format: Optional[Dict] = None,
+        temperature: float = 0.1,
+        max_tokens: Optional[int] = None,
+        inject_keywords: bool = True
+    ) -> Optional[str]:
+        """Async counterpart of `call_llm`; see `acall_llm_with_usage`."""
+        response = await self.acall_llm_with_usage(
+            messages, model=model, max_retries=max_retries, response_format=response_format,
+            temperature=temperature, max_tokens=max_tokens, inject_keywords=inject_keywords
+        )
+        return response['content'] if response else None
+
+    async def acall_llm_with_usage(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "openai-fast",
+        max_retries: int = 3,
+        response_format: Optional[Dict] = None,
+        temperature: float = 0.1,
+        max_tokens: Optional[int] = None,
+        inject_keywords: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Async counterpart of `call_llm_with_usage` built on `litellm.acompletion`.
+
+        Rate limiting awaits a start slot from `async_rate_limiter` instead of
+        sleeping after the call, and the keyword lookup runs in a worker thread,
+        so nothing here blocks the event loop.
+
+        Returns:
+            Dictionary with 'content', 'tokens_sent', and 'tokens_received' or None if failed
+        """
+        actual_model = self.models.get(model, model)
+
+        if inject_keywords:
+            messages = await asyncio.to_thread(self._inject_keywords_into_messages, messages)
+
+        kwargs = self._completion_kwargs(
+            actual_model, messages, temperature, response_format=response_format, max_tokens=max_tokens
+        )
+        for attempt in range(1, max_retries + 1):
+            try:
+                await self.async_rate_limiter.acquire()
+                logger.debug(f"Calling LLM async (attempt {attempt}/{max_retries}) with model {actual_model}")
+                response = await _litellm().acompletion(**kwargs)
+                logger.info(
+                    f"🔍 LiteLLM Response ID: {getattr(response, 'id', 'No ID')} | "
+                    f"Model: {getattr(response, 'model', 'No model info')} | "
+                    f"Usage: {getattr(response, 'usage', 'No usage info')}"
+                )
+                return self._response_metadata(response)
             except Exception as e:
                 logger.error(f"Error calling LLM (attempt {attempt}/{max_retries}): {e}")
                 if attempt == max_retries:
                     logger.error(f"Failed to call LLM after {max_retries} attempts")
                     return None
-                time.sleep(1)  # Brief delay before retry
-        
+                await asyncio.sleep(1)  # Brief delay before retry
+
         return None
-    
+
+    async def astream_llm_with_usage(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "openai-fast",
+        max_retries: int = 3,
+        temperature: float = 0.1,
+        max_tokens: Optional[int] = None,
+        inject_keywords: bool = True
+    ) -> LLMStream:
+        """
+        Open a streaming completion and return an LLMStream to iterate with `async for`.
+
+        Retries only cover opening the stream; once tokens are flowing, errors
+        propagate to the caller. Usage information is available on the returned
+        LLMStream after it has been exhausted.
+
+        Raises:
+            Exception: The last error if the stream could not be opened
+        """
+        actual_model = self.models.get(model, model)
+
+        if inject_keywords:
+            messages = await asyncio.to_thread(self._inject_keywords_into_messages, messages)
+
+        kwargs = self._completion_kwargs(actual_model, messages, temperature, max_tokens=max_tokens, stream=True)
+        for attempt in range(1, max_retries + 1):
+            try:
+                await self.async_rate_limiter.acquire()
+                logger.debug(f"Opening async LLM stream (attempt {attempt}/{max_retries}) with model {actual_model}")
+                return LLMStream(await _litellm().acompletion(**kwargs))
+            except Exception as e:
+                logger.error(f"Error opening LLM stream (attempt {attempt}/{max_retries}): {e}")
+                if attempt == max_retries:
+                    raise
+                await asyncio.sleep(1)
+
+    def _completion_kwargs(
+        self,
+        actual_model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        response_format: Optional[Dict] = None,
+        max_tokens: Optional[int] = None,
+        stream: bool = False
+    ) -> Dict[str, Any]:
+        """Arguments for litellm.completion/acompletion against the proxy."""
+        kwargs = {
+            "model": f"litellm_proxy/{actual_model}",
+            "messages": messages,
+            "api_base": self.api_base,
+            "api_key": self.api_key,
+            "temperature": temperature,
+        }
+        if response_format:
+            kwargs["response_format"] = response_format
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if stream:
+            kwargs["stream"] = True
+            # Ask for a final chunk carrying prompt/completion token counts
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
     def _inject_keywords_into_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """
         Inject relevant keyword definitions into user messages for context.
@@ -1,12 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey, Float, Boolean
-from sqlalchemy.orm import relationship
-from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey, Float, Boolean, Computed
+from sqlalchemy.orm import deferred, relationship
+from pgvector.sqlalchemy import HALFVEC, Vector
 from .db import Base
-from .settings import EMBEDDING_DIM
+from .settings import EMBEDDING_DIM, VECTOR_STORAGE
+from .rerank_text import rerank_text_expression
+from .source_urls import url_expression
 import datetime
 import enum
 import uuid
 
+
+def embedding_type(dim: int = EMBEDDING_DIM):
+    """Column type for embeddings, per VECTOR_STORAGE ('vector' or 'halfvec')."""
+    if VECTOR_STORAGE == "halfvec":
+        return HALFVEC(dim)
+    if VECTOR_STORAGE != "vector":
+        raise ValueError(f"Unsupported VECTOR_STORAGE '{VECTOR_STORAGE}', expected 'vector' or 'halfvec'")
+    return Vector(dim)
+
 class SourceType(enum.Enum):
     """Enum for different source types that can have questions."""
     METABASE_DOC = "metabase_doc"
@@ -24,7 +35,7 @@ class KeywordDefinition(Base):
     definition = Column(Text, nullable=False)
     category = Column(String, nullable=True)  # Optional category for organization
     is_active = Column(Boolean, default=True)
-    keyword_embedding = Column(Vector(768), nullable=True)  # 768-dimensional embedding for keyword + definition + synonyms
+    keyword_embedding = Column(embedding_type(), nullable=True)  # 768-dimensional embedding for keyword + definition + synonyms
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -37,8 +48,8 @@ class Synonym(Base):
     id = Column(Integer, primary_key=True, index=True)
     word = Column(String, nullable=False, index=True)
     synonym_of = Column(String, nullable=False, index=True)
-    word_embedding = Column(Vector(768), nullable=True)  # 768-dimensional embedding for the word
-    synonym_embedding = Column(Vector(768), nullable=True)  # 768-dimensional embedding for the synonym relationship
+    word_embedding = Column(embedding_type(), nullable=True)  # 768-dimensional embedding for the word
+    synonym_embedding = Column(embedding_type(), nullable=True)  # 768-dimensional embedding for the synonym relationship
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -64,11 +75,13 @@ class Issue(Base):
     stack_trace_file = Column(String, nullable=True)
     fixed_in_version = Column(String, nullable=True)
     token_count = Column(Integer, nullable=True)  # Token count for body field
+    rerank_text = deferred(Column(Text, Computed(rerank_text_expression('issues'), persisted=True)))  # Truncated cross-encoder input
+    url = deferred(Column(Text, Computed(url_expression('issues'), persisted=True)))  # Canonical GitHub URL
 
     # Vector columns for embeddings
-    title_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding for title
-    issue_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding for body
-    summary_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding for LLM summary
+    title_embedding = Column(embedding_type(), nullable=True)  # Embedding for title
+    issue_embedding = Column(embedding_type(), nullable=True)  # Embedding for body
+    summary_embedding = Column(embedding_type(), nullable=True)  # Embedding for LLM summary
     
     # Note: Questions are linked via source_id + source_type, not a foreign key relationship
 
@@ -90,11 +103,13 @@ class DiscoursePost(Base):
     version = Column(String, nullable=True)  # Version mentioned in conversation
     reference = Column(String, nullable=True)  # URL reference mentioned in conversation
     token_count = Column(Integer, nullable=True)  # Token count for conversation field
+    rerank_text = deferred(Column(Text, Computed(rerank_text_expression('discourse_posts'), persisted=True)))  # Truncated cross-encoder input
+    url = deferred(Column(Text, Computed(url_expression('discourse_posts'), persisted=True)))  # Canonical topic URL
     
     # Vector columns for embeddings (same dimensions as issues)
-    conversation_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)
-    summary_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding of LLM summary
-    solution_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding of solution
+    conversation_embedding = Column(embedding_type(), nullable=True)
+    summary_embedding = Column(embedding_type(), nullable=True)  # Embedding of LLM summary
+    solution_embedding = Column(embedding_type(), nullable=True)  # Embedding of solution
     
     # Note: Questions are linked via source_id + source_type, not a foreign key relationship
 
@@ -109,8 +124,9 @@ class MetabaseDoc(Base):
     markdown = Column(Text, nullable=False)  # Using Text for large markdown content
     llm_summary = Column(Text, nullable=True)  # LLM-generated summary
     token_count = Column(Integer, nullable=True)  # Token count for markdown field
-    markdown_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding of markdown content
-    summary_embedding = Column(Vector(EMBEDDING_DIM), nullable=True)  # Embedding of LLM summary
+    rerank_text = deferred(Column(Text, Computed(rerank_text_expression('metabase_docs'), persisted=True)))  # Truncated cross-encoder input
+    markdown_embedding = Column(embedding_type(), nullable=True)  # Embedding of markdown content
+    summary_embedding = Column(embedding_type(), nullable=True)  # Embedding of LLM summary
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
@@ -127,8 +143,10 @@ class Question(Base):
     source_id = Column(Integer, nullable=False, index=True)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    question_embedding = Column(Vector(768), nullable=True)  # 768-dimensional embedding for question
-    answer_embedding = Column(Vector(768), nullable=True)    # 768-dimensional embedding for answer
+    rerank_text = deferred(Column(Text, Computed(rerank_text_expression('questions'), persisted=True)))  # Truncated cross-encoder input
+    source_url = deferred(Column(Text, nullable=True))  # URL of the source row, maintained by triggers (src/source_urls.py)
+    question_embedding = Column(embedding_type(), nullable=True)  # 768-dimensional embedding for question
+    answer_embedding = Column(embedding_type(), nullable=True)    # 768-dimensional embedding for answer
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
@@ -147,6 +165,18 @@ class Question(Base):
             return db_session.query(DiscoursePost).filter(DiscoursePost.id == self.source_id).first()
         return None
 
+class SearchVector(Base):
+    """
+    One embedding of a searchable entity, copied from the content tables so a single
+    HNSW index covers every source. Kept in sync by triggers (see `src.search_vectors`).
+    """
+    __tablename__ = 'search_vectors'
+
+    entity_type = Column(String, primary_key=True)  # Source table, e.g. 'issues'
+    entity_id = Column(Integer, primary_key=True)  # Row id in that table
+    vector_kind = Column(String, primary_key=True)  # Source column, e.g. 'summary_embedding'
+    embedding = Column(embedding_type(), nullable=False)
+
 class ApiKey(Base):
     """
     SQLAlchemy model for an API key.
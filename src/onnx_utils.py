@@ -0,0 +1,176 @@
+"""
+ONNX Runtime helpers for running Hugging Face encoders on CPU.
+
+Models are exported once with `torch.onnx.export`, optionally quantized to
+int8 with dynamic quantization, and cached under ONNX_CACHE_DIR. Inference
+goes through `run_with_io_binding`, which binds the numpy inputs and the output
+buffer directly so ORT does not copy them per call.
+
+onnxruntime is an optional dependency (`uv sync --extra onnx`). It is only
+imported when a session is created or a model quantized, so importing this
+module (and the embedding/reranker modules that use it) stays cheap.
+"""
+
+import gc
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+def require_onnxruntime():
+    """Import and return the onnxruntime module, or raise a helpful error when it is missing."""
+    try:
+        import onnxruntime
+    except ImportError:  # pragma: no cover - optional dependency
+        raise RuntimeError("onnxruntime is not installed; install the 'onnx' extra (uv sync --extra onnx)") from None
+    return onnxruntime
+
+
+def onnx_model_dir(model_name: str) -> str:
+    """Cache directory holding the exported files for a model."""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+    return os.path.join(settings.ONNX_CACHE_DIR, safe_name)
+
+
+def export_to_onnx(
+    model,
+    tokenizer,
+    output_path: str,
+    output_names: List[str],
+    opset: int = 17,
+    output_axes: Optional[Dict[str, Dict[int, str]]] = None,
+) -> str:
+    """
+    Export a PyTorch Hugging Face model with dynamic batch and sequence axes.
+
+    Args:
+        model: A transformers model in eval mode
+        tokenizer: Its tokenizer, used to build a sample input
+        output_path: Where to write the .onnx file
+        output_names: Names to give the model outputs (e.g. ["logits"])
+        opset: ONNX opset version
+        output_axes: Dynamic axes per output; defaults to a dynamic batch axis only
+
+    Returns:
+        output_path
+    """
+    import torch
+
+    sample = tokenizer(["query", "a longer sample document"], ["document", "text"], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    for name in output_names:
+        dynamic_axes[name] = (output_axes or {}).get(name, {0: "batch"})
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write next to the target and rename, so concurrent workers never load a partial file
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    os.replace(tmp_path, output_path)
+    logger.info(f"Exported ONNX model to {output_path}")
+    return output_path
+
+
+def quantize_int8(input_path: str, output_path: str) -> str:
+    """Dynamic int8 weight quantization; activations are quantized on the fly at runtime."""
+    require_onnxruntime()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    quantize_dynamic(input_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, output_path)
+    logger.info(f"Quantized {input_path} -> {output_path} (int8)")
+    return output_path
+
+
+def ensure_onnx_model(
+    model_name: str,
+    load_model: Callable[[], object],
+    tokenizer,
+    output_names: List[str],
+    quantize: bool,
+    output_axes: Optional[Dict[str, Dict[int, str]]] = None,
+) -> str:
+    """
+    Path of the cached (and optionally int8) export of a model, creating it on first use.
+
+    `load_model` is only called when the fp32 export is missing, so later starts
+    never load the PyTorch weights.
+    """
+    directory = onnx_model_dir(model_name)
+    fp32_path = os.path.join(directory, "model.onnx")
+    if not os.path.exists(fp32_path):
+        logger.info(f"Exporting {model_name} to ONNX (first run only)...")
+        model = load_model()
+        export_to_onnx(model, tokenizer, fp32_path, output_names, output_axes=output_axes)
+        del model
+        gc.collect()
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(directory, "model.int8.onnx")
+    if not os.path.exists(int8_path):
+        quantize_int8(fp32_path, int8_path)
+    return int8_path
+
+
+def create_session(
+    model_path: str,
+    intra_op_threads: Optional[int] = None,
+    inter_op_threads: Optional[int] = None,
+):
+    """
+    CPU inference session with full graph optimization and explicit thread counts.
+
+    A thread count of 0 lets onnxruntime pick (one per physical core). Set
+    ONNX_INTRA_OP_THREADS lower when several workers share a node.
+    """
+    ort_module = require_onnxruntime()
+    options = ort_module.SessionOptions()
+    options.graph_optimization_level = ort_module.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort_module.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    options.inter_op_num_threads = settings.ONNX_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    session = ort_module.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    logger.info(
+        f"Loaded ONNX session {model_path} "
+        f"(intra-op threads: {options.intra_op_num_threads or 'auto'}, inter-op threads: {options.inter_op_num_threads or 'auto'})"
+    )
+    return session
+
+
+def session_inputs(session, encoded: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Keep only the tokenizer outputs the graph expects, as contiguous int64 arrays."""
+    return {
+        node.name: np.ascontiguousarray(encoded[node.name], dtype=np.int64)
+        for node in session.get_inputs()
+        if node.name in encoded
+    }
+
+
+def run_with_io_binding(session, inputs: Dict[str, np.ndarray], output_name: str) -> np.ndarray:
+    """Run one batch with IO binding and return the named output."""
+    binding = session.io_binding()
+    for name, value in inputs.items():
+        binding.bind_cpu_input(name, value)
+    binding.bind_output(output_name)
+    session.run_with_iobinding(binding)
+    return binding.copy_outputs_to_cpu()[0]
@@ -0,0 +1,147 @@
+"""
+Rate-limit storage shared by every API worker process on a host.
+
+slowapi keeps its counters in process memory by default, so N uvicorn workers
+enforce N x the configured limit. `SQLiteStorage` registers the `sqlite://`
+scheme with the `limits` package and keeps fixed-window counters in a local
+WAL-mode SQLite file. Every worker (and the preforked children of
+`run.py api start --workers`) then shares one set of counters, with no extra
+service to run. Point RATE_LIMIT_STORAGE_URI at `memory://` to go back to
+per-process counters, or at `redis://...` to share them across hosts.
+
+`rate_limit_key` buckets requests per API key, falling back to the client
+address for unauthenticated routes. Limits are checked after the endpoint's
+dependencies, so invalid keys are rejected before they get a bucket.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from limits.storage import Storage
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+# Expired windows are deleted after this many increments per process
+_PURGE_EVERY = 1000
+
+
+class SQLiteStorage(Storage):
+    """
+    Fixed-window counters in a SQLite file, safe across processes and threads.
+
+    URI: `sqlite:///relative/path.db` or `sqlite:////absolute/path.db`.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, **options):
+        # Everything after "sqlite:///", so a fourth slash makes the path absolute
+        self.path = uri.split("://", 1)[-1][1:]
+        if not self.path:
+            raise ValueError(f"No database path in rate-limit storage URI {uri!r}")
+        self.busy_timeout_ms = int(options.pop("busy_timeout_ms", 5000))
+        super().__init__(uri, **options)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._increments = 0
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expiry REAL NOT NULL)"
+            )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; slowapi checks limits from the event loop and the
+        # threadpool, and SQLite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            # Counters are advisory; losing the last writes on power loss is fine
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so the read below sees our own update
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO rate_limits (key, count, expiry) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                " count = CASE WHEN expiry <= ? THEN excluded.count ELSE count + excluded.count END,"
+                " expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END",
+                (key, amount, now + expiry, now, now),
+            )
+            count = conn.execute("SELECT count FROM rate_limits WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._increments += 1
+        if self._increments % _PURGE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expiry <= ?", (now,))
+        return count
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expiry FROM rate_limits WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+def rate_limit_key(request: Request) -> str:
+    """Bucket per API key (hashed) when RATE_LIMIT_BY_API_KEY is on and a key was sent, else per client address."""
+    api_key = request.headers.get("X-API-Key") if settings.RATE_LIMIT_BY_API_KEY else None
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    return "ip:" + get_remote_address(request)
+
+
+def create_limiter() -> Limiter:
+    """The API's limiter, on RATE_LIMIT_STORAGE_URI."""
+    logger.info(f"Rate limits stored in {settings.RATE_LIMIT_STORAGE_URI}")
+    return Limiter(
+        key_func=rate_limit_key,
+        storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+        enabled=settings.RATE_LIMIT_ENABLED,
+    )
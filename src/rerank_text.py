@@ -0,0 +1,87 @@
+"""
+Pre-formatted, length-bounded cross-encoder input for each searchable entity.
+
+Every content table has a `rerank_text` column that Postgres generates from the
+row's own fields, laid out like `reranker_client.extract_document_content` and
+cut to RERANK_TEXT_MAX_CHARS. Postgres recomputes it on every insert and update,
+so no writer has to remember to fill it. The v2 candidate queries read this
+bounded field instead of full bodies that the cross-encoder would truncate at
+its token window anyway.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from .db import engine
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+RERANK_TEXT_COLUMN = "rerank_text"
+
+# Same layouts as extract_document_content; generated columns only accept immutable
+# expressions, hence `||` rather than CONCAT()
+RERANK_TEXT_FORMATS = {
+    "issues": "'Title: ' || title || E'\\nBody: ' || COALESCE(body, '')",
+    "discourse_posts": "'Title: ' || title || E'\\nConversation: ' || conversation",
+    "metabase_docs": "markdown",
+    "questions": "'Question: ' || question || E'\\nAnswer: ' || answer",
+}
+
+
+def rerank_text_expression(table: str, max_chars: Optional[int] = None) -> str:
+    """SQL expression that produces the rerank text of a row in `table`."""
+    if table not in RERANK_TEXT_FORMATS:
+        raise ValueError(f"No rerank text format for table '{table}'")
+    limit = int(max_chars or settings.RERANK_TEXT_MAX_CHARS)
+    return f"LEFT({RERANK_TEXT_FORMATS[table]}, {limit})"
+
+
+def _selected_tables(tables: Optional[Iterable[str]]) -> List[str]:
+    selected = list(tables) if tables else list(RERANK_TEXT_FORMATS)
+    unknown = set(selected) - set(RERANK_TEXT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown table(s) for rerank text: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def install_rerank_text_columns(tables: Optional[Iterable[str]] = None, max_chars: Optional[int] = None) -> List[str]:
+    """
+    (Re)create the generated `rerank_text` column, e.g. on a database created before
+    it existed or after changing RERANK_TEXT_MAX_CHARS.
+
+    Postgres fills the column for every existing row, rewriting the table under an
+    ACCESS EXCLUSIVE lock, so run it outside peak traffic.
+    """
+    installed = []
+    for table in _selected_tables(tables):
+        expression = rerank_text_expression(table, max_chars)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table} "
+                f"DROP COLUMN IF EXISTS {RERANK_TEXT_COLUMN}, "
+                f"ADD COLUMN {RERANK_TEXT_COLUMN} TEXT GENERATED ALWAYS AS ({expression}) STORED"
+            )
+        logger.info(f"Installed {table}.{RERANK_TEXT_COLUMN}")
+        installed.append(table)
+    return installed
+
+
+def get_rerank_text_status(tables: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Whether each table has the generated column, and the expression Postgres uses for it."""
+    status = []
+    with engine.connect() as conn:
+        for table in _selected_tables(tables):
+            row = conn.execute(text(
+                "SELECT is_generated, generation_expression FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+            ), {"table": table, "column": RERANK_TEXT_COLUMN}).first()
+            status.append({
+                "table": table,
+                "exists": row is not None,
+                "generated": row is not None and row.is_generated == "ALWAYS",
+                "expression": row.generation_expression if row is not None else None,
+            })
+    return status
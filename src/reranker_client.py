@@ -1,13 +1,53 @@
-import torch
 import gc
 import logging
 from typing import List, Dict, Any, Optional, Tuple
-from sentence_transformers import CrossEncoder
+import numpy as np
 from . import settings
 from .utils import get_device
+from .onnx_utils import create_session, ensure_onnx_model, run_with_io_binding, session_inputs
 
 logger = logging.getLogger(__name__)
 
+def extract_document_content(candidate: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract the text a candidate is scored on, based on its type.
+
+    Shared by every reranker backend and by the score cache, which hashes it
+    to notice when an entity's text changes.
+    
+    Args:
+        candidate: The candidate document
+        
+    Returns:
+        Extracted content string or None
+    """
+    # Precomputed by Postgres for rows coming from the content tables
+    if candidate.get('rerank_text'):
+        return candidate['rerank_text']
+    # Handle different types of candidates
+    if 'title' in candidate and 'body' in candidate:
+        # GitHub issue
+        return f"Title: {candidate['title']}\nBody: {candidate.get('body', '')}"
+    elif 'title' in candidate and 'conversation' in candidate:
+        # Discourse post
+        return f"Title: {candidate['title']}\nConversation: {candidate['conversation']}"
+    elif 'markdown' in candidate:
+        # Metabase doc
+        return candidate['markdown']
+    elif 'question' in candidate and 'answer' in candidate:
+        # Q&A
+        return f"Question: {candidate['question']}\nAnswer: {candidate['answer']}"
+    elif 'keyword' in candidate and 'definition' in candidate:
+        # Keyword definition
+        return f"Keyword: {candidate['keyword']}\nDefinition: {candidate['definition']}"
+    else:
+        # Fallback: try to find any text content
+        for key in ['title', 'body', 'content', 'text', 'description']:
+            if key in candidate and candidate[key]:
+                return str(candidate[key])
+    
+    return None
+
 class RerankerClient:
     """Client for the cross-encoder/ms-marco-MiniLM-L6-v2 model to rerank search results."""
     
@@ -34,6 +74,8 @@ class RerankerClient:
     def _check_device_availability(self):
         """Check device availability and warn about performance implications."""
         if self.device == "cuda":
+            import torch
+
             if not torch.cuda.is_available():
                 logger.warning("⚠️ CUDA requested but not available. Falling back to CPU (will be slower)")
                 self.device = "cpu"
@@ -50,7 +92,9 @@ class RerankerClient:
         """Load the reranker model."""
         try:
             logger.info(f"Loading reranker model: {self.model_name}")
-            
+            # Deferred so that importing this module does not load torch
+            from sentence_transformers import CrossEncoder
+
             # Load the CrossEncoder model
             self.model = CrossEncoder(
                 self.model_name,
@@ -65,6 +109,8 @@ class RerankerClient:
     
     def _optimize_memory(self):
         """Optimize memory usage."""
+        import torch
+
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         import gc
@@ -93,7 +139,7 @@ class RerankerClient:
             pairs = []
             for candidate in candidates:
                 # Extract document content based on candidate type
-                doc_content = self._extract_document_content(candidate)
+                doc_content = extract_document_content(candidate)
                 if doc_content:
                     # CrossEncoder expects (query, document) pairs
                     pairs.append((query, doc_content))
@@ -107,7 +153,7 @@ class RerankerClient:
             
             # Get scores from the cross-encoder
             if self.model is not None:
-                scores = self.model.predict(pairs, show_progress_bar=False)
+                scores = self._predict(pairs)
             else:
                 logger.error("Model is not loaded, returning original candidates")
                 return candidates
@@ -129,40 +175,26 @@ class RerankerClient:
             # Return original candidates if reranking fails
             return candidates
     
-    def _extract_document_content(self, candidate: Dict[str, Any]) -> Optional[str]:
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
         """
-        Extract document content from a candidate based on its type.
-        
-        Args:
-            candidate: The candidate document
-            
-        Returns:
-            Extracted content string or None
+        Score (query, document) pairs in length-sorted batches.
+
+        Each batch is padded to its longest pair, so grouping pairs of similar
+        length keeps short documents from paying for long ones. Scores are
+        returned in the original pair order.
         """
-        # Handle different types of candidates
-        if 'title' in candidate and 'body' in candidate:
-            # GitHub issue
-            return f"Title: {candidate['title']}\nBody: {candidate.get('body', '')}"
-        elif 'title' in candidate and 'conversation' in candidate:
-            # Discourse post
-            return f"Title: {candidate['title']}\nConversation: {candidate['conversation']}"
-        elif 'markdown' in candidate:
-            # Metabase doc
-            return candidate['markdown']
-        elif 'question' in candidate and 'answer' in candidate:
-            # Q&A
-            return f"Question: {candidate['question']}\nAnswer: {candidate['answer']}"
-        elif 'keyword' in candidate and 'definition' in candidate:
-            # Keyword definition
-            return f"Keyword: {candidate['keyword']}\nDefinition: {candidate['definition']}"
-        else:
-            # Fallback: try to find any text content
-            for key in ['title', 'body', 'content', 'text', 'description']:
-                if key in candidate and candidate[key]:
-                    return str(candidate[key])
-        
-        return None
-    
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        sorted_scores = self.model.predict(
+            [pairs[i] for i in order],
+            batch_size=settings.RERANKER_BATCH_SIZE,
+            show_progress_bar=False
+        )
+
+        scores = [0.0] * len(pairs)
+        for position, pair_index in enumerate(order):
+            scores[pair_index] = float(sorted_scores[position])
+        return scores
+
     def rerank_similar_issues(
         self, 
         query: str, 
@@ -207,4 +239,96 @@ class RerankerClient:
             }
             reranked_issues.append(issue)
         
-        return reranked_issues 
\ No newline at end of file
+        return reranked_issues 
+
+
+def _uses_sigmoid(config: Any) -> bool:
+    """
+    Whether CrossEncoder.predict would apply a sigmoid to this model's logits.
+    Mirrors sentence-transformers: an activation stored in the model config wins,
+    otherwise single-label models get a sigmoid.
+    """
+    st_config = getattr(config, 'sentence_transformers', None)
+    activation = st_config.get('activation_fn') if isinstance(st_config, dict) else None
+    activation = activation or getattr(config, 'sbert_ce_default_activation_function', None)
+    if activation:
+        return str(activation).endswith('Sigmoid')
+    return getattr(config, 'num_labels', 1) == 1
+
+
+class OnnxRerankerClient(RerankerClient):
+    """
+    RerankerClient running an ONNX Runtime export of the cross-encoder, for CPU-only nodes.
+
+    The model is exported on first use (and with `quantize`, converted to dynamic
+    int8) into ONNX_CACHE_DIR; later starts load the cached file directly.
+    Scores match the CrossEncoder path, including its output activation.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L6-v2",
+        quantize: Optional[bool] = None,
+        intra_op_threads: Optional[int] = None
+    ):
+        self.quantize = settings.RERANKER_ONNX_QUANTIZE if quantize is None else quantize
+        self.intra_op_threads = intra_op_threads
+        super().__init__(model_name=model_name, device="cpu")
+
+    def _check_device_availability(self):
+        """ONNX Runtime runs on the CPU execution provider only."""
+        self.device = "cpu"
+        logger.info("ℹ️ Using ONNX Runtime on CPU for reranker")
+
+    def _ensure_model_file(self) -> str:
+        """Export (and quantize) the model unless a cached file already exists."""
+        def load_torch_model():
+            from transformers import AutoModelForSequenceClassification
+            return AutoModelForSequenceClassification.from_pretrained(self.model_name)
+
+        return ensure_onnx_model(self.model_name, load_torch_model, self.tokenizer, ["logits"], self.quantize)
+
+    def _load_model(self):
+        """Load the tokenizer and an ONNX Runtime session instead of the CrossEncoder."""
+        try:
+            from transformers import AutoConfig, AutoTokenizer
+
+            logger.info(f"Loading ONNX reranker model: {self.model_name} ({'int8' if self.quantize else 'fp32'})")
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.max_length = min(self.tokenizer.model_max_length, 512)
+            self.apply_sigmoid = _uses_sigmoid(AutoConfig.from_pretrained(self.model_name))
+            self.model_path = self._ensure_model_file()
+            self.session = create_session(self.model_path, intra_op_threads=self.intra_op_threads)
+            # rerank_results only checks that a model is loaded
+            self.model = self.session
+            logger.info("ONNX reranker model loaded successfully")
+        except Exception as e:
+            logger.error(f"Failed to load ONNX reranker model: {e}")
+            raise
+
+    def _optimize_memory(self):
+        gc.collect()
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Score pairs in length-sorted batches through ONNX Runtime; scores keep the pair order."""
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        scores = [0.0] * len(pairs)
+        batch_size = max(1, settings.RERANKER_BATCH_SIZE)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [pairs[i][0] for i in batch],
+                [pairs[i][1] for i in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            logits = run_with_io_binding(self.session, session_inputs(self.session, encoded), "logits")
+            values = logits[:, 0] if logits.ndim == 2 else logits
+            if self.apply_sigmoid:
+                values = 1.0 / (1.0 + np.exp(-values))
+            for pair_index, value in zip(batch, values):
+                scores[pair_index] = float(value)
+        return scores
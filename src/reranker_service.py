@@ -1,10 +1,14 @@
+import hashlib
 import logging
+import threading
+import time
 from typing import List, Dict, Any, Optional, Protocol
 
 import requests
 
 from src import settings
-from src.reranker_client import RerankerClient
+from src.cache import Cache, LRUCache
+from src.reranker_client import OnnxRerankerClient, RerankerClient, extract_document_content
 
 
 logger = logging.getLogger(__name__)
@@ -16,14 +20,21 @@ class RerankerProvider(Protocol):
 
 
 class LocalRerankerProvider:
-    """Local reranker using a CrossEncoder model via `RerankerClient`."""
-
-    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None):
-        self.client = RerankerClient(
-            model_name=model_name or settings.RERANKER_MODEL,
-            device=device or settings.RERANKER_DEVICE,
-        )
-        logger.info("Initialized local reranker provider")
+    """
+    Local reranker running the cross-encoder in-process, on PyTorch (`RerankerClient`)
+    or ONNX Runtime (`OnnxRerankerClient`) depending on RERANKER_BACKEND.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None, backend: Optional[str] = None):
+        self.backend = str(backend or settings.RERANKER_BACKEND).lower()
+        if self.backend == "onnx":
+            self.client = OnnxRerankerClient(model_name=model_name or settings.RERANKER_MODEL)
+        else:
+            self.client = RerankerClient(
+                model_name=model_name or settings.RERANKER_MODEL,
+                device=device or settings.RERANKER_DEVICE,
+            )
+        logger.info(f"Initialized local reranker provider ({self.backend} backend)")
 
     def rerank_results(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         return self.client.rerank_results(query=query, candidates=candidates)
@@ -77,17 +88,97 @@ class APIRerankerProvider:
             return candidates
 
 
+# Marks which cache miss a provider result belongs to; stripped before returning
+_POSITION_KEY = "_rerank_position"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 class RerankerService:
-    """Facade over different reranker providers (local or API)."""
+    """
+    Facade over different reranker providers (local or API).
+
+    With a score cache, each (query, entity type, entity id, content) score is
+    remembered and only the uncached candidates are sent to the provider. The
+    key includes a hash of the scored text, so an entity whose text changes is
+    simply a miss; stale scores age out through LRU eviction.
+    """
 
-    def __init__(self, provider: RerankerProvider):
+    def __init__(self, provider: RerankerProvider, score_cache: Optional[Cache] = None):
         self.provider = provider
+        self.score_cache = score_cache
+        # Seconds spent constructing the provider (loading the model), set by get_reranker_service
+        self.load_seconds: Optional[float] = None
+
+    @staticmethod
+    def _score_key(query_hash: str, candidate: Dict[str, Any]) -> tuple:
+        content = extract_document_content(candidate) or ""
+        entity_id = candidate.get("id", candidate.get("number"))
+        return (query_hash, candidate.get("source_type"), entity_id, _sha256(content))
 
     def rerank_results(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        return self.provider.rerank_results(query, candidates)
+        if self.score_cache is None or not candidates:
+            return self.provider.rerank_results(query, candidates)
+
+        query_hash = _sha256(query)
+        keys = [self._score_key(query_hash, candidate) for candidate in candidates]
+        scores: List[Optional[float]] = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            scored = self.provider.rerank_results(
+                query, [{**candidates[i], _POSITION_KEY: i} for i in missing]
+            )
+            for candidate in scored:
+                position = candidate.get(_POSITION_KEY)
+                score = candidate.get("reranker_score")
+                if position is None or score is None:
+                    continue
+                scores[position] = float(score)
+                self.score_cache.set(keys[position], scores[position])
+            if any(scores[i] is None for i in missing):
+                # Provider failed; mirror its behaviour and return the candidates unscored
+                logger.warning("Reranker did not score every candidate; returning original order")
+                return candidates
+
+        logger.debug(f"Reranker score cache: {len(candidates) - len(missing)}/{len(candidates)} hits")
+        reranked = [{**candidate, "reranker_score": score} for candidate, score in zip(candidates, scores)]
+        reranked.sort(key=lambda candidate: candidate["reranker_score"], reverse=True)
+        return reranked
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Score cache counters, or None when caching is disabled."""
+        return self.score_cache.stats() if self.score_cache is not None else None
+
+
+def create_score_cache() -> Optional[Cache]:
+    """Build the reranker score cache from settings; None when RERANKER_SCORE_CACHE_SIZE is 0."""
+    if settings.RERANKER_SCORE_CACHE_SIZE <= 0:
+        return None
+    return LRUCache(maxsize=settings.RERANKER_SCORE_CACHE_SIZE)
 
 
 _reranker_service: Optional[RerankerService] = None
+_reranker_service_lock = threading.Lock()
+
+
+def _create_reranker_service() -> RerankerService:
+    provider_name = str(getattr(settings, "RERANKER_PROVIDER", "local")).lower()
+    if provider_name == "api":
+        provider: RerankerProvider = APIRerankerProvider(
+            api_base_url=getattr(settings, "RERANKER_API_BASE", "http://localhost:8000"),
+            api_key=getattr(settings, "RERANKER_API_KEY", None),
+            rerank_path=getattr(settings, "RERANKER_API_RERANK_PATH", "/rerank"),
+            timeout_seconds=getattr(settings, "RERANKER_API_TIMEOUT", 30),
+        )
+    else:
+        provider = LocalRerankerProvider(
+            model_name=getattr(settings, "RERANKER_MODEL", None),
+            device=getattr(settings, "RERANKER_DEVICE", None),
+        )
+    return RerankerService(provider, score_cache=create_score_cache())
 
 
 def get_reranker_service() -> Optional[RerankerService]:
@@ -96,27 +187,21 @@ def get_reranker_service() -> Optional[RerankerService]:
         logger.info("Reranker is disabled via settings")
         return None
 
-    if _reranker_service is None:
-        provider_name = str(getattr(settings, "RERANKER_PROVIDER", "local")).lower()
-        if provider_name == "api":
-            provider: RerankerProvider = APIRerankerProvider(
-                api_base_url=getattr(settings, "RERANKER_API_BASE", "http://localhost:8000"),
-                api_key=getattr(settings, "RERANKER_API_KEY", None),
-                rerank_path=getattr(settings, "RERANKER_API_RERANK_PATH", "/rerank"),
-                timeout_seconds=getattr(settings, "RERANKER_API_TIMEOUT", 30),
-            )
-        else:
-            provider = LocalRerankerProvider(
-                model_name=getattr(settings, "RERANKER_MODEL", None),
-                device=getattr(settings, "RERANKER_DEVICE", None),
-            )
-        _reranker_service = RerankerService(provider)
-
+    if _reranker_service is not None:
+        return _reranker_service
+    # Concurrent first callers wait for one model load instead of each starting their own
+    with _reranker_service_lock:
+        if _reranker_service is None:
+            started = time.perf_counter()
+            service = _create_reranker_service()
+            service.load_seconds = time.perf_counter() - started
+            _reranker_service = service
     return _reranker_service
 
 
 def set_reranker_service(service: Optional[RerankerService]):
     global _reranker_service
-    _reranker_service = service
+    with _reranker_service_lock:
+        _reranker_service = service
 
 
@@ -0,0 +1,73 @@
+"""
+Search response cache stamped with the content data version.
+
+Entries are keyed on (data version, endpoint scope, normalized text, state).
+When the tracked version moves, the whole cache is dropped, so results never
+outlive the rows they were computed from and no TTL guess is needed.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .cache import LRUCache
+from .text_utils import normalize_query_text
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedResultCache:
+    """LRU cache of search responses that is cleared whenever the data version changes."""
+
+    def __init__(self, version_source: Callable[[], Optional[int]], maxsize: int = 512):
+        # Returns the current data version, or None when it is unknown (caching is then bypassed)
+        self._version_source = version_source
+        self._cache = LRUCache(maxsize=maxsize)
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def current_version(self) -> Optional[int]:
+        """Data version right now; capture it before computing a result that will be stored."""
+        version = self._version_source()
+        if version is not None:
+            self._sync(version)
+        return version
+
+    def _sync(self, version: int) -> None:
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info(f"Data version {self._version} -> {version}; dropping {len(self._cache)} cached results")
+                    self.invalidations += 1
+                self._cache.clear()
+                self._version = version
+
+    @staticmethod
+    def _key(version: int, scope: str, text: str, state: Optional[str]) -> tuple:
+        return (version, scope, normalize_query_text(text), state)
+
+    def get(self, scope: str, text: str, state: Optional[str] = None) -> Optional[Any]:
+        """Cached response for the current data version, or None."""
+        version = self.current_version()
+        if version is None:
+            return None
+        return self._cache.get(self._key(version, scope, text, state))
+
+    def set(self, scope: str, text: str, state: Optional[str], value: Any, version: Optional[int]) -> None:
+        """
+        Store a response computed at `version`.
+        Skipped when the version is unknown or has moved on since the search started.
+        """
+        if version is None or version != self.current_version():
+            return
+        self._cache.set(self._key(version, scope, text, state), value)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats["data_version"] = self._version
+        stats["invalidations"] = self.invalidations
+        return stats
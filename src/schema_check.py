@@ -0,0 +1,61 @@
+"""
+Startup check for columns that were added to the schema after databases were first created.
+
+`manage-db --recreate` creates them, but an existing database only gets them
+from a migration command. The API queries select these columns, so without them
+every search fails with UndefinedColumn. `verify_database_schema` reports what is
+missing, and the command to run, before the API serves traffic.
+"""
+
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from .db import engine
+from .rerank_text import RERANK_TEXT_COLUMN, RERANK_TEXT_FORMATS
+from .source_urls import GENERATED_URL_TABLES, SOURCE_URL_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# (table, column, command that adds it)
+REQUIRED_COLUMNS: List[Tuple[str, str, str]] = [
+    *((table, RERANK_TEXT_COLUMN, "uv run run.py db rerank-text") for table in RERANK_TEXT_FORMATS),
+    *((table, "url", "uv run run.py db source-urls") for table in GENERATED_URL_TABLES),
+    ("questions", SOURCE_URL_COLUMN, "uv run run.py db source-urls"),
+]
+
+
+class SchemaOutdatedError(RuntimeError):
+    """The database lacks columns the API selects."""
+
+
+def missing_columns() -> List[Tuple[str, str, str]]:
+    """The REQUIRED_COLUMNS entries that do not exist in the database."""
+    with engine.connect() as conn:
+        existing = {
+            (row.table_name, row.column_name)
+            for row in conn.execute(text(
+                "SELECT table_name, column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = ANY(:tables)"
+            ), {"tables": sorted({table for table, _, _ in REQUIRED_COLUMNS})})
+        }
+    return [entry for entry in REQUIRED_COLUMNS if (entry[0], entry[1]) not in existing]
+
+
+def verify_database_schema() -> None:
+    """
+    Raise SchemaOutdatedError naming the migration commands when required columns are missing.
+    An unreachable database is only logged, so the API can still start before Postgres does.
+    """
+    try:
+        missing = missing_columns()
+    except OperationalError as e:
+        logger.warning(f"Could not verify the database schema ({e}); skipping the check")
+        return
+    if not missing:
+        return
+    columns = ", ".join(f"{table}.{column}" for table, column, _ in missing)
+    commands = " && ".join(dict.fromkeys(command for _, _, command in missing))
+    raise SchemaOutdatedError(f"Database is missing column(s) {columns}; run: {commands}")
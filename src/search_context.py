@@ -0,0 +1,40 @@
+"""
+Per-request search context shared by the similarity endpoints.
+The aggregate endpoints build it once and hand it to every sub-search, so the
+query embedding is computed a single time per request.
+"""
+from typing import List, Optional, Dict, Any
+
+from .api_utils import create_embedding_safe
+
+
+class SearchContext:
+    """Query text, its embedding and the parsed filters for one search request."""
+
+    def __init__(self, text: str, embedding: List[float], state: Optional[str] = None):
+        self.text = text
+        self.embedding = embedding
+        self.state = state
+        # Sources whose sub-search raised; results of an incomplete search are not cached
+        self.failed_sources: List[str] = []
+
+    @property
+    def state_where_clause(self) -> Optional[str]:
+        """WHERE clause for the issue state filter, if any."""
+        return "state = :state_param" if self.state else None
+
+    @property
+    def state_where_params(self) -> Optional[Dict[str, Any]]:
+        """Bind parameters for `state_where_clause`."""
+        return {'state_param': self.state} if self.state else None
+
+
+def build_search_context(text: str, state: Optional[str] = None) -> SearchContext:
+    """
+    Embed the query text and bundle it with the request filters.
+
+    Raises:
+        HTTPException: If the embedding cannot be created
+    """
+    embedding = create_embedding_safe(text)
+    return SearchContext(text=text, embedding=embedding, state=state)
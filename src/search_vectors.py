@@ -0,0 +1,180 @@
+"""
+Unified `search_vectors` table: one row per (entity_type, entity_id, vector_kind).
+
+The v2 candidate queries probe one HNSW index per embedding column (eight
+probes per request) and then merge them. With SEARCH_VECTORS_ENABLED the API
+instead probes the single index on `search_vectors.embedding` once per
+source table, in one statement, and aggregates per entity.
+
+Row-level triggers on the content tables copy the searched embedding columns
+on every insert, update and delete, so no embedding writer has to know about
+the table. `sync_search_vectors` backfills it and removes stale rows, e.g. after
+a content table was dropped and recreated.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from .db import engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_VECTORS_TABLE = "search_vectors"
+
+# Embedding columns read by the v2 candidate queries, per content table
+SEARCH_VECTOR_COLUMNS = {
+    "issues": ("issue_embedding", "summary_embedding"),
+    "discourse_posts": ("conversation_embedding", "summary_embedding"),
+    "metabase_docs": ("markdown_embedding", "summary_embedding"),
+    "questions": ("question_embedding", "answer_embedding"),
+}
+
+# TG_ARGV lists the embedding columns to mirror; unchanged columns are skipped on UPDATE
+_SYNC_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION sync_search_vectors() RETURNS trigger AS $$
+DECLARE
+    kind TEXT;
+    unchanged BOOLEAN;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM {SEARCH_VECTORS_TABLE} WHERE entity_type = TG_TABLE_NAME AND entity_id = OLD.id;
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW.id IS DISTINCT FROM OLD.id THEN
+        DELETE FROM {SEARCH_VECTORS_TABLE} WHERE entity_type = TG_TABLE_NAME AND entity_id = OLD.id;
+    END IF;
+    FOREACH kind IN ARRAY TG_ARGV LOOP
+        IF TG_OP = 'UPDATE' AND NEW.id IS NOT DISTINCT FROM OLD.id THEN
+            EXECUTE format('SELECT ($1).%I IS NOT DISTINCT FROM ($2).%I', kind, kind) USING NEW, OLD INTO unchanged;
+            CONTINUE WHEN unchanged;
+        END IF;
+        EXECUTE format(
+            'INSERT INTO {SEARCH_VECTORS_TABLE} (entity_type, entity_id, vector_kind, embedding) '
+            'SELECT $1, $2, $3, ($4).%I WHERE ($4).%I IS NOT NULL '
+            'ON CONFLICT (entity_type, entity_id, vector_kind) DO UPDATE SET embedding = EXCLUDED.embedding',
+            kind, kind
+        ) USING TG_TABLE_NAME, NEW.id, kind, NEW;
+        EXECUTE format(
+            'DELETE FROM {SEARCH_VECTORS_TABLE} '
+            'WHERE entity_type = $1 AND entity_id = $2 AND vector_kind = $3 AND ($4).%I IS NULL',
+            kind
+        ) USING TG_TABLE_NAME, NEW.id, kind, NEW;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION clear_search_vectors() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM {SEARCH_VECTORS_TABLE} WHERE entity_type = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _selected_tables(tables: Optional[Iterable[str]]) -> List[str]:
+    selected = list(tables) if tables else list(SEARCH_VECTOR_COLUMNS)
+    unknown = set(selected) - set(SEARCH_VECTOR_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown table(s) for search vectors: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def _row_trigger_name(table: str) -> str:
+    return f"trg_{table}_search_vectors"
+
+
+def _truncate_trigger_name(table: str) -> str:
+    return f"trg_{table}_search_vectors_truncate"
+
+
+def install_search_vector_triggers(tables: Optional[Iterable[str]] = None) -> List[str]:
+    """Create the sync functions and the triggers on each content table (idempotent)."""
+    installed = []
+    with engine.begin() as conn:
+        conn.execute(text(_SYNC_FUNCTION_SQL))
+        for table in _selected_tables(tables):
+            columns = SEARCH_VECTOR_COLUMNS[table]
+            column_args = ", ".join(f"'{column}'" for column in columns)
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_row_trigger_name(table)} ON {table}"))
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_truncate_trigger_name(table)} ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER {_row_trigger_name(table)} "
+                f"AFTER INSERT OR UPDATE OF id, {', '.join(columns)} OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION sync_search_vectors({column_args})"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {_truncate_trigger_name(table)} "
+                f"AFTER TRUNCATE ON {table} FOR EACH STATEMENT EXECUTE FUNCTION clear_search_vectors()"
+            ))
+            logger.info(f"Installed search-vector triggers on {table}")
+            installed.append(table)
+    return installed
+
+
+def drop_search_vector_triggers(tables: Optional[Iterable[str]] = None) -> None:
+    """Remove the triggers; `search_vectors` then goes stale until they are reinstalled and synced."""
+    with engine.begin() as conn:
+        for table in _selected_tables(tables):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_row_trigger_name(table)} ON {table}"))
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_truncate_trigger_name(table)} ON {table}"))
+
+
+def sync_search_vectors(tables: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Bring `search_vectors` in line with the content tables: upsert changed
+    embeddings and delete rows whose source row or embedding is gone.
+
+    Returns:
+        {table: {"upserted": n, "deleted": n}}
+    """
+    counts = {}
+    for table in _selected_tables(tables):
+        upserted = deleted = 0
+        # One transaction per table keeps locks short on large databases
+        with engine.begin() as conn:
+            for column in SEARCH_VECTOR_COLUMNS[table]:
+                upserted += conn.execute(text(
+                    f"INSERT INTO {SEARCH_VECTORS_TABLE} (entity_type, entity_id, vector_kind, embedding) "
+                    f"SELECT :table, id, :kind, {column} FROM {table} WHERE {column} IS NOT NULL "
+                    f"ON CONFLICT (entity_type, entity_id, vector_kind) DO UPDATE SET embedding = EXCLUDED.embedding "
+                    f"WHERE {SEARCH_VECTORS_TABLE}.embedding IS DISTINCT FROM EXCLUDED.embedding"
+                ), {"table": table, "kind": column}).rowcount
+                deleted += conn.execute(text(
+                    f"DELETE FROM {SEARCH_VECTORS_TABLE} s "
+                    f"WHERE s.entity_type = :table AND s.vector_kind = :kind AND NOT EXISTS ("
+                    f"SELECT 1 FROM {table} t WHERE t.id = s.entity_id AND t.{column} IS NOT NULL)"
+                ), {"table": table, "kind": column}).rowcount
+            deleted += conn.execute(text(
+                f"DELETE FROM {SEARCH_VECTORS_TABLE} WHERE entity_type = :table AND vector_kind <> ALL(:kinds)"
+            ), {"table": table, "kinds": list(SEARCH_VECTOR_COLUMNS[table])}).rowcount
+        logger.info(f"Synced search vectors for {table}: {upserted} upserted, {deleted} deleted")
+        counts[table] = {"upserted": upserted, "deleted": deleted}
+    return counts
+
+
+def get_search_vector_status(tables: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Rows per content table in `search_vectors` vs. embeddings in the table, and trigger presence."""
+    status = []
+    with engine.connect() as conn:
+        for table in _selected_tables(tables):
+            columns = SEARCH_VECTOR_COLUMNS[table]
+            expected = conn.execute(text(
+                f"SELECT {' + '.join(f'COUNT({column})' for column in columns)} FROM {table}"
+            )).scalar()
+            mirrored = conn.execute(text(
+                f"SELECT COUNT(*) FROM {SEARCH_VECTORS_TABLE} WHERE entity_type = :table"
+            ), {"table": table}).scalar()
+            has_trigger = conn.execute(text(
+                "SELECT 1 FROM pg_trigger WHERE tgname = :name AND tgrelid = to_regclass(:table)"
+            ), {"name": _row_trigger_name(table), "table": table}).first() is not None
+            status.append({
+                "table": table,
+                "embeddings": int(expected or 0),
+                "search_vectors": int(mirrored or 0),
+                "trigger": has_trigger,
+            })
+    return status
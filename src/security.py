@@ -1,24 +1,114 @@
-from fastapi import Security, HTTPException, Depends
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Security, HTTPException
 from fastapi.security import APIKeyHeader
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
 from starlette import status
 
-from .db import get_db
+from . import settings
+from .db import AsyncSessionLocal
+from .db_listener import NotificationListener, get_notification_listener
 from .models import ApiKey
 
+logger = logging.getLogger(__name__)
+
 api_key_header = APIKeyHeader(name="X-API-Key")
 
-def get_api_key(
-    db: Session = Depends(get_db),
-    api_key: str = Security(api_key_header)
-) -> str:
+# NOTIFYed by `manage_db.py --add-api-key/--revoke-api-key` so every API process drops its cache
+API_KEYS_CHANNEL = "api_keys_changed"
+
+
+def hash_api_key(api_key: str) -> str:
+    """Cache key for an API key, so plaintext keys are never kept in memory longer than the request."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def notify_api_keys_changed(connection) -> None:
+    """Tell API processes to drop cached keys; sent on commit of `connection`'s transaction."""
+    connection.execute(text(f"NOTIFY {API_KEYS_CHANNEL}"))
+
+
+class ApiKeyCache:
+    """
+    TTL cache of API key verification results, keyed by key hash.
+
+    Valid keys are trusted for `ttl` seconds, but only while the notification
+    listener is connected: a revoke sent while it was down would otherwise go
+    unseen, so the cache is cleared whenever the listener reconnects. Rejected
+    keys are remembered for `negative_ttl` seconds so clients retrying with a
+    bad key do not each cost a query.
+    """
+
+    def __init__(
+        self,
+        listener: NotificationListener,
+        ttl: Optional[int] = None,
+        negative_ttl: Optional[int] = None,
+        maxsize: Optional[int] = None,
+    ):
+        self.ttl = settings.API_KEY_CACHE_TTL if ttl is None else ttl
+        self.negative_ttl = settings.API_KEY_NEGATIVE_CACHE_TTL if negative_ttl is None else negative_ttl
+        self.maxsize = settings.API_KEY_CACHE_SIZE if maxsize is None else maxsize
+        self._listener = listener
+        self._entries: "OrderedDict[str, tuple[bool, float]]" = OrderedDict()
+        self._connections = listener.connections
+        self._lock = threading.Lock()
+        listener.subscribe(API_KEYS_CHANNEL, lambda _payload: self.clear())
+
+    def get(self, key_hash: str) -> Optional[bool]:
+        """True/False for a cached verdict, None when the key must be checked against the database."""
+        with self._lock:
+            if self._listener.connections != self._connections:
+                self._entries.clear()
+                self._connections = self._listener.connections
+            entry = self._entries.get(key_hash)
+            if entry is None or entry[1] < time.monotonic() or (entry[0] and not self._listener.connected.is_set()):
+                return None
+            return entry[0]
+
+    def put(self, key_hash: str, valid: bool) -> None:
+        ttl = self.ttl if valid else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key_hash] = (valid, time.monotonic() + ttl)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        logger.info("API key cache cleared")
+
+
+api_key_cache = ApiKeyCache(get_notification_listener()) if settings.API_KEY_CACHE_ENABLED else None
+
+
+async def _api_key_exists(api_key: str) -> bool:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(ApiKey.id).where(ApiKey.key == api_key).limit(1))
+        return result.first() is not None
+
+
+async def get_api_key(api_key: str = Security(api_key_header)) -> str:
     """
     Dependency to validate the API key.
     """
-    db_api_key = db.query(ApiKey).filter(ApiKey.key == api_key).first()
-    if not db_api_key:
+    key_hash = hash_api_key(api_key) if api_key_cache is not None else None
+    valid = api_key_cache.get(key_hash) if api_key_cache is not None else None
+    if valid is None:
+        valid = await _api_key_exists(api_key)
+        if api_key_cache is not None:
+            api_key_cache.put(key_hash, valid)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key",
         )
-    return api_key 
\ No newline at end of file
+    return api_key
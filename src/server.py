@@ -0,0 +1,284 @@
+"""
+Pre-forking API server: `python -m src.server --workers N [--preload]`.
+
+The parent binds the listening socket and forks N uvicorn workers that accept
+on it. With `--preload`, the parent first imports `src.api`, which loads the
+embedding model and the cross-encoder, and runs one warm-up inference. It then
+moves every object it has allocated into the GC's permanent generation
+(`gc.freeze()`) and forks. The workers share the model weights copy-on-write
+instead of each loading its own copy, so the cold start is paid once. Without
+`--preload`, every worker imports the app itself, like `uvicorn --workers N`.
+
+Preloading only supports local models on the CPU with the PyTorch backend.
+CUDA/MPS contexts and ONNX Runtime sessions (and their thread pools) do not
+survive fork, so the server refuses to preload them.
+
+At boot the parent logs the model load time, how long until every worker is
+accepting connections, and each worker's RSS and PSS. PSS splits shared pages
+between the processes that map them, so the PSS sum is the real footprint.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from . import settings
+
+logger = logging.getLogger("src.server")
+
+# Seconds to wait for all workers to report ready before logging the memory table anyway
+READY_TIMEOUT_SECONDS = 300
+# Seconds between checks for exited workers
+SUPERVISE_INTERVAL_SECONDS = 1.0
+
+
+def memory_usage(pid: int) -> Dict[str, float]:
+    """RSS, PSS, shared and private memory of a process in MB, from /proc (Linux only)."""
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    usage = {"rss": 0.0, "pss": 0.0, "shared": 0.0, "private": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    usage[fields[name]] += int(rest.split()[0]) / 1024
+    except (OSError, ValueError):
+        return {}
+    return usage
+
+
+def _format_usage(usage: Dict[str, float]) -> str:
+    if not usage:
+        return "memory n/a"
+    return (f"RSS {usage['rss']:7.0f} MB | PSS {usage['pss']:7.0f} MB | "
+            f"shared {usage['shared']:7.0f} MB | private {usage['private']:7.0f} MB")
+
+
+def _uses_local_torch_models() -> bool:
+    """Whether the app will run a model on PyTorch in this process (API providers never import torch)."""
+    embedding = (str(settings.EMBEDDING_PROVIDER).lower() == "local"
+                 and str(settings.EMBEDDING_BACKEND).lower() == "torch")
+    reranker = (settings.RERANKER_ENABLED and str(settings.RERANKER_PROVIDER).lower() == "local"
+                and str(settings.RERANKER_BACKEND).lower() == "torch")
+    return embedding or reranker
+
+
+def _check_preload_supported() -> None:
+    """Refuse to preload model runtimes whose state does not survive fork."""
+    if str(settings.EMBEDDING_PROVIDER).lower() == "local" and str(settings.EMBEDDING_BACKEND).lower() != "torch":
+        raise SystemExit("--preload needs EMBEDDING_BACKEND=torch: ONNX Runtime sessions are not fork-safe")
+    if (settings.RERANKER_ENABLED and str(settings.RERANKER_PROVIDER).lower() == "local"
+            and str(settings.RERANKER_BACKEND).lower() != "torch"):
+        raise SystemExit("--preload needs RERANKER_BACKEND=torch: ONNX Runtime sessions are not fork-safe")
+
+
+def _check_database_schema() -> None:
+    """Check the schema once in the parent, so an outdated database does not make every worker fail and respawn."""
+    from .schema_check import SchemaOutdatedError, verify_database_schema
+
+    try:
+        verify_database_schema()
+    except SchemaOutdatedError as e:
+        raise SystemExit(str(e)) from None
+
+
+def preload_app():
+    """Import the app in the parent, warm the models up and freeze the heap for copy-on-write sharing."""
+    import torch
+
+    _check_preload_supported()
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # A single thread keeps the parent from starting the intra-op pool, which forked workers could not use
+    torch.set_num_threads(1)
+
+    from . import api
+
+    embedding_provider = getattr(api.embedding_service, "provider", None)
+    reranker_client = getattr(getattr(api.reranker_service, "provider", None), "client", None)
+    devices = {getattr(embedding_provider, "device", "cpu"), getattr(reranker_client, "device", "cpu")}
+    if devices != {"cpu"} or torch.cuda.is_initialized():
+        raise SystemExit(f"--preload only supports CPU models (found {', '.join(sorted(devices))}); run without it")
+
+    # One warmup round materializes lazily created buffers before they would be duplicated per worker;
+    # each worker still runs its own warmup at startup for its thread pool, and reports it on /ready
+    from .warmup import warm_up_embeddings, warm_up_reranker
+    warm_up_embeddings(api.embedding_service)
+    warm_up_reranker(api.reranker_service)
+
+    gc.collect()
+    # Later collections in the workers skip these objects, so they do not dirty the shared pages
+    gc.freeze()
+    return api.app
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker_torch_threads(workers: int) -> int:
+    if settings.API_WORKER_TORCH_THREADS > 0:
+        return settings.API_WORKER_TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _run_worker(app, sock: socket.socket, workers: int, log_level: str, ready_fd: int) -> None:
+    """Body of a forked worker: reset inherited state, then serve on the shared socket until stopped."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    random.seed()
+
+    from .db import engine, async_engine
+    # Pooled connections belong to the parent; drop them without closing the parent's sockets
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+    # Already imported when preloaded; otherwise only import it when a local model will need it
+    if "torch" in sys.modules or _uses_local_torch_models():
+        import torch
+        torch.set_num_threads(_worker_torch_threads(workers))
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+
+    def report_ready():
+        while not server.started and not server.should_exit:
+            time.sleep(0.05)
+        if server.started:
+            os.write(ready_fd, f"{os.getpid()}\n".encode())
+
+    threading.Thread(target=report_ready, name="ready-reporter", daemon=True).start()
+    server.run(sockets=[sock])
+
+
+class PreforkServer:
+    """Fork and supervise `workers` uvicorn processes sharing one listening socket."""
+
+    def __init__(self, host: str, port: int, workers: int, preload: bool, log_level: str = "info"):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = preload
+        self.log_level = log_level
+        self.children: Dict[int, float] = {}
+        self._stopping = False
+
+    def _spawn(self, app, sock: socket.socket, ready_fd: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(app, sock, self.workers, self.log_level, ready_fd)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _report_ready(self, ready_read: int, boot_started: float, load_seconds: Optional[float]) -> None:
+        """Wait until every worker accepts connections, then log startup time and memory per worker."""
+        ready = set()
+        deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+        buffer = b""
+        while len(ready) < self.workers and time.monotonic() < deadline and not self._stopping:
+            readable, _, _ = select.select([ready_read], [], [], 1.0)
+            if readable:
+                buffer += os.read(ready_read, 4096)
+                *lines, buffer = buffer.split(b"\n")
+                ready.update(int(line) for line in lines if line)
+
+        elapsed = time.monotonic() - boot_started
+        loaded = f"models preloaded in {load_seconds:.1f} s, " if load_seconds is not None else ""
+        logger.info(f"{len(ready)}/{self.workers} workers ready {elapsed:.1f} s after boot ({loaded}pid {os.getpid()})")
+        logger.info(f"  parent {os.getpid():>7}: {_format_usage(memory_usage(os.getpid()))}")
+        totals = {"rss": 0.0, "pss": 0.0}
+        for pid in sorted(self.children):
+            usage = memory_usage(pid)
+            for key in totals:
+                totals[key] += usage.get(key, 0.0)
+            logger.info(f"  worker {pid:>7}: {_format_usage(usage)}")
+        if totals["rss"]:
+            logger.info(f"  workers total: RSS {totals['rss']:.0f} MB, PSS {totals['pss']:.0f} MB")
+
+    def run(self) -> None:
+        boot_started = time.monotonic()
+        load_seconds = None
+        _check_database_schema()
+        if self.preload:
+            logger.info(f"Preloading models in the parent (pid {os.getpid()})...")
+            app = preload_app()
+            load_seconds = time.monotonic() - boot_started
+        else:
+            app = "src.api:app"
+
+        sock = _bind_socket(self.host, self.port)
+        ready_read, ready_write = os.pipe()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(f"Serving on http://{self.host}:{self.port} with {self.workers} workers (preload: {self.preload})")
+        for _ in range(self.workers):
+            self._spawn(app, sock, ready_write)
+        self._report_ready(ready_read, boot_started, load_seconds)
+
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(SUPERVISE_INTERVAL_SECONDS)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            logger.warning(f"Worker {pid} exited (status {status}) after {time.monotonic() - started:.0f} s; starting a replacement")
+            self._spawn(app, sock, ready_write)
+        sock.close()
+        logger.info("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with N pre-forked uvicorn workers.")
+    parser.add_argument("--host", default="0.0.0.0", help="Bind address.")
+    parser.add_argument("--port", type=int, default=8000, help="Bind port.")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes.")
+    parser.add_argument("--preload", action="store_true", help="Load and warm up the models once in the parent before forking.")
+    parser.add_argument("--log-level", default="info", help="Log level.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not hasattr(os, "fork"):
+        sys.exit("The pre-forking server needs os.fork (Linux or macOS)")
+    PreforkServer(args.host, args.port, args.workers, args.preload, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 from decouple import config
-import torch
 from src.constants import DEFAULT_RERANKER_MODEL
 
 # GitHub
@@ -21,6 +20,13 @@ DATABASE_URL = str(config("DATABASE_URL", default="postgresql+psycopg://localhos
 if DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://", 1)
 
+# psycopg prepares a statement server-side once it has run this many times on a connection
+DB_PREPARE_THRESHOLD = config("DB_PREPARE_THRESHOLD", default=5, cast=int)
+
+# Connection pool of the async engine used by the search endpoints (each aggregate search uses one connection per source)
+DB_ASYNC_POOL_SIZE = config("DB_ASYNC_POOL_SIZE", default=20, cast=int)
+DB_ASYNC_MAX_OVERFLOW = config("DB_ASYNC_MAX_OVERFLOW", default=40, cast=int)
+
 # LLM
 LITELLM_API_BASE = config("LITELLM_API_BASE", default="http://localhost:4000")
 LITELLM_API_KEY = config("LITELLM_API_KEY", default="your-litellm-proxy-api-key")
@@ -31,6 +37,9 @@ LITELLM_RPM = config("LITELLM_RPM", default=15, cast=int)
 LITELLM_FAST_MODEL = config("LITELLM_FAST_MODEL", default="openai-fast")
 LITELLM_SLOW_MODEL = config("LITELLM_SLOW_MODEL", default="openai-slow")
 
+# Chat streaming
+CHAT_STREAM_HOLDBACK_CHARS = config("CHAT_STREAM_HOLDBACK_CHARS", default=64, cast=int)  # Tail withheld until guardrails have seen what follows
+
 # API Security
 API_KEY = config("API_KEY", default="a_super_secret_key_for_your_api")
 
@@ -44,12 +53,30 @@ OPENAI_BATCH_ENTITIES_PER_BATCH = config("OPENAI_BATCH_ENTITIES_PER_BATCH", defa
 # Provider can be 'local' or 'api'
 EMBEDDING_PROVIDER = config("EMBEDDING_PROVIDER", default="local")
 EMBEDDING_MODEL = config("EMBEDDING_MODEL", default="sentence-transformers/all-mpnet-base-v2")
-EMBEDDING_DEVICE = config("EMBEDDING_DEVICE", default="cuda" if torch.cuda.is_available() else "cpu")
+# Unset = cuda when available, else cpu (detected when the model loads, so importing settings stays cheap)
+EMBEDDING_DEVICE = config("EMBEDDING_DEVICE", default=None)
+# Local model runtime: 'torch', 'onnx' or 'onnx-int8' (ONNX Runtime on CPU, needs the onnx extra)
+EMBEDDING_BACKEND = config("EMBEDDING_BACKEND", default="torch")
+# Micro-batching of concurrent single-text requests in the local provider (max size 1 disables it)
+EMBEDDING_BATCH_MAX_SIZE = config("EMBEDDING_BATCH_MAX_SIZE", default=32, cast=int)
+EMBEDDING_BATCH_MAX_WAIT_MS = config("EMBEDDING_BATCH_MAX_WAIT_MS", default=5.0, cast=float)
 
 # External embedding API (used when EMBEDDING_PROVIDER=api)
 EMBEDDING_API_BASE = config("EMBEDDING_API_BASE", default="http://localhost:8000")
 EMBEDDING_API_KEY = config("EMBEDDING_API_KEY", default=API_KEY)
 EMBEDDING_API_EMBEDDING_PATH = config("EMBEDDING_API_EMBEDDING_PATH", default="/embedding")
+# Bulk endpoint used by create_embeddings_batch (empty disables it); format is json, float32 or float16
+EMBEDDING_API_BULK_PATH = config("EMBEDDING_API_BULK_PATH", default="/embeddings")
+EMBEDDING_API_BULK_FORMAT = config("EMBEDDING_API_BULK_FORMAT", default="float32")
+EMBEDDING_API_BULK_MAX_TEXTS = config("EMBEDDING_API_BULK_MAX_TEXTS", default=64, cast=int)  # Texts per bulk request
+# Server-side limit on texts per /embeddings request
+EMBEDDING_BULK_MAX_TEXTS = config("EMBEDDING_BULK_MAX_TEXTS", default=256, cast=int)
+
+# Query embedding cache: 'memory' (per process), 'sqlite' (shared file across processes) or 'none'
+EMBEDDING_CACHE_BACKEND = config("EMBEDDING_CACHE_BACKEND", default="memory")
+EMBEDDING_CACHE_SIZE = config("EMBEDDING_CACHE_SIZE", default=1024, cast=int)  # Max cached embeddings
+EMBEDDING_CACHE_TTL_SECONDS = config("EMBEDDING_CACHE_TTL_SECONDS", default=3600, cast=int)  # 0 disables expiry
+EMBEDDING_CACHE_PATH = config("EMBEDDING_CACHE_PATH", default=".cache/embeddings.sqlite3")  # Used by the sqlite backend
 
 # Application URLs  
 GITHUB_BASE_URL = config("GITHUB_BASE_URL", default="https://github.com/metabase/metabase")
@@ -57,15 +84,49 @@ GITHUB_BASE_URL = config("GITHUB_BASE_URL", default="https://github.com/metabase
 
 # Embedding Configuration
 EMBEDDING_DIM = 768  # Dimension of the 'all-mpnet-base-v2' model
+# Embedding column type: 'vector' (float32) or 'halfvec' (float16, half the heap and HNSW index size).
+# Convert existing columns with `run.py db vector-storage halfvec` before switching.
+VECTOR_STORAGE = config("VECTOR_STORAGE", default="vector")
+
+# HNSW vector index configuration
+HNSW_M = config("HNSW_M", default=16, cast=int)  # Max connections per graph node
+HNSW_EF_CONSTRUCTION = config("HNSW_EF_CONSTRUCTION", default=64, cast=int)  # Candidate list size while building
+HNSW_EF_SEARCH = config("HNSW_EF_SEARCH", default=None, cast=lambda v: int(v) if v else None)  # Per-session search list size; raised to at least the per-column candidate limit (50)
+HNSW_MAINTENANCE_WORK_MEM = config("HNSW_MAINTENANCE_WORK_MEM", default=None)  # e.g. '1GB' to speed up index builds
+# Two-stage search for large tables: Hamming-distance prefilter on binary-quantized embeddings
+# (`run.py db indexes binary-build`), then exact cosine rescoring of the candidates
+BINARY_PREFILTER_TABLES = config("BINARY_PREFILTER_TABLES", default="", cast=lambda v: [t.strip() for t in v.split(",") if t.strip()])
+BINARY_PREFILTER_CANDIDATES = config("BINARY_PREFILTER_CANDIDATES", default=400, cast=int)  # Stage-one rows per embedding column
+# Unified v2 search: one ANN probe over the search_vectors table instead of one per embedding column
+# (install and backfill with `run.py db search-vectors`)
+SEARCH_VECTORS_ENABLED = config("SEARCH_VECTORS_ENABLED", default=False, cast=bool)
+# Nearest vectors per source and query; two vectors per entity, so 100 covers the 50 candidates kept per source
+SEARCH_VECTORS_CANDIDATES = config("SEARCH_VECTORS_CANDIDATES", default=100, cast=int)
 
 # Reranker Configuration  
 RERANKER_ENABLED = config("RERANKER_ENABLED", default=True, cast=bool)
 RERANKER_PROVIDER = config("RERANKER_PROVIDER", default="local")  # 'local' or 'api'
 RERANKER_MODEL = str(config("RERANKER_MODEL", default=DEFAULT_RERANKER_MODEL))
-# Auto-detect best available device for reranker
-RERANKER_DEVICE = config("RERANKER_DEVICE", default="cuda" if torch.cuda.is_available() else "cpu")
+# Unset = auto-detect the best available device when the reranker loads
+RERANKER_DEVICE = config("RERANKER_DEVICE", default=None)
 RERANKER_MAX_CANDIDATES = config("RERANKER_MAX_CANDIDATES", default=20, cast=int)
 RERANKER_BATCH_SIZE = config("RERANKER_BATCH_SIZE", default=8, cast=int)  # Batch size for processing
+RERANKER_BACKEND = config("RERANKER_BACKEND", default="torch")  # Local provider runtime: 'torch' or 'onnx' (CPU, needs the onnx extra)
+RERANKER_ONNX_QUANTIZE = config("RERANKER_ONNX_QUANTIZE", default=True, cast=bool)  # Dynamic int8 quantization for the onnx backend
+RERANKER_SCORE_CACHE_SIZE = config("RERANKER_SCORE_CACHE_SIZE", default=20000, cast=int)  # Cached (query, entity, content) scores; 0 disables
+RERANK_TEXT_MAX_CHARS = config("RERANK_TEXT_MAX_CHARS", default=2048, cast=int)  # Length of the stored rerank_text (~512 tokens)
+
+# ONNX Runtime (onnx reranker and embedding backends)
+ONNX_CACHE_DIR = config("ONNX_CACHE_DIR", default=".cache/onnx")  # Exported/quantized models
+ONNX_INTRA_OP_THREADS = config("ONNX_INTRA_OP_THREADS", default=0, cast=int)  # Threads per inference; 0 = one per physical core
+ONNX_INTER_OP_THREADS = config("ONNX_INTER_OP_THREADS", default=1, cast=int)  # Parallel graph branches; 1 with sequential execution
+
+# Candidate pruning before the cross-encoder
+RERANK_PRUNING_ENABLED = config("RERANK_PRUNING_ENABLED", default=True, cast=bool)
+RERANK_PRUNE_MIN_KEEP = config("RERANK_PRUNE_MIN_KEEP", default=5, cast=int)  # Always rerank this many per source
+RERANK_PRUNE_RELATIVE_FLOOR = config("RERANK_PRUNE_RELATIVE_FLOOR", default=0.85, cast=float)  # Drop below this fraction of the best vector score
+RERANK_PRUNE_MAX_GAP = config("RERANK_PRUNE_MAX_GAP", default=0.05, cast=float)  # Cut at the first score drop larger than this
+RERANK_MAX_PAIRS = config("RERANK_MAX_PAIRS", default=80, cast=int)  # Cross-encoder pairs per request; 0 = unlimited
 
 # External reranker API (used when RERANKER_PROVIDER=api)
 RERANKER_API_BASE = config("RERANKER_API_BASE", default="http://localhost:8000")
@@ -73,6 +134,29 @@ RERANKER_API_KEY = config("RERANKER_API_KEY", default=API_KEY)
 RERANKER_API_RERANK_PATH = config("RERANKER_API_RERANK_PATH", default="/rerank")
 RERANKER_API_TIMEOUT = config("RERANKER_API_TIMEOUT", default=30, cast=int)
 
+# Search result cache, invalidated by the data_versions triggers (see `run.py db version-triggers`)
+RESULT_CACHE_ENABLED = config("RESULT_CACHE_ENABLED", default=True, cast=bool)
+RESULT_CACHE_SIZE = config("RESULT_CACHE_SIZE", default=512, cast=int)  # Max cached responses per process
+DATA_VERSION_POLL_SECONDS = config("DATA_VERSION_POLL_SECONDS", default=30, cast=int)  # Re-read the version when no NOTIFY arrives
+
+# Verified API keys cached per process (as SHA-256 hashes), dropped on NOTIFY api_keys_changed
+API_KEY_CACHE_ENABLED = config("API_KEY_CACHE_ENABLED", default=True, cast=bool)
+API_KEY_CACHE_TTL = config("API_KEY_CACHE_TTL", default=300, cast=int)  # Seconds a valid key is trusted
+API_KEY_NEGATIVE_CACHE_TTL = config("API_KEY_NEGATIVE_CACHE_TTL", default=30, cast=int)  # Seconds a rejected key stays rejected
+API_KEY_CACHE_SIZE = config("API_KEY_CACHE_SIZE", default=10000, cast=int)
+
+# Rate limiting; the SQLite file is shared by every API worker on the host (memory:// = per process)
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_STORAGE_URI = config("RATE_LIMIT_STORAGE_URI", default="sqlite:///.cache/rate_limits.sqlite3")
+RATE_LIMIT_BY_API_KEY = config("RATE_LIMIT_BY_API_KEY", default=True, cast=bool)  # Bucket per API key instead of per client IP
+
+# Pre-forking API server (`run.py api start --workers N --preload`)
+API_WORKER_TORCH_THREADS = config("API_WORKER_TORCH_THREADS", default=0, cast=int)  # Torch threads per worker; 0 = cores / workers
+
+# Model warmup at API startup; /ready answers 503 until it has finished
+WARMUP_ENABLED = config("WARMUP_ENABLED", default=True, cast=bool)
+WARMUP_ROUNDS = config("WARMUP_ROUNDS", default=2, cast=int)  # Passes over the representative encode/rerank batches
+
 # HTTP and worker settings
 HTTPX_TIMEOUT = config("HTTPX_TIMEOUT", default=30, cast=int)
 WORKER_POLL_INTERVAL_SECONDS = config("WORKER_POLL_INTERVAL_SECONDS", default=5, cast=int)
@@ -1,30 +1,124 @@
 """
 Shared query builder for similarity searches to eliminate code duplication.
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+import numpy as np
 from sqlalchemy import text as sql_text
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .constants import DEFAULT_SIMILARITY_LIMIT, DEFAULT_CANDIDATE_LIMIT
+from . import settings
+
+# Name of the bound parameter carrying the query embedding
+QUERY_EMBEDDING_PARAM = "query_embedding"
+
+
+def vector_param_sql(param_name: str = QUERY_EMBEDDING_PARAM) -> str:
+    """SQL placeholder for a bound query vector, cast to the embedding column type (VECTOR_STORAGE)."""
+    return f"CAST(:{param_name} AS {settings.VECTOR_STORAGE})"
+
+
+def to_vector_param(embedding: List[float]) -> np.ndarray:
+    """
+    Convert an embedding into a bind value for a pgvector parameter.
+
+    float32 arrays are sent in pgvector's binary format by the psycopg adapter
+    registered in `src.db`, so no float-to-text conversion happens per request.
+    """
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def binary_prefilter_enabled(table_name: str) -> bool:
+    """Whether searches on `table_name` use the two-stage binary-quantized prefilter."""
+    return table_name in settings.BINARY_PREFILTER_TABLES
 
 
 class SimilarityQueryBuilder:
     """Centralized query builder for vector similarity searches."""
-    
+
+    # Embedding column purposes, in the order their CTEs are emitted
+    EMBEDDING_KINDS = (
+        ('content_embedding', 'content'),
+        ('summary_embedding', 'summary'),
+        ('title_embedding', 'title'),
+        ('issue_embedding', 'issue'),
+        ('question_embedding', 'question'),
+        ('answer_embedding', 'answer'),
+    )
+
     def __init__(self):
         self.default_limit = DEFAULT_SIMILARITY_LIMIT
         self.default_candidates = DEFAULT_CANDIDATE_LIMIT
-    
+        # SQL text per query shape; identical text lets psycopg prepare and reuse the plan
+        self._query_cache: Dict[Tuple, str] = {}
+
+    def nearest_rows_sql(
+        self,
+        table_name: str,
+        embedding_col: str,
+        select_cols: str,
+        query_vector: str,
+        limit: int,
+        where: str = "",
+        min_similarity: Optional[float] = None,
+        table_alias: Optional[str] = None,
+        binary_prefilter: Optional[bool] = None,
+    ) -> str:
+        """
+        SELECT of the `limit` rows nearest to the query on one embedding column, with a `similarity` column.
+
+        With the binary prefilter (BINARY_PREFILTER_TABLES, or forced via
+        `binary_prefilter`), stage one walks the Hamming-distance HNSW index on
+        `binary_quantize(column)` for BINARY_PREFILTER_CANDIDATES rows, and stage two
+        rescores only those with exact cosine distance on the full vectors.
+
+        Args:
+            table_name: Table to search
+            embedding_col: Embedding column, qualified with `table_alias` if one is used
+            select_cols: Columns to return besides `similarity`
+            query_vector: SQL expression of the query vector (see `vector_param_sql`)
+            limit: Rows to return
+            where: Extra filter conditions, starting with AND
+            min_similarity: Optional lower bound on cosine similarity
+            table_alias: Alias the other arguments refer to the table by
+            binary_prefilter: Override the per-table setting
+        """
+        if binary_prefilter is None:
+            binary_prefilter = binary_prefilter_enabled(table_name)
+        from_sql = f"{table_name} {table_alias}" if table_alias else table_name
+        threshold = f"1 - ({embedding_col} <=> {query_vector}) > {min_similarity}" if min_similarity is not None else None
+
+        if not binary_prefilter:
+            threshold_sql = f" AND {threshold}" if threshold else ""
+            return f"""SELECT {select_cols}, 1 - ({embedding_col} <=> {query_vector}) AS similarity
+        FROM {from_sql}
+        WHERE {embedding_col} IS NOT NULL {where}{threshold_sql}
+        ORDER BY {embedding_col} <=> {query_vector}
+        LIMIT {limit}"""
+
+        threshold_sql = f"\n        WHERE {threshold}" if threshold else ""
+        # The ORDER BY expression must match the expression index built by `create_binary_indexes`
+        return f"""SELECT {select_cols}, 1 - ({embedding_col} <=> {query_vector}) AS similarity
+        FROM (
+            SELECT * FROM {from_sql}
+            WHERE {embedding_col} IS NOT NULL {where}
+            ORDER BY binary_quantize({embedding_col})::bit({settings.EMBEDDING_DIM}) <~> binary_quantize({query_vector})
+            LIMIT {settings.BINARY_PREFILTER_CANDIDATES}
+        ) {table_alias or table_name}{threshold_sql}
+        ORDER BY {embedding_col} <=> {query_vector}
+        LIMIT {limit}"""
+
     def build_similarity_query(
-        self, 
-        table_name: str, 
-        embedding_param_name: str, 
+        self,
+        table_name: str,
+        embedding_param_name: str,
         columns: Dict[str, str],
         where_clause: Optional[str] = None,
         limit: Optional[int] = None
     ) -> str:
         """
         Build a CTE-based similarity query for any table with embeddings.
-        
+
         Args:
             table_name: Name of the database table
             embedding_param_name: Parameter name for the embedding vector (e.g., 'embedding_vector')
@@ -32,115 +126,49 @@ class SimilarityQueryBuilder:
                     e.g., {'id': 'id', 'content_embedding': 'markdown_embedding'}
             where_clause: Optional WHERE clause for filtering
             limit: Final result limit (defaults to self.default_limit)
-            
+
         Returns:
             SQL query string with parameterized embedding
         """
         if limit is None:
             limit = self.default_limit
-            
+
+        cache_key = (table_name, embedding_param_name, tuple(sorted(columns.items())), where_clause, limit)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         # Build CTEs for different embedding types
         ctes = []
         union_parts = []
-        
+
         # Get required columns
         id_col = columns.get('id', 'id')
         select_cols = columns.get('select_cols', '*')
-        
-        # Content embedding CTE
-        if 'content_embedding' in columns:
-            content_col = columns['content_embedding']
-            cte_name = f"{table_name}_content_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({content_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {content_col} IS NOT NULL
-        ORDER BY {content_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Summary embedding CTE
-        if 'summary_embedding' in columns:
-            summary_col = columns['summary_embedding']
-            cte_name = f"{table_name}_summary_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({summary_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {summary_col} IS NOT NULL
-        ORDER BY {summary_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Title embedding CTE (for issues)
-        if 'title_embedding' in columns:
-            title_col = columns['title_embedding']
-            cte_name = f"{table_name}_title_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({title_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {title_col} IS NOT NULL
-        ORDER BY {title_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Issue embedding CTE (for issues)
-        if 'issue_embedding' in columns:
-            issue_col = columns['issue_embedding']
-            cte_name = f"{table_name}_issue_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({issue_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {issue_col} IS NOT NULL
-        ORDER BY {issue_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Question/Answer embeddings CTE
-        if 'question_embedding' in columns:
-            question_col = columns['question_embedding']
-            answer_col = columns.get('answer_embedding', question_col)
-            cte_name = f"{table_name}_question_sim"
+        query_vector = vector_param_sql(embedding_param_name)
+
+        for purpose, suffix in self.EMBEDDING_KINDS:
+            if purpose not in columns:
+                continue
+            embedding_col = columns[purpose]
+            cte_name = f"{table_name}_{suffix}_sim"
             ctes.append(f"""
     {cte_name} AS (
-        SELECT {select_cols}, 1 - ({question_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {question_col} IS NOT NULL
-        ORDER BY {question_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
+        {self.nearest_rows_sql(table_name, embedding_col, select_cols, query_vector, self.default_candidates)}
     )""")
             union_parts.append(f"SELECT * FROM {cte_name}")
-            
-            if answer_col != question_col:
-                answer_cte_name = f"{table_name}_answer_sim"
-                ctes.append(f"""
-    {answer_cte_name} AS (
-        SELECT {select_cols}, 1 - ({answer_col} <=> :{embedding_param_name}) AS similarity
-        FROM {table_name}
-        WHERE {answer_col} IS NOT NULL
-        ORDER BY {answer_col} <=> :{embedding_param_name}
-        LIMIT {self.default_candidates}
-    )""")
-                union_parts.append(f"SELECT * FROM {answer_cte_name}")
-        
+
         # Build the full query
         group_by_cols = columns.get('group_by', id_col)
-        
+
         all_sim_cte = f"""
     all_sim AS (
         {' UNION ALL '.join(union_parts)}
     )"""
-        
+
         # Add where clause if provided
         where_part = f"WHERE {where_clause}" if where_clause else ""
-        
+
         query = f"""
     WITH{','.join(ctes)},
 {all_sim_cte}
@@ -151,14 +179,15 @@ class SimilarityQueryBuilder:
     ORDER BY similarity DESC
     LIMIT {limit};
     """
-        
+
+        self._query_cache[cache_key] = query
         return query
-    
+
     def execute_similarity_query(
-        self, 
-        db: Session, 
-        table_name: str, 
-        embedding: List[float], 
+        self,
+        db: Session,
+        table_name: str,
+        embedding: List[float],
         columns: Dict[str, str],
         where_clause: Optional[str] = None,
         where_params: Optional[Dict[str, Any]] = None,
@@ -166,7 +195,7 @@ class SimilarityQueryBuilder:
     ):
         """
         Execute a similarity query and return results.
-        
+
         Args:
             db: Database session
             table_name: Name of the database table
@@ -175,122 +204,38 @@ class SimilarityQueryBuilder:
             where_clause: Optional WHERE clause
             where_params: Parameters for WHERE clause
             limit: Final result limit
-            
+
         Returns:
             Query result rows
         """
-        # For now, build the embedding directly into the SQL until we can properly 
-        # handle vector parameters in SQLAlchemy
-        embedding_str = ','.join(str(v) for v in embedding)
-        embedding_sql = f"'[{embedding_str}]'::vector"
-        
-        # Use a temporary approach - build query with direct embedding
-        query = self._build_similarity_query_with_embedding(
-            table_name, embedding_sql, columns, where_clause, limit
+        query = self.build_similarity_query(
+            table_name, QUERY_EMBEDDING_PARAM, columns, where_clause, limit
         )
-        
-        params = where_params or {}
+
+        params = dict(where_params or {})
+        params[QUERY_EMBEDDING_PARAM] = to_vector_param(embedding)
         return db.execute(sql_text(query), params)
-    
-    def _build_similarity_query_with_embedding(
-        self, 
-        table_name: str, 
-        embedding_sql: str, 
+
+    async def execute_similarity_query_async(
+        self,
+        db: AsyncSession,
+        table_name: str,
+        embedding: List[float],
         columns: Dict[str, str],
         where_clause: Optional[str] = None,
+        where_params: Optional[Dict[str, Any]] = None,
         limit: Optional[int] = None
-    ) -> str:
+    ):
         """
-        Build a CTE-based similarity query with direct embedding SQL.
-        This is a temporary method until proper vector parameter support is added.
+        Async variant of `execute_similarity_query` for an `AsyncSession`.
+
+        Returns:
+            Buffered query result rows
         """
-        if limit is None:
-            limit = self.default_limit
-            
-        # Build CTEs for different embedding types
-        ctes = []
-        union_parts = []
-        
-        # Get required columns
-        id_col = columns.get('id', 'id')
-        select_cols = columns.get('select_cols', '*')
-        
-        # Content embedding CTE
-        if 'content_embedding' in columns:
-            content_col = columns['content_embedding']
-            cte_name = f"{table_name}_content_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({content_col} <=> {embedding_sql}) AS similarity
-        FROM {table_name}
-        WHERE {content_col} IS NOT NULL
-        ORDER BY {content_col} <=> {embedding_sql}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Summary embedding CTE
-        if 'summary_embedding' in columns:
-            summary_col = columns['summary_embedding']
-            cte_name = f"{table_name}_summary_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({summary_col} <=> {embedding_sql}) AS similarity
-        FROM {table_name}
-        WHERE {summary_col} IS NOT NULL
-        ORDER BY {summary_col} <=> {embedding_sql}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Title embedding CTE (for issues)
-        if 'title_embedding' in columns:
-            title_col = columns['title_embedding']
-            cte_name = f"{table_name}_title_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({title_col} <=> {embedding_sql}) AS similarity
-        FROM {table_name}
-        WHERE {title_col} IS NOT NULL
-        ORDER BY {title_col} <=> {embedding_sql}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Issue embedding CTE (for issues)
-        if 'issue_embedding' in columns:
-            issue_col = columns['issue_embedding']
-            cte_name = f"{table_name}_issue_sim"
-            ctes.append(f"""
-    {cte_name} AS (
-        SELECT {select_cols}, 1 - ({issue_col} <=> {embedding_sql}) AS similarity
-        FROM {table_name}
-        WHERE {issue_col} IS NOT NULL
-        ORDER BY {issue_col} <=> {embedding_sql}
-        LIMIT {self.default_candidates}
-    )""")
-            union_parts.append(f"SELECT * FROM {cte_name}")
-        
-        # Build the full query
-        group_by_cols = columns.get('group_by', id_col)
-        
-        all_sim_cte = f"""
-    all_sim AS (
-        {' UNION ALL '.join(union_parts)}
-    )"""
-        
-        # Add where clause if provided
-        where_part = f"WHERE {where_clause}" if where_clause else ""
-        
-        query = f"""
-    WITH{','.join(ctes)},
-{all_sim_cte}
-    SELECT {group_by_cols}, MAX(similarity) AS similarity
-    FROM all_sim
-    {where_part}
-    GROUP BY {group_by_cols}
-    ORDER BY similarity DESC
-    LIMIT {limit};
-    """
-        
-        return query
+        query = self.build_similarity_query(
+            table_name, QUERY_EMBEDDING_PARAM, columns, where_clause, limit
+        )
+
+        params = dict(where_params or {})
+        params[QUERY_EMBEDDING_PARAM] = to_vector_param(embedding)
+        return await db.execute(sql_text(query), params)
@@ -0,0 +1,200 @@
+"""
+Canonical, ready-to-serve URLs stored on the rows they describe.
+
+`issues.url` and `discourse_posts.url` are generated columns built from
+GITHUB_BASE_URL and DISCOURSE_BASE_URL (`metabase_docs.url` already is the page
+URL). `questions.source_url` copies the URL of the row a question was extracted
+from. A BEFORE trigger on `questions` fills it on insert and when the source
+changes. Triggers on the source tables push URL changes and deletions down to
+their questions. As a result, question search returns finished rows from a
+single statement, without joining the three source tables or looking them up
+afterwards.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from .db import engine
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+SOURCE_URL_COLUMN = "source_url"
+
+# Question source type (enum label) -> table holding the source row; each has a `url` column
+QUESTION_SOURCE_TABLES = {
+    "ISSUE": "issues",
+    "DISCOURSE_POST": "discourse_posts",
+    "METABASE_DOC": "metabase_docs",
+}
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def url_expression(table: str) -> str:
+    """Immutable SQL expression for the generated `url` column of `table`."""
+    if table == "issues":
+        return f"{_literal(settings.GITHUB_BASE_URL + '/issues/')} || number::text"
+    if table == "discourse_posts":
+        return f"{_literal(settings.DISCOURSE_BASE_URL + '/t/')} || slug || '/' || topic_id::text"
+    raise ValueError(f"No generated url for table '{table}'")
+
+
+# Tables whose `url` column is generated from the base URL settings
+GENERATED_URL_TABLES = ("issues", "discourse_posts")
+
+_FUNCTIONS_SQL = f"""
+CREATE OR REPLACE FUNCTION set_question_source_url() RETURNS trigger AS $$
+BEGIN
+    NEW.{SOURCE_URL_COLUMN} := CASE NEW.source_type::text
+        {' '.join(
+            f"WHEN '{source_type}' THEN (SELECT url FROM {table} WHERE id = NEW.source_id)"
+            for source_type, table in QUESTION_SOURCE_TABLES.items()
+        )}
+    END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION propagate_question_source_url() RETURNS trigger AS $$
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        UPDATE questions SET {SOURCE_URL_COLUMN} = NULL
+        WHERE source_type::text = TG_ARGV[0] AND {SOURCE_URL_COLUMN} IS NOT NULL;
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND NEW.id IS DISTINCT FROM OLD.id) THEN
+        UPDATE questions SET {SOURCE_URL_COLUMN} = NULL
+        WHERE source_type::text = TG_ARGV[0] AND source_id = OLD.id AND {SOURCE_URL_COLUMN} IS NOT NULL;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        UPDATE questions SET {SOURCE_URL_COLUMN} = NEW.url
+        WHERE source_type::text = TG_ARGV[0] AND source_id = NEW.id
+          AND {SOURCE_URL_COLUMN} IS DISTINCT FROM NEW.url;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _drop_triggers(conn) -> None:
+    conn.execute(text("DROP TRIGGER IF EXISTS trg_questions_source_url ON questions"))
+    for table in QUESTION_SOURCE_TABLES.values():
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_question_urls ON {table}"))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_question_urls_update ON {table}"))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_question_urls_truncate ON {table}"))
+
+
+def install_source_url_triggers() -> None:
+    """Create the functions and triggers that keep `questions.source_url` current (idempotent)."""
+    with engine.begin() as conn:
+        conn.execute(text(_FUNCTIONS_SQL))
+        _drop_triggers(conn)
+        conn.execute(text(
+            "CREATE TRIGGER trg_questions_source_url "
+            "BEFORE INSERT OR UPDATE OF source_type, source_id ON questions "
+            "FOR EACH ROW EXECUTE FUNCTION set_question_source_url()"
+        ))
+        for source_type, table in QUESTION_SOURCE_TABLES.items():
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_question_urls "
+                f"AFTER INSERT OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION propagate_question_source_url('{source_type}')"
+            ))
+            # Most updates (embeddings, summaries) leave the URL alone and skip the trigger
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_question_urls_update "
+                f"AFTER UPDATE ON {table} FOR EACH ROW "
+                f"WHEN (OLD.url IS DISTINCT FROM NEW.url OR OLD.id IS DISTINCT FROM NEW.id) "
+                f"EXECUTE FUNCTION propagate_question_source_url('{source_type}')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_question_urls_truncate "
+                f"AFTER TRUNCATE ON {table} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION propagate_question_source_url('{source_type}')"
+            ))
+    logger.info("Installed question source-url triggers")
+
+
+def backfill_question_source_urls() -> int:
+    """Recompute `questions.source_url` for every question; returns the number of rows changed."""
+    changed = 0
+    with engine.begin() as conn:
+        for source_type, table in QUESTION_SOURCE_TABLES.items():
+            changed += conn.execute(text(
+                f"UPDATE questions q SET {SOURCE_URL_COLUMN} = s.url FROM {table} s "
+                f"WHERE q.source_type::text = :source_type AND q.source_id = s.id "
+                f"AND q.{SOURCE_URL_COLUMN} IS DISTINCT FROM s.url"
+            ), {"source_type": source_type}).rowcount
+            changed += conn.execute(text(
+                f"UPDATE questions q SET {SOURCE_URL_COLUMN} = NULL "
+                f"WHERE q.source_type::text = :source_type AND q.{SOURCE_URL_COLUMN} IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {table} s WHERE s.id = q.source_id)"
+            ), {"source_type": source_type}).rowcount
+    logger.info(f"Backfilled questions.{SOURCE_URL_COLUMN}: {changed} row(s) changed")
+    return changed
+
+
+def install_source_urls() -> int:
+    """
+    (Re)create the generated `url` columns and `questions.source_url`, install the
+    triggers and backfill, e.g. on a database created before they existed or after
+    changing GITHUB_BASE_URL / DISCOURSE_BASE_URL.
+
+    Adding a generated column rewrites the table under an ACCESS EXCLUSIVE lock,
+    so run it outside peak traffic. Returns the number of questions updated.
+    """
+    with engine.begin() as conn:
+        # Triggers go first: nothing may depend on the columns being replaced
+        _drop_triggers(conn)
+        for table in GENERATED_URL_TABLES:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table} "
+                f"DROP COLUMN IF EXISTS url, "
+                f"ADD COLUMN url TEXT GENERATED ALWAYS AS ({url_expression(table)}) STORED"
+            )
+            logger.info(f"Installed {table}.url")
+        conn.exec_driver_sql(f"ALTER TABLE questions ADD COLUMN IF NOT EXISTS {SOURCE_URL_COLUMN} TEXT")
+    install_source_url_triggers()
+    return backfill_question_source_urls()
+
+
+def get_source_url_status() -> List[Dict[str, Any]]:
+    """Generated url columns and how many questions resolve to a source URL."""
+    status = []
+    with engine.connect() as conn:
+        for table in GENERATED_URL_TABLES:
+            row = conn.execute(text(
+                "SELECT is_generated FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table AND column_name = 'url'"
+            ), {"table": table}).first()
+            status.append({
+                "column": f"{table}.url",
+                "ok": row is not None and row.is_generated == "ALWAYS",
+                "detail": "generated" if row is not None and row.is_generated == "ALWAYS" else "missing or not generated",
+            })
+        exists = conn.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'questions' AND column_name = :column"
+        ), {"column": SOURCE_URL_COLUMN}).first() is not None
+        has_trigger = conn.execute(text(
+            "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_questions_source_url' AND tgrelid = to_regclass('questions')"
+        )).first() is not None
+        if exists:
+            total, resolved = conn.execute(text(
+                f"SELECT COUNT(*), COUNT({SOURCE_URL_COLUMN}) FROM questions"
+            )).one()
+            detail = f"{resolved}/{total} questions have a source URL"
+        else:
+            detail = "missing"
+        status.append({
+            "column": f"questions.{SOURCE_URL_COLUMN}",
+            "ok": exists and has_trigger,
+            "detail": detail if has_trigger else f"{detail}, NO TRIGGER",
+        })
+    return status
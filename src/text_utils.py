@@ -215,4 +215,17 @@ def calculate_token_count(text: str) -> int:
     words = [word for word in text.split() if word.strip()]
     
     # Apply the 2 tokens per word heuristic
-    return len(words) * 2
\ No newline at end of file
+    return len(words) * 2
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Collapse whitespace so trivially different query texts share cache entries.
+
+    Args:
+        text: The query text
+
+    Returns:
+        The text with runs of whitespace replaced by single spaces and trimmed
+    """
+    return " ".join(text.split())
@@ -37,7 +37,7 @@ def clean_llm_json_response(raw: str) -> str:
 Utility functions for the application.
 """
 
-import torch
+import sys
 from typing import Literal
 
 DeviceType = Literal["cuda", "cpu"]
@@ -49,4 +49,11 @@ def get_device() -> DeviceType:
     Returns:
         DeviceType: "cuda" if available, otherwise "cpu"
     """
-    return "cuda" if torch.cuda.is_available() else "cpu" 
\ No newline at end of file
+    # Imported here so that modules which never run a model do not pay for torch
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def is_cuda_oom(error: BaseException) -> bool:
+    """Whether `error` is a CUDA out-of-memory error, without importing torch if nothing loaded it."""
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(error, torch.cuda.OutOfMemoryError)
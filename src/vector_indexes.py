@@ -0,0 +1,418 @@
+"""
+HNSW index management for the pgvector embedding columns.
+Every `<=>` ORDER BY in the similarity queries can use these indexes instead of a sequential scan.
+
+Embedding columns are stored as `vector` (float32) or `halfvec` (float16, see
+VECTOR_STORAGE); `migrate_vector_storage` converts them in place and indexes
+always use the operator class matching the column's type in the database.
+Tables in BINARY_PREFILTER_TABLES also get Hamming-distance indexes on
+`binary_quantize(column)` for the two-stage search (`create_binary_indexes`).
+"""
+
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from pgvector.sqlalchemy import HALFVEC, Vector
+from sqlalchemy import text
+
+from .db import engine, Base
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+# Tables whose embedding columns are searched by the API
+INDEXED_TABLES = ("issues", "discourse_posts", "metabase_docs", "questions", "keyword_definitions", "search_vectors")
+
+# All similarity queries use cosine distance (<=>); the operator class depends on the column type
+VECTOR_OPCLASSES = {"vector": "vector_cosine_ops", "halfvec": "halfvec_cosine_ops"}
+
+
+def hnsw_index_name(table_name: str, column_name: str) -> str:
+    """Name of the HNSW index for a table column."""
+    return f"ix_{table_name}_{column_name}_hnsw"
+
+
+def get_vector_columns(tables: Optional[Iterable[str]] = None) -> List[Tuple[str, str]]:
+    """
+    List the (table, column) pairs holding embeddings.
+
+    Args:
+        tables: Optional subset of INDEXED_TABLES to restrict to
+
+    Returns:
+        List of (table_name, column_name) tuples
+    """
+    selected = set(tables) if tables else set(INDEXED_TABLES)
+    unknown = selected - set(INDEXED_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown table(s) for vector indexes: {', '.join(sorted(unknown))}")
+
+    vector_columns = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in selected:
+            continue
+        for column in table.columns:
+            if isinstance(column.type, (Vector, HALFVEC)):
+                vector_columns.append((table.name, column.name))
+    return vector_columns
+
+
+def _embedding_columns(tables: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[str, int]]]:
+    """(column, dimension) pairs of every embedding column, by table, including unindexed tables."""
+    selected = set(tables) if tables else None
+    columns: Dict[str, List[Tuple[str, int]]] = {}
+    for table in Base.metadata.sorted_tables:
+        if selected is not None and table.name not in selected:
+            continue
+        for column in table.columns:
+            if isinstance(column.type, (Vector, HALFVEC)):
+                columns.setdefault(table.name, []).append((column.name, column.type.dim))
+    if selected is not None and selected - set(columns):
+        raise ValueError(f"Table(s) without embedding columns: {', '.join(sorted(selected - set(columns)))}")
+    return columns
+
+
+def binary_index_name(table_name: str, column_name: str) -> str:
+    """Name of the Hamming-distance HNSW index on a column's binary quantization."""
+    return f"ix_{table_name}_{column_name}_bq_hnsw"
+
+
+def build_binary_index_sql(
+    table_name: str,
+    column_name: str,
+    dim: int,
+    m: int,
+    ef_construction: int,
+    concurrently: bool = True,
+) -> str:
+    """
+    CREATE INDEX for the binary prefilter: one bit per dimension (96 bytes for 768
+    dimensions instead of 3 KB). The expression must match the ORDER BY in
+    `SimilarityQueryBuilder.nearest_rows_sql`.
+    """
+    concurrently_sql = "CONCURRENTLY " if concurrently else ""
+    return (
+        f"CREATE INDEX {concurrently_sql}IF NOT EXISTS {binary_index_name(table_name, column_name)} "
+        f"ON {table_name} USING hnsw ((binary_quantize({column_name})::bit({int(dim)})) bit_hamming_ops) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    )
+
+
+def build_hnsw_index_sql(
+    table_name: str,
+    column_name: str,
+    m: int,
+    ef_construction: int,
+    index_name: Optional[str] = None,
+    concurrently: bool = True,
+    storage: str = "vector",
+) -> str:
+    """Build the CREATE INDEX statement for an HNSW index on a vector or halfvec column."""
+    index_name = index_name or hnsw_index_name(table_name, column_name)
+    concurrently_sql = "CONCURRENTLY " if concurrently else ""
+    return (
+        f"CREATE INDEX {concurrently_sql}IF NOT EXISTS {index_name} "
+        f"ON {table_name} USING hnsw ({column_name} {VECTOR_OPCLASSES[storage]}) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    )
+
+
+def _autocommit_connection():
+    """CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block."""
+    connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    if settings.HNSW_MAINTENANCE_WORK_MEM:
+        connection.execute(text(f"SET maintenance_work_mem = '{settings.HNSW_MAINTENANCE_WORK_MEM}'"))
+    return connection
+
+
+def _index_exists(connection, index_name: str) -> bool:
+    result = connection.execute(
+        text("SELECT 1 FROM pg_class WHERE relname = :name AND relkind = 'i'"),
+        {"name": index_name},
+    )
+    return result.first() is not None
+
+
+def _index_valid(connection, index_name: str) -> Optional[bool]:
+    """None if the index does not exist, False if it is INVALID (e.g. a failed CREATE INDEX CONCURRENTLY)."""
+    return connection.execute(
+        text("""
+            SELECT ix.indisvalid FROM pg_class c JOIN pg_index ix ON ix.indexrelid = c.oid
+            WHERE c.relname = :name
+        """),
+        {"name": index_name},
+    ).scalar()
+
+
+def _needs_build(connection, index_name: str, concurrently: bool = True) -> bool:
+    """
+    Whether `index_name` has to be built. An INVALID leftover is never used by the
+    planner, so it is dropped and rebuilt rather than skipped.
+    """
+    valid = _index_valid(connection, index_name)
+    if valid:
+        logger.info(f"Index {index_name} already exists, skipping")
+        return False
+    if valid is False:
+        logger.warning(f"Index {index_name} is INVALID (interrupted build?); dropping and rebuilding it")
+        concurrently_sql = "CONCURRENTLY " if concurrently else ""
+        connection.execute(text(f"DROP INDEX {concurrently_sql}IF EXISTS {index_name}"))
+    return True
+
+
+def _column_storage(connection, table_name: str, column_name: str) -> Optional[str]:
+    """'vector' or 'halfvec' as stored in the database, None if the column does not exist."""
+    column_type = connection.execute(
+        text("""
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = to_regclass(:table) AND attname = :column AND NOT attisdropped
+        """),
+        {"table": table_name, "column": column_name},
+    ).scalar()
+    return column_type.split("(")[0] if column_type else None
+
+
+def create_hnsw_indexes(
+    tables: Optional[Iterable[str]] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    concurrently: bool = True,
+) -> List[str]:
+    """
+    Create missing HNSW indexes for the embedding columns; INVALID ones are rebuilt.
+
+    Returns:
+        Names of the indexes that were created
+    """
+    m = m or settings.HNSW_M
+    ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+    created = []
+    with _autocommit_connection() as connection:
+        for table_name, column_name in get_vector_columns(tables):
+            index_name = hnsw_index_name(table_name, column_name)
+            if not _needs_build(connection, index_name, concurrently=concurrently):
+                continue
+            storage = _column_storage(connection, table_name, column_name) or settings.VECTOR_STORAGE
+            logger.info(f"Building {index_name} on {storage} (m={m}, ef_construction={ef_construction})...")
+            connection.execute(text(build_hnsw_index_sql(
+                table_name, column_name, m, ef_construction, concurrently=concurrently, storage=storage
+            )))
+            created.append(index_name)
+    return created
+
+
+def rebuild_hnsw_indexes(
+    tables: Optional[Iterable[str]] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+) -> List[str]:
+    """
+    Rebuild HNSW indexes without blocking writes.
+
+    A replacement index is built CONCURRENTLY with the requested parameters and swapped in,
+    so changing m/ef_construction does not take the table offline.
+
+    Returns:
+        Names of the indexes that were rebuilt or created
+    """
+    m = m or settings.HNSW_M
+    ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+    rebuilt = []
+    with _autocommit_connection() as connection:
+        for table_name, column_name in get_vector_columns(tables):
+            index_name = hnsw_index_name(table_name, column_name)
+            replacement_name = f"{index_name}_new"
+
+            # Leftover from an interrupted rebuild would be INVALID; drop it first
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {replacement_name}"))
+
+            storage = _column_storage(connection, table_name, column_name) or settings.VECTOR_STORAGE
+            logger.info(f"Rebuilding {index_name} on {storage} (m={m}, ef_construction={ef_construction})...")
+            connection.execute(text(build_hnsw_index_sql(
+                table_name, column_name, m, ef_construction, index_name=replacement_name, storage=storage
+            )))
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+            connection.execute(text(f"ALTER INDEX {replacement_name} RENAME TO {index_name}"))
+            rebuilt.append(index_name)
+    return rebuilt
+
+
+def drop_hnsw_indexes(tables: Optional[Iterable[str]] = None, concurrently: bool = True) -> List[str]:
+    """
+    Drop the HNSW indexes for the embedding columns.
+
+    Returns:
+        Names of the indexes that were dropped
+    """
+    concurrently_sql = "CONCURRENTLY " if concurrently else ""
+    dropped = []
+    with _autocommit_connection() as connection:
+        for table_name, column_name in get_vector_columns(tables):
+            index_name = hnsw_index_name(table_name, column_name)
+            if not _index_exists(connection, index_name):
+                continue
+            connection.execute(text(f"DROP INDEX {concurrently_sql}IF EXISTS {index_name}"))
+            dropped.append(index_name)
+    return dropped
+
+
+def create_binary_indexes(
+    tables: Optional[Iterable[str]] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+) -> List[str]:
+    """
+    Build the binary-quantization indexes used by the two-stage search; INVALID ones are rebuilt.
+
+    Defaults to the tables in BINARY_PREFILTER_TABLES.
+
+    Returns:
+        Names of the indexes that were created
+    """
+    tables = list(tables or settings.BINARY_PREFILTER_TABLES)
+    if not tables:
+        raise ValueError("No tables given and BINARY_PREFILTER_TABLES is empty")
+    m = m or settings.HNSW_M
+    ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+    created = []
+    with _autocommit_connection() as connection:
+        for table_name, columns in _embedding_columns(tables).items():
+            for column_name, dim in columns:
+                index_name = binary_index_name(table_name, column_name)
+                if not _needs_build(connection, index_name):
+                    continue
+                logger.info(f"Building {index_name} (m={m}, ef_construction={ef_construction})...")
+                connection.execute(text(build_binary_index_sql(table_name, column_name, dim, m, ef_construction)))
+                created.append(index_name)
+    return created
+
+
+def drop_binary_indexes(tables: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Drop the binary-quantization indexes.
+
+    Returns:
+        Names of the indexes that were dropped
+    """
+    dropped = []
+    with _autocommit_connection() as connection:
+        for table_name, columns in _embedding_columns(tables).items():
+            for column_name, _ in columns:
+                index_name = binary_index_name(table_name, column_name)
+                if not _index_exists(connection, index_name):
+                    continue
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+                dropped.append(index_name)
+    return dropped
+
+
+def migrate_vector_storage(
+    storage: str,
+    tables: Optional[Iterable[str]] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+) -> List[str]:
+    """
+    Convert embedding columns to `storage` ('vector' or 'halfvec') in place.
+
+    Each table is rewritten once (one ALTER TABLE for all its embedding columns)
+    under an ACCESS EXCLUSIVE lock, so run this outside peak traffic. The HNSW
+    indexes of converted columns are dropped first, since their operator class no
+    longer matches, and rebuilt CONCURRENTLY afterwards.
+
+    Switch VECTOR_STORAGE once the migration has finished: pgvector casts a
+    float32 query vector to halfvec implicitly, so queries keep using the indexes
+    in between.
+
+    Returns:
+        "table.column" names of the converted columns
+    """
+    if storage not in VECTOR_OPCLASSES:
+        raise ValueError(f"Unsupported vector storage '{storage}', expected one of {list(VECTOR_OPCLASSES)}")
+    m = m or settings.HNSW_M
+    ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+
+    converted = []
+    with _autocommit_connection() as connection:
+        for table_name, columns in _embedding_columns(tables).items():
+            pending = [
+                (column_name, dim) for column_name, dim in columns
+                if _column_storage(connection, table_name, column_name) not in (None, storage)
+            ]
+            if not pending:
+                logger.info(f"{table_name} already uses {storage}, skipping")
+                continue
+
+            binary_indexed = [
+                (column_name, dim) for column_name, dim in pending
+                if _index_exists(connection, binary_index_name(table_name, column_name))
+            ]
+            for column_name, _ in pending:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {hnsw_index_name(table_name, column_name)}"))
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {binary_index_name(table_name, column_name)}"))
+            logger.info(f"Converting {table_name} ({', '.join(c for c, _ in pending)}) to {storage}...")
+            connection.execute(text(f"ALTER TABLE {table_name} " + ", ".join(
+                f"ALTER COLUMN {column_name} TYPE {storage}({dim}) USING {column_name}::{storage}({dim})"
+                for column_name, dim in pending
+            )))
+            converted.extend(f"{table_name}.{column_name}" for column_name, _ in pending)
+            for column_name, dim in binary_indexed:
+                connection.execute(text(build_binary_index_sql(table_name, column_name, dim, m, ef_construction)))
+
+            if table_name not in INDEXED_TABLES:
+                continue
+            for column_name, _ in pending:
+                logger.info(f"Building {hnsw_index_name(table_name, column_name)} on {storage}...")
+                connection.execute(text(build_hnsw_index_sql(
+                    table_name, column_name, m, ef_construction, storage=storage
+                )))
+        # Refresh planner statistics for the rewritten tables
+        for table_name in {name.split(".")[0] for name in converted}:
+            connection.execute(text(f"ANALYZE {table_name}"))
+    return converted
+
+
+def get_hnsw_index_status(tables: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Report the state of the HNSW index for every embedding column.
+
+    Returns:
+        One dict per column with existence, validity, size and build options;
+        `binary_index` is None, "valid" or "invalid"
+    """
+    status_rows = []
+    with engine.connect() as connection:
+        for table_name, column_name in get_vector_columns(tables):
+            index_name = hnsw_index_name(table_name, column_name)
+            row = connection.execute(
+                text("""
+                    SELECT ix.indisvalid AS is_valid,
+                           pg_relation_size(c.oid) AS size_bytes,
+                           c.reloptions AS options
+                    FROM pg_class c
+                    JOIN pg_index ix ON ix.indexrelid = c.oid
+                    WHERE c.relname = :name
+                """),
+                {"name": index_name},
+            ).first()
+            status_rows.append({
+                "table": table_name,
+                "column": column_name,
+                "storage": _column_storage(connection, table_name, column_name),
+                "index": index_name,
+                "exists": row is not None,
+                "valid": bool(row.is_valid) if row is not None else False,
+                "size_bytes": int(row.size_bytes) if row is not None else 0,
+                "options": list(row.options or []) if row is not None else [],
+                "binary_index": {None: None, True: "valid", False: "invalid"}[
+                    _index_valid(connection, binary_index_name(table_name, column_name))
+                ],
+            })
+    return status_rows
+
+
+def get_session_ef_search() -> Optional[str]:
+    """Return the hnsw.ef_search value new sessions run with."""
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT current_setting('hnsw.ef_search', true)")).scalar()
@@ -0,0 +1,178 @@
+"""
+Startup warmup of the local models and the state behind `/ready`.
+
+The first forward passes through a model are slower than the rest: kernels get
+picked, thread pools start and the allocator grows its arenas. `ModelWarmup`
+runs representative encode and rerank batches when the API starts, so real
+users do not pay that cost. `/ready` answers 503 until it has finished, which
+lets a load balancer send traffic only to warmed workers. Providers that call
+a remote service have nothing to warm up and are ready right away.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from . import settings
+from .embedding_service import EmbeddingService, LocalEmbeddingProvider
+from .reranker_service import LocalRerankerProvider, RerankerService
+
+logger = logging.getLogger(__name__)
+
+# Short queries, an issue-sized text and a documentation-sized one, to hit several sequence lengths
+WARMUP_TEXTS = [
+    "How do I filter a question by date?",
+    "Dashboard filters not applied to native SQL questions",
+    "Embedding a public dashboard in an iframe shows a blank page after upgrading. "
+    "The browser console reports a CSP error and the dashboard cards never load, "
+    "while the same link opened directly works.",
+    "Models let you curate data for your team. Start from a saved question or a SQL query, "
+    "add metadata such as column descriptions and semantic types, and people can then "
+    "explore the model with the query builder like any other table. " * 4,
+]
+
+
+def _embedding_batches() -> List[List[str]]:
+    # A single text, as most API requests send, and a full micro-batch
+    batch_size = max(1, settings.EMBEDDING_BATCH_MAX_SIZE)
+    return [WARMUP_TEXTS[:1], [WARMUP_TEXTS[i % len(WARMUP_TEXTS)] for i in range(batch_size)]]
+
+
+def _rerank_candidates() -> List[Dict[str, Any]]:
+    count = max(1, settings.RERANKER_MAX_CANDIDATES)
+    return [
+        {"id": i, "title": WARMUP_TEXTS[i % len(WARMUP_TEXTS)][:80],
+         "rerank_text": WARMUP_TEXTS[i % len(WARMUP_TEXTS)], "source_type": "docs"}
+        for i in range(count)
+    ]
+
+
+def warm_up_embeddings(service: EmbeddingService, rounds: int = 1) -> Optional[float]:
+    """
+    Encode the warmup batches `rounds` times; returns the seconds spent, or None
+    when the provider is not a local model.
+
+    Calls the provider directly, so the embedding cache and the micro-batcher
+    thread are left untouched (the preloading server runs this before forking).
+    """
+    provider = service.provider
+    if not isinstance(provider, LocalEmbeddingProvider):
+        return None
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for batch in _embedding_batches():
+            if any(embedding is None for embedding in provider.create_embeddings_batch(batch)):
+                raise RuntimeError("Embedding model failed to encode the warmup batch")
+    return time.perf_counter() - started
+
+
+def warm_up_reranker(service: Optional[RerankerService], rounds: int = 1) -> Optional[float]:
+    """
+    Rerank a full candidate list `rounds` times; returns the seconds spent, or
+    None when the reranker is disabled or remote. Bypasses the score cache.
+    """
+    provider = service.provider if service is not None else None
+    if not isinstance(provider, LocalRerankerProvider):
+        return None
+    started = time.perf_counter()
+    for _ in range(rounds):
+        reranked = provider.rerank_results(WARMUP_TEXTS[0], _rerank_candidates())
+        if not reranked or any("reranker_score" not in candidate for candidate in reranked):
+            raise RuntimeError("Reranker failed to score the warmup candidates")
+    return time.perf_counter() - started
+
+
+def _describe(service: Any) -> Optional[Dict[str, Any]]:
+    if service is None:
+        return None
+    provider = service.provider
+    client = getattr(provider, "client", provider)
+    return {
+        "provider": type(provider).__name__,
+        "model": getattr(provider, "model_name", None) or getattr(client, "model_name", None),
+        "device": getattr(provider, "device", None) or getattr(client, "device", None),
+        "load_seconds": service.load_seconds,
+        "warmup_seconds": None,
+    }
+
+
+class ModelWarmup:
+    """
+    Warm up the API's models once, in a background thread, and report progress.
+
+    Status goes pending -> warming -> ready, or failed when a model cannot run
+    the warmup batches; a failed worker stays unready so it receives no traffic.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        reranker_service: Optional[RerankerService],
+        rounds: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.embedding_service = embedding_service
+        self.reranker_service = reranker_service
+        self.rounds = max(1, settings.WARMUP_ROUNDS if rounds is None else rounds)
+        self.enabled = settings.WARMUP_ENABLED if enabled is None else enabled
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+        self.models = {"embedding": _describe(embedding_service), "reranker": _describe(reranker_service)}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def run(self) -> bool:
+        """Run the warmup in the calling thread; returns whether the models are ready."""
+        with self._lock:
+            if self.status != "pending":
+                return self.ready
+            if not self.enabled:
+                self.status = "ready"
+                logger.info("Model warmup disabled (WARMUP_ENABLED=false)")
+                return True
+            self.status = "warming"
+
+        started = time.perf_counter()
+        try:
+            embedding_seconds = warm_up_embeddings(self.embedding_service, self.rounds)
+            reranker_seconds = warm_up_reranker(self.reranker_service, self.rounds)
+        except Exception as e:
+            with self._lock:
+                self.status = "failed"
+                self.error = str(e)
+            logger.error(f"Model warmup failed; /ready will keep answering 503: {e}")
+            return False
+
+        with self._lock:
+            self.models["embedding"]["warmup_seconds"] = embedding_seconds
+            if self.models["reranker"] is not None:
+                self.models["reranker"]["warmup_seconds"] = reranker_seconds
+            self.warmup_seconds = time.perf_counter() - started
+            self.status = "ready"
+        logger.info(f"Models warmed up in {self.warmup_seconds:.2f} s ({self.rounds} round(s))")
+        return True
+
+    def start(self) -> threading.Thread:
+        """Run the warmup in a daemon thread, so the server accepts /ready probes meanwhile."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def report(self) -> Dict[str, Any]:
+        """Readiness, warmup status and per-model load/warmup times for `/ready`."""
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "status": self.status,
+                "error": self.error,
+                "warmup_seconds": self.warmup_seconds,
+                "models": {name: dict(model) if model else None for name, model in self.models.items()},
+            }